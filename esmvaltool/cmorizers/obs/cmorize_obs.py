@@ -8,22 +8,35 @@ specified in config-user.yml by the RAWOBS key, and an output dir
 created in the form of output_dir/CMOR_DATE_TIME/TierTIER/DATASET.
 The user can specify a list of DATASETS that the CMOR reformatting
 can by run on by using -o (--obs-list-cmorize) command line argument.
+Independent datasets can be reformatted in parallel by using the
+-j (--jobs) command line argument, the max_parallel_tasks workers of the
+cmorizers are then shared between these datasets. With -i (--incremental),
+the latest previous output directory is updated and datasets whose raw
+data, cmorizer configuration and script did not change since they were last
+reformatted are skipped.
 The CMOR reformatting scripts are to be found in:
 esmvalcore.cmor/cmorizers/obs
 """
 import argparse
 import datetime
+import glob
+import hashlib
 import importlib
 import logging
 import os
 import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import esmvalcore
+import yaml
 from esmvalcore._config import configure_logging, read_config_user_file
 from esmvalcore._task import write_ncl_settings
 
-from .utilities import read_cmor_config
+from esmvaltool import __version__ as version
+
+from .utilities import UP_TO_DATE_KEY, get_n_workers, read_cmor_config
 
 logger = logging.getLogger(__name__)
 
@@ -117,12 +130,110 @@ def _run_ncl_script(in_dir, out_dir, run_dir, dataset, reformat_script,
     process = subprocess.Popen(ncl_call,
                                stdout=subprocess.PIPE,
                                stderr=subprocess.STDOUT,
+                               cwd=out_dir,
                                env=env)
     output, err = process.communicate()
     for oline in str(output.decode('utf-8')).split('\n'):
         logger.info('[NCL] %s', oline)
     if err:
         logger.info('[NCL][subprocess.Popen ERROR] %s', err)
+    if process.returncode:
+        raise RuntimeError(
+            "NCL script {} failed with exit code {}".format(
+                reformat_script, process.returncode))
+
+
+def _hash_file(path):
+    """Compute the sha256 checksum of a file."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _get_manifest_path(out_dir):
+    """Get the path of the manifest written next to a dataset output dir."""
+    return os.path.normpath(out_dir) + '_manifest.yml'
+
+
+def _build_manifest(in_dir, dataset, reformat_script, hash_inputs=False):
+    """Describe everything the output of a cmorizer depends on."""
+    cmor_config = os.path.join(os.path.dirname(reformat_script),
+                               'cmor_config', dataset + '.yml')
+    manifest = {
+        'esmvaltool_version': version,
+        'script': {
+            'path': reformat_script,
+            'sha256': _hash_file(reformat_script),
+        },
+        'config': None,
+        'input_files': {},
+    }
+    if os.path.isfile(cmor_config):
+        manifest['config'] = {
+            'path': cmor_config,
+            'sha256': _hash_file(cmor_config),
+        }
+    for root, _, files in os.walk(in_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            stat = os.stat(path)
+            entry = {'size': stat.st_size, 'mtime': stat.st_mtime}
+            if hash_inputs:
+                entry['sha256'] = _hash_file(path)
+            manifest['input_files'][os.path.relpath(path, in_dir)] = entry
+    return manifest
+
+
+def _read_manifest(out_dir):
+    """Read the manifest of a previous run, if any."""
+    manifest_path = _get_manifest_path(out_dir)
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def _write_manifest(out_dir, manifest):
+    """Write the manifest of a successfully reformatted dataset."""
+    manifest_path = _get_manifest_path(out_dir)
+    with open(manifest_path, 'w') as file:
+        yaml.safe_dump(manifest, file)
+    logger.info("Wrote manifest %s", manifest_path)
+
+
+def _get_up_to_date_files(in_dir, old_manifest, new_manifest):
+    """Get input files that did not change since the previous run.
+
+    Returns ``None`` if the output cannot be reused at all, i.e. if there
+    is no previous manifest, the cmorizer, its configuration or the
+    ESMValTool version changed, or input files were removed (their output
+    would otherwise be kept).
+    """
+    if old_manifest is None:
+        return None
+    for key in ('esmvaltool_version', 'script', 'config'):
+        if old_manifest.get(key) != new_manifest[key]:
+            return None
+    old_files = old_manifest.get('input_files', {})
+    if not set(old_files) <= set(new_manifest['input_files']):
+        return None
+    return {
+        os.path.abspath(os.path.join(in_dir, path))
+        for (path, entry) in new_manifest['input_files'].items()
+        if old_files.get(path) == entry
+    }
+
+
+def _find_previous_output_dir(output_dir):
+    """Find the most recent output directory of a previous run."""
+    pattern = os.path.join(os.path.dirname(output_dir), 'cmorize_obs_*')
+    previous = sorted(path for path in glob.glob(pattern)
+                      if os.path.isdir(path) and path != output_dir)
+    if not previous:
+        return None
+    return previous[-1]
 
 
 def _run_pyt_script(in_dir, out_dir, dataset, user_cfg):
@@ -136,6 +247,15 @@ def _run_pyt_script(in_dir, out_dir, dataset, user_cfg):
     module.cmorization(in_dir, out_dir, cmor_cfg, user_cfg)
 
 
+def _positive_int(value):
+    """Convert a command line argument to an integer of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "expected a positive integer, got {}".format(value))
+    return number
+
+
 def main():
     """Run it as executable."""
     parser = argparse.ArgumentParser(description=__doc__)
@@ -147,6 +267,22 @@ def main():
               all datasets in RAWOBS; \
               -o DATASET1,DATASET2... : \
               for CMORization of select datasets.')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=_positive_int,
+                        default=1,
+                        help='Number of datasets to CMORize in parallel. \
+              Default: 1 (serial).')
+    parser.add_argument('-i',
+                        '--incremental',
+                        action='store_true',
+                        help='Update the latest previous output directory \
+              and skip datasets and files that are already up to date.')
+    parser.add_argument('--hash-inputs',
+                        action='store_true',
+                        help='Also compare the sha256 checksums of the raw \
+              input files instead of only their sizes and modification \
+              times in incremental mode.')
     parser.add_argument('-c',
                         '--config-file',
                         default=os.path.join(os.path.dirname(__file__),
@@ -165,6 +301,13 @@ def main():
     # read the file in
     config_user = read_config_user_file(config_file, 'cmorize_obs')
 
+    # reuse the output of the previous run in incremental mode
+    if args.incremental:
+        previous_output_dir = _find_previous_output_dir(
+            config_user['output_dir'])
+        if previous_output_dir is not None:
+            config_user['output_dir'] = previous_output_dir
+
     # set the run dir to hold the settings and log files
     run_dir = os.path.join(config_user['output_dir'], 'run')
     if not os.path.isdir(run_dir):
@@ -200,7 +343,11 @@ def main():
         obs_list = args.obs_list_cmorize
     else:
         obs_list = []
-    _cmor_reformat(config_user, obs_list)
+    _cmor_reformat(config_user,
+                   obs_list,
+                   n_jobs=args.jobs,
+                   incremental=args.incremental,
+                   hash_inputs=args.hash_inputs)
 
     # End time timing
     timestamp2 = datetime.datetime.utcnow()
@@ -210,7 +357,104 @@ def main():
                 timestamp2 - timestamp1)
 
 
-def _cmor_reformat(config, obs_list):
+def _get_reformat_script(reformat_scripts, dataset):
+    """Find the NCL or Python cmorizer script of a dataset."""
+    reformat_script_root = os.path.join(
+        reformat_scripts,
+        'cmorize_obs_' + dataset.lower().replace('-', '_'),
+    )
+    for extension in ('.ncl', '.py'):
+        if os.path.isfile(reformat_script_root + extension):
+            return reformat_script_root + extension
+    return None
+
+
+def _reformat_dataset(config,
+                      run_dir,
+                      tier,
+                      dataset,
+                      reformat_script,
+                      incremental=False,
+                      hash_inputs=False):
+    """Run the cmorizer of a single dataset and return its status."""
+    in_data_dir = os.path.join(config['rootpath']['RAWOBS'][0], tier,
+                               dataset)
+    logger.info("Input data from: %s", in_data_dir)
+    out_data_dir = os.path.join(config['output_dir'], tier, dataset)
+    logger.info("Output will be written to: %s", out_data_dir)
+    if not os.path.isdir(out_data_dir):
+        os.makedirs(out_data_dir, exist_ok=True)
+
+    manifest = _build_manifest(in_data_dir, dataset, reformat_script,
+                               hash_inputs=hash_inputs)
+    config = dict(config)
+    if incremental:
+        up_to_date_files = _get_up_to_date_files(in_data_dir,
+                                                 _read_manifest(out_data_dir),
+                                                 manifest)
+        if up_to_date_files is not None and len(up_to_date_files) == len(
+                manifest['input_files']):
+            logger.info("Skipping %s, output is up to date", dataset)
+            return 'up to date'
+        config[UP_TO_DATE_KEY] = up_to_date_files
+
+    logger.info("Reformat script: %s", reformat_script)
+    if reformat_script.endswith('.ncl'):
+        _run_ncl_script(
+            in_data_dir,
+            out_data_dir,
+            run_dir,
+            dataset,
+            reformat_script,
+            config['log_level'],
+        )
+    else:
+        _run_pyt_script(in_data_dir, out_data_dir, dataset, config)
+    _write_manifest(out_data_dir, manifest)
+    return 'success'
+
+
+def _cmorize_dataset(config,
+                     run_dir,
+                     tier,
+                     dataset,
+                     reformat_script,
+                     incremental=False,
+                     hash_inputs=False):
+    """Run the cmorizer of a single dataset and report how it went.
+
+    All paths are passed explicitly, so this function does not depend on
+    the current working directory and can run in a separate process.
+    Returns the status and the run time in seconds, also if the cmorizer
+    failed.
+    """
+    start = time.time()
+    try:
+        status = _reformat_dataset(config, run_dir, tier, dataset,
+                                   reformat_script, incremental, hash_inputs)
+    except Exception:  # noqa
+        logger.exception("Failed to CMORize %s", dataset)
+        status = 'failed'
+    return (status, time.time() - start)
+
+
+def _log_summary(results):
+    """Print a summary table of the CMORization of all datasets."""
+    logger.info(70 * "-")
+    logger.info("%-8s %-32s %-12s %12s", 'Tier', 'Dataset', 'Status',
+                'Time [s]')
+    logger.info(70 * "-")
+    for result in results:
+        logger.info("%-8s %-32s %-12s %12.1f", result['tier'],
+                    result['dataset'], result['status'], result['time'])
+    logger.info(70 * "-")
+
+
+def _cmor_reformat(config,
+                   obs_list,
+                   n_jobs=1,
+                   incremental=False,
+                   hash_inputs=False):
     """Run the cmorization routine."""
     logger.info("Running the CMORization scripts.")
 
@@ -227,47 +471,62 @@ def _cmor_reformat(config, obs_list):
         logger.warning("Check input: could not find required %s in %s",
                        obs_list, raw_obs)
     logger.info("Processing datasets %s", datasets)
-
-    # loop through tier/datasets to be cmorized
-    failed_datasets = []
+    if n_jobs > 1:
+        # Share the workers of the cmorizers between the parallel datasets
+        config = dict(config)
+        config['max_parallel_tasks'] = max(get_n_workers(config) // n_jobs,
+                                           1)
+        logger.info("Using at most %s workers per dataset",
+                    config['max_parallel_tasks'])
+
+    # collect the tier/datasets to be cmorized
+    results = []
+    jobs = []
     for tier in datasets:
         for dataset in datasets[tier]:
-            reformat_script_root = os.path.join(
-                reformat_scripts,
-                'cmorize_obs_' + dataset.lower().replace('-', '_'),
-            )
-            # in-data dir; build out-dir tree
-            in_data_dir = os.path.join(raw_obs, tier, dataset)
-            logger.info("Input data from: %s", in_data_dir)
-            out_data_dir = os.path.join(config['output_dir'], tier, dataset)
-            logger.info("Output will be written to: %s", out_data_dir)
-            if not os.path.isdir(out_data_dir):
-                os.makedirs(out_data_dir)
-
-            # all operations are done in the working dir now
-            os.chdir(out_data_dir)
-
-            # figure out what language the script is in
-            logger.info("Reformat script: %s", reformat_script_root)
-            if os.path.isfile(reformat_script_root + '.ncl'):
-                reformat_script = reformat_script_root + '.ncl'
-                _run_ncl_script(
-                    in_data_dir,
-                    out_data_dir,
-                    run_dir,
-                    dataset,
-                    reformat_script,
-                    config['log_level'],
-                )
-            elif os.path.isfile(reformat_script_root + '.py'):
-                _run_pyt_script(in_data_dir, out_data_dir, dataset, config)
-            else:
+            result = {'tier': tier, 'dataset': dataset, 'time': 0.}
+            results.append(result)
+            reformat_script = _get_reformat_script(reformat_scripts, dataset)
+            if reformat_script is None:
                 logger.error('Could not find cmorizer for %s', dataset)
-                failed_datasets.append(dataset)
-                raise Exception(
-                    'Could not find cmorizers for %s datasets ' %
-                    ' '.join(failed_datasets)
-                )
+                result['status'] = 'no cmorizer'
+                continue
+            jobs.append((result, [
+                config, run_dir, tier, dataset, reformat_script, incremental,
+                hash_inputs
+            ]))
+
+    # run the cmorizers
+    if n_jobs == 1:
+        for result, job in jobs:
+            result['status'], result['time'] = _cmorize_dataset(*job)
+    else:
+        logger.info("Using at most %s workers", n_jobs)
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = {
+                executor.submit(_cmorize_dataset, *job): result
+                for result, job in jobs
+            }
+            for future in as_completed(futures):
+                result = futures[future]
+                try:
+                    result['status'], result['time'] = future.result()
+                except Exception:  # noqa
+                    # The worker process itself failed
+                    logger.exception("Failed to CMORize %s",
+                                     result['dataset'])
+                    result['status'] = 'failed'
+                else:
+                    logger.info("Finished CMORizing %s", result['dataset'])
+
+    _log_summary(results)
+    failed_datasets = [
+        result['dataset'] for result in results
+        if result['status'] not in ('success', 'up to date')
+    ]
+    if failed_datasets:
+        raise Exception('Could not CMORize %s datasets' %
+                        ' '.join(failed_datasets))
 
 
 if __name__ == '__main__':
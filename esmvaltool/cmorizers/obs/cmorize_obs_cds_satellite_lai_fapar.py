@@ -44,6 +44,7 @@ from warnings import catch_warnings, filterwarnings
 import cf_units
 import iris
 
+from esmvalcore.cmor.table import CMOR_TABLES
 from esmvalcore.preprocessor import regrid
 from esmvaltool.cmorizers.obs import utilities as utils
 
@@ -75,7 +76,7 @@ def _cmorize_dataset(in_file, var, cfg, out_dir):
     attributes = deepcopy(cfg['attributes'])
     attributes['mip'] = var['mip']
 
-    cmor_table = cfg['cmor_table']
+    cmor_table = CMOR_TABLES[attributes['project_id']]
     definition = cmor_table.get_variable(var['mip'], var['short_name'])
 
     cube = iris.load_cube(
@@ -101,36 +102,34 @@ def _cmorize_dataset(in_file, var, cfg, out_dir):
     return in_file
 
 
-def _regrid_dataset(in_dir, var, cfg):
+def _regrid_file(infile, var, cfg):
     """
-    Regridding of original files.
+    Regridding of a single original file.
 
-    This function regrids each file and write to disk appending 'regrid'
-    in front of filename.
+    This function regrids the file and writes it to disk appending
+    'regridded' to the 'c3s' prefix of the filename.
     """
-    filelist = glob.glob(os.path.join(in_dir, var['file']))
-    for infile in filelist:
-        _, infile_tail = os.path.split(infile)
-        outfile_tail = infile_tail.replace('c3s', 'c3s_regridded')
-        outfile = os.path.join(cfg['work_dir'], outfile_tail)
-        with catch_warnings():
-            filterwarnings(
-                action='ignore',
-                # Full message:
-                # UserWarning: Skipping global attribute 'long_name':
-                #              'long_name' is not a permitted attribute
-                message="Skipping global attribute 'long_name'",
-                category=UserWarning,
-                module='iris',
-            )
-            lai_cube = iris.load_cube(infile,
-                                      constraint=utils.var_name_constraint(
-                                          var['raw']))
-        lai_cube = regrid(lai_cube, cfg['custom']['regrid_resolution'],
-                          'nearest')
-        logger.info("Saving: %s", outfile)
-
-        iris.save(lai_cube, outfile)
+    _, infile_tail = os.path.split(infile)
+    outfile_tail = infile_tail.replace('c3s', 'c3s_regridded')
+    outfile = os.path.join(cfg['work_dir'], outfile_tail)
+    with catch_warnings():
+        filterwarnings(
+            action='ignore',
+            # Full message:
+            # UserWarning: Skipping global attribute 'long_name':
+            #              'long_name' is not a permitted attribute
+            message="Skipping global attribute 'long_name'",
+            category=UserWarning,
+            module='iris',
+        )
+        lai_cube = iris.load_cube(infile,
+                                  constraint=utils.var_name_constraint(
+                                      var['raw']))
+    lai_cube = regrid(lai_cube, cfg['custom']['regrid_resolution'],
+                      'nearest')
+    logger.info("Saving: %s", outfile)
+
+    iris.save(lai_cube, outfile)
 
 
 def _set_time_bnds(in_dir, var):
@@ -170,6 +169,40 @@ def _set_time_bnds(in_dir, var):
     return cubelist
 
 
+def _cmorize_variable(short_name, var, cfg, out_dir):
+    """Concatenate the regridded files of a variable and CMORize them."""
+    logger.info("Processing var %s", short_name)
+
+    # File concatenation
+    logger.info("Start setting time_bnds")
+    cubelist = _set_time_bnds(cfg['work_dir'], var)
+
+    # Loop over two different platform names
+    for platformname in ['SPOT-4', 'SPOT-5']:
+        # Now split the cubelist on the different platform
+        logger.info("Start processing part of dataset: %s", platformname)
+        cubelist_platform = cubelist.extract(iris.AttributeConstraint(
+            platform=platformname))
+        for n_cube, _ in enumerate(cubelist_platform):
+            cubelist_platform[n_cube].attributes.pop('identifier')
+        if cubelist_platform:
+            assert _attrs_are_the_same(cubelist_platform)
+            cube = cubelist_platform.concatenate_cube()
+        else:
+            logger.warning("No files found for platform %s \
+                           (check input data)", platformname)
+            continue
+        savename = os.path.join(cfg['work_dir'],
+                                var['short_name'] + platformname + '.nc')
+        logger.info("Saving as: %s", savename)
+        iris.save(cube, savename)
+        logger.info("Finished file concatenation over time")
+        in_file = savename
+        logger.info("Start CMORization of file %s", in_file)
+        _cmorize_dataset(in_file, var, cfg, out_dir)
+        logger.info("Finished regridding and CMORizing %s", in_file)
+
+
 def cmorization(in_dir, out_dir, cfg, cfg_user):
     """Cmorization func call."""
     # run the cmorization
@@ -180,42 +213,22 @@ def cmorization(in_dir, out_dir, cfg, cfg_user):
         logger.info("Creating working directory for regridding: %s",
                     cfg['work_dir'])
         os.mkdir(cfg['work_dir'])
-
+    # The CMOR table is looked up in the workers
+    cfg.pop('cmor_table')
+    n_workers = utils.get_n_workers(cfg_user)
+
+    # Regridding of all files of all variables
+    logger.info("Start regridding to: %s",
+                cfg['custom']['regrid_resolution'])
+    jobs = []
     for short_name, var in cfg['variables'].items():
         var['short_name'] = short_name
-        logger.info("Processing var %s", short_name)
-
-        # Regridding
-        logger.info("Start regridding to: %s",
-                    cfg['custom']['regrid_resolution'])
-        _regrid_dataset(in_dir, var, cfg)
-        logger.info("Finished regridding")
-
-        # File concatenation
-        logger.info("Start setting time_bnds")
-        cubelist = _set_time_bnds(cfg['work_dir'], var)
-
-        # Loop over two different platform names
-        for platformname in ['SPOT-4', 'SPOT-5']:
-            # Now split the cubelist on the different platform
-            logger.info("Start processing part of dataset: %s", platformname)
-            cubelist_platform = cubelist.extract(iris.AttributeConstraint(
-                platform=platformname))
-            for n_cube, _ in enumerate(cubelist_platform):
-                cubelist_platform[n_cube].attributes.pop('identifier')
-            if cubelist_platform:
-                assert _attrs_are_the_same(cubelist_platform)
-                cube = cubelist_platform.concatenate_cube()
-            else:
-                logger.warning("No files found for platform %s \
-                               (check input data)", platformname)
-                continue
-            savename = os.path.join(cfg['work_dir'],
-                                    var['short_name'] + platformname + '.nc')
-            logger.info("Saving as: %s", savename)
-            iris.save(cube, savename)
-            logger.info("Finished file concatenation over time")
-            in_file = savename
-            logger.info("Start CMORization of file %s", in_file)
-            _cmorize_dataset(in_file, var, cfg, out_dir)
-            logger.info("Finished regridding and CMORizing %s", in_file)
+        for infile in glob.glob(os.path.join(in_dir, var['file'])):
+            jobs.append([infile, var, cfg])
+    utils.run_jobs(_regrid_file, jobs, n_workers)
+    logger.info("Finished regridding")
+
+    # Concatenation and CMORization of each variable
+    jobs = [[short_name, var, cfg, out_dir]
+            for (short_name, var) in cfg['variables'].items()]
+    utils.run_jobs(_cmorize_variable, jobs, n_workers)
@@ -84,10 +84,8 @@ For further details on obtaining daily values from ERA-Interim,
 import logging
 import re
 from collections import defaultdict
-from concurrent.futures import ProcessPoolExecutor, as_completed
 from copy import deepcopy
-from datetime import datetime, timedelta
-from os import cpu_count
+from datetime import datetime
 from pathlib import Path
 from warnings import catch_warnings, filterwarnings
 
@@ -97,6 +95,8 @@ import numpy as np
 from esmvalcore.cmor.table import CMOR_TABLES
 from esmvalcore.preprocessor import daily_statistics, monthly_statistics
 
+from esmvaltool.utils import calendar_helpers
+
 from . import utilities as utils
 
 logger = logging.getLogger(__name__)
@@ -163,15 +163,7 @@ def _fix_coordinates(cube, definition):
 def _fix_monthly_time_coord(cube):
     """Set the monthly time coordinates to the middle of the month."""
     coord = cube.coord(axis='T')
-    end = []
-    for cell in coord.cells():
-        month = cell.point.month + 1
-        year = cell.point.year
-        if month == 13:
-            month = 1
-            year = year + 1
-        end.append(cell.point.replace(month=month, year=year))
-    end = coord.units.date2num(end)
+    end = calendar_helpers.add_months(coord.points, coord.units)
     start = coord.points
     coord.points = 0.5 * (start + end)
     coord.bounds = np.column_stack([start, end])
@@ -180,20 +172,8 @@ def _fix_monthly_time_coord(cube):
 def _fix_monthly_time_coord_eiland(cube):
     """Set the monthly time coordinates to the middle of the month."""
     coord = cube.coord(axis='T')
-    start = []
-    end = []
-    for cell in coord.cells():
-        # set start to first day 00 UTC
-        start.append(cell.point.replace(day=1, hour=0))
-        # now deal with the end
-        month = cell.point.month + 1
-        year = cell.point.year
-        if month == 13:
-            month = 1
-            year = year + 1
-        end.append(cell.point.replace(month=month, year=year, day=1, hour=0))
-    end = coord.units.date2num(end)
-    start = coord.units.date2num(start)
+    # start and end are the first day of the month 00 UTC
+    (start, end) = calendar_helpers.month_bounds(coord.points, coord.units)
     coord.points = 0.5 * (start + end)
     coord.bounds = np.column_stack([start, end])
 
@@ -231,10 +211,9 @@ def _compute_daily(cube):
             'rss',
             'prsn',
     }:
-        cube.coord('time').points = cube.coord('time').units.date2num([
-            cell.point - timedelta(seconds=1)
-            for cell in cube.coord('time').cells()
-        ])
+        time_coord = cube.coord('time')
+        time_coord.points = calendar_helpers.shift(time_coord.points,
+                                                   time_coord.units, -1)
 
     if cube.var_name == 'tasmax':
         cube = daily_statistics(cube, 'max')
@@ -255,10 +234,8 @@ def _compute_daily(cube):
         cube = daily_statistics(cube, 'mean')
 
     # Correct the time coordinate
-    cube.coord('time').points = cube.coord('time').units.date2num([
-        cell.point.replace(hour=12, minute=0, second=0, microsecond=0)
-        for cell in cube.coord('time').cells()
-    ])
+    cube.coord('time').points = calendar_helpers.snap(
+        cube.coord('time').points, cube.coord('time').units, hour=12)
     cube.coord('time').bounds = None
     cube.coord('time').guess_bounds()
 
@@ -407,36 +384,13 @@ def _get_in_files_by_year(in_dir, var):
     return in_files.values()
 
 
-def _run(jobs, n_workers):
-    """Run CMORization jobs using n_workers."""
-    if n_workers == 1:
-        for job in jobs:
-            _extract_variable(*job)
-    else:
-        with ProcessPoolExecutor(max_workers=n_workers) as executor:
-            futures = {}
-            for job in jobs:
-                future = executor.submit(_extract_variable, *job)
-                futures[future] = job[0]
-
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except:  # noqa
-                    logger.error("Failed to CMORize %s",
-                                 ', '.join(futures[future]))
-                    raise
-
-
 def cmorization(in_dir, out_dir, cfg, config_user):
     """Run CMORizer for ERA-Interim."""
     cfg['attributes']['comment'] = cfg['attributes']['comment'].strip().format(
         year=datetime.now().year)
     cfg.pop('cmor_table')
 
-    n_workers = config_user.get('max_parallel_tasks')
-    if n_workers is None:
-        n_workers = int(cpu_count() / 1.5)
+    n_workers = utils.get_n_workers(config_user)
     logger.info("Using at most %s workers", n_workers)
 
     jobs = []
@@ -444,6 +398,10 @@ def cmorization(in_dir, out_dir, cfg, config_user):
         if 'short_name' not in var:
             var['short_name'] = short_name
         for in_files in _get_in_files_by_year(in_dir, var):
+            if utils.is_up_to_date(in_files, config_user):
+                logger.info("Skipping CMORizing %s, output is up to date",
+                            ', '.join(in_files))
+                continue
             jobs.append([in_files, var, cfg, out_dir])
 
-    _run(jobs, n_workers)
+    utils.run_jobs(_extract_variable, jobs, n_workers)
@@ -24,12 +24,16 @@ Modification history
 import glob
 import logging
 import os
+from copy import deepcopy
 
 import iris
 import xarray as xr
 
+from esmvalcore.cmor.table import CMOR_TABLES
+
 from .utilities import (constant_metadata, fix_coords, fix_var_metadata,
-                        save_variable, set_global_atts)
+                        get_n_workers, run_jobs, save_variable,
+                        set_global_atts)
 
 logger = logging.getLogger(__name__)
 
@@ -143,25 +147,33 @@ def merge_data(in_dir, out_dir, raw_info, bins):
     return (datafile, dsmeta['BINNING'])
 
 
-def cmorization(in_dir, out_dir, cfg, _):
-    """Cmorization func call."""
-    cmor_table = cfg['cmor_table']
-    glob_attrs = cfg['attributes']
+def _cmorize_variable(var, vals, in_dir, out_dir, cfg):
+    """Merge, rebin and CMORize a single variable."""
+    var_info = CMOR_TABLES[cfg['attributes']['project_id']].get_variable(
+        vals['mip'], var)
+    glob_attrs = deepcopy(cfg['attributes'])
+    glob_attrs['mip'] = vals['mip']
+    raw_info = {'name': vals['raw'], 'file': vals['file']}
 
-    # run the cmorization
-    for var, vals in cfg['variables'].items():
-        var_info = cmor_table.get_variable(vals['mip'], var)
-        glob_attrs['mip'] = vals['mip']
-        raw_info = {'name': vals['raw'], 'file': vals['file']}
+    # merge yearly data and apply binning
+    inpfile, addinfo = merge_data(in_dir, out_dir, raw_info,
+                                  cfg['custom']['bin_size'])
 
-        # merge yearly data and apply binning
-        inpfile, addinfo = merge_data(in_dir, out_dir, raw_info,
-                                      cfg['custom']['bin_size'])
-
-        logger.info("CMORizing var %s from file %s", var, inpfile)
-        raw_info['file'] = inpfile
-        glob_attrs['comment'] = addinfo + glob_attrs['comment']
-        extract_variable(var_info, raw_info, out_dir, glob_attrs)
+    logger.info("CMORizing var %s from file %s", var, inpfile)
+    raw_info['file'] = inpfile
+    glob_attrs['comment'] = addinfo + glob_attrs['comment']
+    extract_variable(var_info, raw_info, out_dir, glob_attrs)
 
     # Remove temporary input file
     os.remove(inpfile)
+
+
+def cmorization(in_dir, out_dir, cfg, cfg_user):
+    """Cmorization func call."""
+    # The CMOR table is looked up in the workers
+    cfg.pop('cmor_table')
+
+    # run the cmorization
+    jobs = [[var, vals, in_dir, out_dir, cfg]
+            for (var, vals) in cfg['variables'].items()]
+    run_jobs(_cmorize_variable, jobs, get_n_workers(cfg_user))
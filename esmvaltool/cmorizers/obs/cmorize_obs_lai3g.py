@@ -26,6 +26,7 @@ import glob
 import logging
 import os
 import shutil
+import tempfile
 import zipfile
 from datetime import datetime
 
@@ -33,6 +34,7 @@ import iris
 import iris.coord_categorisation
 import numpy as np
 from cf_units import Unit
+from dask import array as da
 
 from esmvalcore.preprocessor import regrid
 
@@ -78,12 +80,13 @@ def _clean(file_dir):
         logger.info("Removed cached directory %s", file_dir)
 
 
-def _extract_variable(cmor_info, attrs, in_dir, out_dir, cfg):
+def _extract_variable(cmor_info, attrs, in_dir, out_dir, cfg, n_workers=1):
     """Extract variable."""
-    nc_files = []
-    for year in _get_years(in_dir, cfg):
-        cube_path = _get_cube_for_year(year, in_dir, cfg)
-        nc_files.append(cube_path)
+    # The CMOR table is not needed to process the single years
+    year_cfg = {key: cfg[key] for key in cfg if key != 'cmor_table'}
+    jobs = [(year, in_dir, year_cfg)
+            for year in sorted(_get_years(in_dir, cfg))]
+    nc_files = utils.run_jobs(_get_cube_for_year, jobs, n_workers)
 
     # Build final cube
     logger.info("Building final cube")
@@ -105,19 +108,15 @@ def _extract_variable(cmor_info, attrs, in_dir, out_dir, cfg):
                         unlimited_dimensions=['time'])
 
 
-def _get_coords(year, filename, cfg):
+def _get_coords(year, filenames, cfg):
     """Get correct coordinates for cube."""
-    filename = os.path.basename(filename)
     time_units = Unit('days since 1950-1-1 00:00:00', calendar='standard')
 
-    # Extract date from filename
-    time_str = filename.replace(cfg['binary_prefix'], '')
-    month = MONTHS[time_str[4:7]]
-    day = DAYS[time_str[7:8]]
-    date = datetime(year, month, day)
-
     # Build time coordinate
-    time_data = [time_units.date2num(date)]
+    time_data = [
+        time_units.date2num(_get_date(year, filename, cfg))
+        for filename in filenames
+    ]
     time_coord = iris.coords.DimCoord(time_data,
                                       standard_name='time',
                                       long_name='time',
@@ -146,27 +145,26 @@ def _get_cube_for_year(year, in_dir, cfg):
     logger.info("Processing year %i", year)
     bin_files = glob.glob(
         os.path.join(in_dir, f"{cfg['binary_prefix']}{year}*.bin"))
-
-    # Read files of one year
-    cubes = iris.cube.CubeList()
-    for bin_file in bin_files:
-        raw_data = np.fromfile(bin_file, DTYPE,
-                               N_LAT * N_LON).reshape(1, N_LAT, N_LON)
-        raw_data = np.ma.masked_equal(raw_data, MISSING_VALUE)
-        raw_data = raw_data.astype(np.float32)
-        raw_data /= SCALE_FACTOR
-
-        # Build coordinates and cube, regrid, and append it
-        coords = _get_coords(year, bin_file, cfg)
-        cube = iris.cube.Cube(raw_data, dim_coords_and_dims=coords)
-        if cfg.get('regrid'):
-            cube = regrid(cube, cfg['regrid']['target_grid'],
-                          cfg['regrid']['scheme'])
-        cubes.append(cube)
+    bin_files.sort(key=lambda bin_file: _get_date(year, bin_file, cfg))
+
+    # Memory-map all files of one year into a single lazy array
+    raw_data = da.stack([
+        da.from_array(np.memmap(bin_file, DTYPE, 'r', shape=(N_LAT, N_LON)),
+                      chunks=(N_LAT, N_LON)) for bin_file in bin_files
+    ])
+    raw_data = da.ma.masked_equal(raw_data, MISSING_VALUE)
+    raw_data = raw_data.astype(np.float32) / SCALE_FACTOR
+
+    # Build cube and regrid all time steps at once (the regridding weights
+    # are only computed once per year)
+    coords = _get_coords(year, bin_files, cfg)
+    cube = iris.cube.Cube(raw_data, dim_coords_and_dims=coords)
+    if cfg.get('regrid'):
+        cube = regrid(cube, cfg['regrid']['target_grid'],
+                      cfg['regrid']['scheme'])
 
     # Build cube for single year with monthly data
     # (Raw data has two values per month)
-    cube = cubes.concatenate_cube()
     iris.coord_categorisation.add_month_number(cube, 'time')
     cube = cube.aggregated_by('month_number', iris.analysis.MEAN)
 
@@ -177,6 +175,14 @@ def _get_cube_for_year(year, in_dir, cfg):
     return cached_path
 
 
+def _get_date(year, filename, cfg):
+    """Extract date from filename."""
+    time_str = os.path.basename(filename).replace(cfg['binary_prefix'], '')
+    month = MONTHS[time_str[4:7]]
+    day = DAYS[time_str[7:8]]
+    return datetime(year, month, day)
+
+
 def _get_years(in_dir, cfg):
     """Get all available years from input directory."""
     bin_files = os.listdir(in_dir)
@@ -195,7 +201,7 @@ def _unzip(filepath, out_dir):
     return new_path
 
 
-def cmorization(in_dir, out_dir, cfg, _):
+def cmorization(in_dir, out_dir, cfg, cfg_user):
     """Cmorization func call."""
     glob_attrs = cfg['attributes']
     cmor_table = cfg['cmor_table']
@@ -217,6 +223,17 @@ def cmorization(in_dir, out_dir, cfg, _):
             logger.debug("Skipping '%s', file '%s' not found", var, zip_file)
             continue
         logger.info("Found input file '%s'", zip_file)
-        file_dir = _unzip(zip_file, out_dir)
-        _extract_variable(cmor_info, glob_attrs, file_dir, out_dir, cfg)
-        _clean(file_dir)
+
+        # Unzip and cache the yearly data in a scratch directory
+        work_dir = cfg_user.get('work_dir')
+        if work_dir:
+            os.makedirs(work_dir, exist_ok=True)
+        scratch_dir = tempfile.mkdtemp(prefix='LAI3g_', dir=work_dir)
+        file_dir = _unzip(zip_file, scratch_dir)
+        _extract_variable(cmor_info,
+                          glob_attrs,
+                          file_dir,
+                          out_dir,
+                          cfg,
+                          n_workers=utils.get_n_workers(cfg_user))
+        _clean(scratch_dir)
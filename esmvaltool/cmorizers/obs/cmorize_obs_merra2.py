@@ -18,14 +18,14 @@ import glob
 import logging
 import os
 from copy import deepcopy
-from datetime import datetime
 
-import cf_units
 import iris
 from dask import array as da
 
 from esmvalcore.cmor.table import CMOR_TABLES
 
+from esmvaltool.utils import calendar_helpers
+
 from . import utilities as utils
 
 logger = logging.getLogger(__name__)
@@ -33,21 +33,10 @@ logger = logging.getLogger(__name__)
 
 def _fix_time_monthly(cube):
     """Fix time by setting it to 15th of month."""
-    # Read dataset time unit and calendar from file
-    dataset_time_unit = str(cube.coord('time').units)
-    dataset_time_calender = cube.coord('time').units.calendar
-    # Convert datetime
-    time_as_datetime = cf_units.num2date(cube.coord('time').core_points(),
-                                         dataset_time_unit,
-                                         dataset_time_calender)
-    newtime = []
-    for timepoint in time_as_datetime:
-        midpoint = datetime(timepoint.year, timepoint.month, 15)
-        newtime.append(midpoint)
-
-    newtime = cf_units.date2num(newtime,
-                                dataset_time_unit,
-                                dataset_time_calender)
+    newtime = calendar_helpers.snap(cube.coord('time').core_points(),
+                                    cube.coord('time').units,
+                                    day=15,
+                                    hour=0)
     # Put them on the file
     cube.coord('time').points = newtime
     cube.coord('time').bounds = None
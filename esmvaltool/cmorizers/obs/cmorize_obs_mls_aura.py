@@ -31,8 +31,8 @@ import iris
 import iris.coord_categorisation
 import netCDF4 as nc
 import numpy as np
-import pandas as pd
 from cf_units import Unit
+from dask import array as da
 
 from . import utilities as utils
 
@@ -63,9 +63,9 @@ def _cut_cube(cube, var_info):
     return cube
 
 
-def _extract_cubes(files_dict, cfg):
+def _extract_cubes(files_dict, cfg, n_workers=1):
     """Extract cubes from files."""
-    cubes_dict = _get_cubes_dict(files_dict, cfg)
+    cubes_dict = _get_cubes_dict(files_dict, cfg, n_workers=n_workers)
 
     # Create final cubes and return it
     cube_dict = {}
@@ -114,27 +114,23 @@ def _get_cube(gridded_data, time, pressure):
     return cube
 
 
-def _get_cubes_dict(files_dict, cfg):
-    """Get :obj:`dict` of :class:`iris.cube.CubeList`."""
+def _get_cubes_dict(files_dict, cfg, n_workers=1):
+    """Get :obj:`dict` of :class:`iris.cube.CubeList`.
+
+    The files are processed in parallel and the daily data are wrapped in
+    lazy arrays, so that the cubes can be concatenated without copying.
+    """
     cubes_dict = {var: iris.cube.CubeList() for var in cfg['variables']}
 
     # Process files
-    file_idx = 1
-    for (filename_rhi, filename_t) in files_dict.values():
-        logger.info("Processing file %5d/%5d [%s]", file_idx, len(files_dict),
-                    filename_rhi)
-
-        # Read files
-        (nc_rhi, nc_loc) = _open_nc_file(filename_rhi, 'RHI')
-        (nc_t, _) = _open_nc_file(filename_t, 'Temperature')
-
-        # Get cubes for all desired variables
-        for (var, var_info) in cfg['variables'].items():
-            (gridded_data, time,
-             pressure) = _get_gridded_data(var_info['raw_var'], nc_rhi, nc_loc,
-                                           nc_t, filename_rhi)
+    jobs = [(filename_rhi, filename_t, cfg['variables'], file_idx,
+             len(files_dict)) for (file_idx, (filename_rhi, filename_t))
+            in enumerate(files_dict.values(), start=1)]
+    for file_data in utils.run_jobs(_get_file_data, jobs, n_workers):
+        for (var, (gridded_data, time, pressure)) in file_data.items():
+            gridded_data = da.from_array(gridded_data,
+                                         chunks=gridded_data.shape)
             cubes_dict[var].append(_get_cube(gridded_data, time, pressure))
-        file_idx += 1
 
     return cubes_dict
 
@@ -157,6 +153,23 @@ def _get_file_attributes(filename):
     return {key: attrs.getncattr(key) for key in attrs.ncattrs()}
 
 
+def _get_file_data(filename_rhi, filename_t, variables, file_idx, n_files):
+    """Get gridded data of all desired variables for a single file."""
+    logger.info("Processing file %5d/%5d [%s]", file_idx, n_files,
+                filename_rhi)
+
+    # Read files
+    (nc_rhi, nc_loc) = _open_nc_file(filename_rhi, 'RHI')
+    (nc_t, _) = _open_nc_file(filename_t, 'Temperature')
+
+    # Get data for all desired variables
+    file_data = {}
+    for (var, var_info) in variables.items():
+        file_data[var] = _get_gridded_data(var_info['raw_var'], nc_rhi,
+                                           nc_loc, nc_t, filename_rhi)
+    return file_data
+
+
 def _get_files_single_var(variable, in_dir, cfg):
     """Get files for a single variable."""
     filename = cfg['file_pattern'].format(var=variable)
@@ -230,29 +243,13 @@ def _get_gridded_data(variable, nc_rhi, nc_loc, nc_t, filename):
         lon = lon[:-4]
 
     # Place on 1x1 degree grid
-    lat = np.around(lat)
-    lon = np.around(lon)
-
-    # Iterate over pressure levels
-    gridded_data = []
-    for (p_idx, _) in enumerate(pressure):
-        data_frame = pd.DataFrame({
-            'lat': lat,
-            'lon': lon,
-            'data': data[:, p_idx].filled(np.nan),
-        })
-
-        # Create daily-mean gridded data using pivot table
-        data_frame = pd.pivot_table(data_frame,
-                                    values='data',
-                                    index='lat',
-                                    columns='lon',
-                                    aggfunc=np.mean,
-                                    dropna=False)
-        data_frame = data_frame.reindex(index=ALL_LATS, columns=ALL_LONS)
-        gridded_data.append(data_frame.values)
-    gridded_data = np.expand_dims(np.array(gridded_data), 0)
-    gridded_data = np.ma.masked_invalid(gridded_data)
+    indices = utils.grid_indices(np.around(lat), np.around(lon), ALL_LATS,
+                                 ALL_LONS)
+
+    # Create daily-mean gridded data for all pressure levels at once
+    gridded_data = utils.bin_mean(data, indices, ALL_LATS.size * ALL_LONS.size)
+    gridded_data = gridded_data.reshape(1, len(pressure), ALL_LATS.size,
+                                        ALL_LONS.size)
 
     return (gridded_data, time, pressure)
 
@@ -322,7 +319,7 @@ def _save_cube(cube, cmor_info, attrs, out_dir):
                         unlimited_dimensions=['time'])
 
 
-def cmorization(in_dir, out_dir, cfg, _):
+def cmorization(in_dir, out_dir, cfg, cfg_user):
     """Cmorization func call."""
     glob_attrs = cfg['attributes']
     glob_attrs['mip'] = cfg['mip']
@@ -330,7 +327,8 @@ def cmorization(in_dir, out_dir, cfg, _):
     files_dict = _get_files(in_dir, cfg)
 
     # Run the cmorization
-    cube_dict = _extract_cubes(files_dict, cfg)
+    cube_dict = _extract_cubes(files_dict, cfg,
+                               n_workers=utils.get_n_workers(cfg_user))
 
     # Save data
     for (var, cube) in cube_dict.items():
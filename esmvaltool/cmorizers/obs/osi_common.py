@@ -6,12 +6,12 @@ import glob
 from datetime import datetime, timedelta
 from calendar import monthrange, isleap
 
+import dask.array as da
 import numpy as np
 import iris
 import iris.exceptions
-from iris.cube import Cube, CubeList
-from iris.coords import AuxCoord
-from iris.coord_categorisation import add_day_of_year
+from iris.cube import Cube
+from iris.coords import DimCoord
 from esmvalcore.preprocessor import monthly_statistics
 
 from .utilities import (set_global_atts, convert_timeunits, fix_var_metadata,
@@ -120,19 +120,11 @@ class OSICmorizer():
     def _fill_months(cube):
         if cube.coord('time').shape[0] == 12:
             return cube
-        cubes = CubeList(cube.slices_over('time'))
-        model_cube = cubes[0].copy()
-        for month in range(1, 13):
-            month_constraint = iris.Constraint(
-                # pylint: disable=cell-var-from-loop
-                time=lambda cell: cell.point.month == month
-            )
-            if cubes.extract(month_constraint):
-                continue
-            cubes.append(
-                OSICmorizer._create_nan_cube(model_cube, month, month=True))
-        cube = cubes.merge_cube()
-        return cube
+        months = [cell.point.month for cell in cube.coord('time').cells()]
+        return OSICmorizer._fill_time_steps(cube,
+                                            np.array(months) - 1,
+                                            12,
+                                            month=True)
 
     def _fill_days(self, cube, year):
         if cube.coord('time').shape[0] < self.min_days:
@@ -143,51 +135,79 @@ class OSICmorizer():
             return None
         total_days = 366 if isleap(year) else 365
         if cube.coord('time').shape[0] < total_days:
-            cubes = OSICmorizer._add_nan_timesteps(cube, total_days)
-            cube = cubes.merge_cube()
-            cube.remove_coord('day_of_year')
-            del cubes
+            days = [
+                cell.point.timetuple().tm_yday
+                for cell in cube.coord('time').cells()
+            ]
+            cube = OSICmorizer._fill_time_steps(cube,
+                                                np.array(days) - 1,
+                                                total_days,
+                                                month=False)
         return cube
 
     @staticmethod
-    def _add_nan_timesteps(cube, total_days):
-        add_day_of_year(cube, 'time')
-        cubes = CubeList(cube.slices_over('time'))
-        model_cube = cubes[0].copy()
-        model_cube.remove_coord('day_of_year')
-        for day_of_year in range(total_days):
-            day_constraint = iris.Constraint(
-                day_of_year=day_of_year + 1
-            )
-            if cubes.extract(day_constraint):
-                continue
-            nan_cube = OSICmorizer._create_nan_cube(
-                model_cube, day_of_year, month=False
-            )
-            add_day_of_year(nan_cube, 'time')
-            cubes.append(nan_cube)
-        del model_cube
-        return cubes
+    def _fill_time_steps(cube, indices, total, month):
+        """Place the time steps of the cube on a complete time axis.
+
+        The time step `i` of `cube` is placed at `indices[i]` of a time
+        axis with `total` steps. The data of the missing time steps are
+        masked and their times are created by `_get_nan_time`.
+        """
+        time_coord = cube.coord('time')
+        time_dim = cube.coord_dims(time_coord)[0]
+        missing = np.ones(total, dtype=bool)
+        missing[indices] = False
+        source = np.zeros(total, dtype=int)
+        source[indices] = np.arange(len(indices))
+
+        # Gather the existing time steps (missing ones are copies of the
+        # first time step) and mask the missing ones afterwards
+        keys = [slice(None)] * cube.ndim
+        keys[time_dim] = source
+        filled_cube = cube[tuple(keys)]
+        data = filled_cube.lazy_data()
+        mask_shape = [1] * cube.ndim
+        mask_shape[time_dim] = total
+        mask_chunks = [1] * cube.ndim
+        mask_chunks[time_dim] = data.chunks[time_dim]
+        mask = da.broadcast_to(
+            da.from_array(missing.reshape(mask_shape), chunks=mask_chunks),
+            data.shape,
+            chunks=data.chunks)
+        filled_cube.data = da.ma.masked_where(mask, data)
+
+        # Create the complete time coordinate
+        points = time_coord.points[source].astype(np.float64)
+        bounds = None
+        if time_coord.has_bounds():
+            bounds = time_coord.bounds[source].astype(np.float64)
+        first_date = time_coord.cell(0).point
+        for num in np.nonzero(missing)[0]:
+            (point, point_bounds) = OSICmorizer._get_nan_time(
+                time_coord, first_date, num, month)
+            points[num] = point
+            if bounds is not None:
+                bounds[num] = point_bounds
+        filled_cube.remove_coord(filled_cube.coord('time'))
+        filled_cube.add_dim_coord(
+            DimCoord.from_coord(time_coord.copy(points, bounds)), time_dim)
+        return filled_cube
 
     @staticmethod
-    def _create_nan_cube(model_cube, num, month):
-        nan_cube = model_cube.copy(
-            np.ma.masked_all(model_cube.shape, dtype=model_cube.dtype)
-        )
-        time_coord = nan_cube.coord('time')
-        nan_cube.remove_coord(time_coord)
-        date = time_coord.cell(0).point
+    def _get_nan_time(time_coord, date, num, month):
+        """Get time point and bounds of a missing month or day."""
         if month:
+            num += 1
             date = datetime(date.year, num, date.day)
             bounds = (
                 datetime(date.year, num, 1),
                 datetime(date.year, num, monthrange(date.year, num)[1])
             )
         else:
-            date = datetime(date.year, 1, 1, 12) + timedelta(days=num)
+            date = datetime(date.year, 1, 1, 12) + timedelta(days=int(num))
             bounds = (
-                datetime(date.year, 1, 1) + timedelta(days=num),
-                datetime(date.year, 1, 1, 23, 59) + timedelta(days=num)
+                datetime(date.year, 1, 1) + timedelta(days=int(num)),
+                datetime(date.year, 1, 1, 23, 59) + timedelta(days=int(num))
             )
 
         date = time_coord.units.date2num(date)
@@ -195,16 +215,7 @@ class OSICmorizer():
             time_coord.units.date2num(bounds[0]),
             time_coord.units.date2num(bounds[1]),
         )
-        nan_cube.add_aux_coord(AuxCoord(
-            [date],
-            standard_name=time_coord.standard_name,
-            var_name=time_coord.var_name,
-            long_name=time_coord.long_name,
-            units=time_coord.units,
-            attributes=time_coord.attributes,
-            bounds=[bounds],
-        ))
-        return nan_cube
+        return (date, bounds)
 
     @staticmethod
     def _unify_attributes(cubes):
@@ -4,8 +4,11 @@ import datetime
 import logging
 import os
 import re
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
 from contextlib import contextmanager
 
+import dask
 import iris
 import numpy as np
 import yaml
@@ -19,6 +22,10 @@ logger = logging.getLogger(__name__)
 
 REFERENCES_PATH = Path(esmvaltool_file).absolute().parent / 'references'
 
+UP_TO_DATE_KEY = 'up_to_date_input_files'
+
+OUTPUT_KEY = 'output'
+
 
 def add_height2m(cube):
     """Add scalar coordinate 'height' with value of 2m."""
@@ -38,6 +45,44 @@ def add_scalar_height_coord(cube, height=2.):
     cube.add_aux_coord(height_coord, ())
 
 
+def bin_mean(data, indices, n_cells):
+    """Average data at several locations per grid cell for all levels at once.
+
+    Parameters
+    ----------
+    data : numpy.ma.MaskedArray
+        Data with shape (locations, levels). Masked and NaN values are
+        ignored.
+    indices : numpy.ndarray
+        Index of the grid cell of each location, as returned by
+        :func:`grid_indices`. Locations with negative indices are ignored.
+    n_cells : int
+        Number of grid cells.
+
+    Returns
+    -------
+    numpy.ma.MaskedArray
+        Mean values with shape (levels, cells), masked where no valid data
+        is available. Single precision data are averaged in double precision,
+        but returned in single precision.
+
+    """
+    n_levels = data.shape[1]
+    values = np.ma.getdata(data)
+    valid = ~(np.ma.getmaskarray(data) | np.isnan(values))
+    valid &= (indices >= 0)[:, np.newaxis]
+    flat_indices = (indices[:, np.newaxis] * n_levels +
+                    np.arange(n_levels))[valid]
+    sums = np.bincount(flat_indices,
+                       weights=values[valid],
+                       minlength=n_cells * n_levels)
+    counts = np.bincount(flat_indices, minlength=n_cells * n_levels)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sums / counts
+    mean = mean.astype(np.result_type(values.dtype, np.float32))
+    return np.ma.masked_invalid(mean.reshape(n_cells, n_levels).T)
+
+
 @contextmanager
 def constant_metadata(cube):
     """Do cube math without modifying units etc."""
@@ -62,46 +107,40 @@ def convert_timeunits(cube, start_year):
 
 
 def fix_coords(cube):
-    """Fix the time units and values to CMOR standards."""
+    """Fix the time units and values to CMOR standards.
+
+    All fixes are applied in a single pass over the coordinates and only
+    operate on the coordinate arrays. Lazy cube data stays lazy.
+    """
     # first fix any completely missing coord var names
     _fix_dim_coordnames(cube)
     # fix individual coords
     for cube_coord in cube.coords():
+        var_name = cube_coord.var_name
+
         # fix time
-        if cube_coord.var_name == 'time':
+        if var_name == 'time':
             logger.info("Fixing time...")
-            cube.coord('time').convert_units(
+            cube_coord.convert_units(
                 Unit('days since 1950-1-1 00:00:00', calendar='gregorian'))
-            _fix_bounds(cube, cube.coord('time'))
+            _fix_bounds(cube_coord)
 
         # fix longitude
-        if cube_coord.var_name == 'lon':
+        elif var_name == 'lon':
             logger.info("Fixing longitude...")
             if cube_coord.ndim == 1:
-                if cube_coord.points[0] < 0. and \
-                        cube_coord.points[-1] < 181.:
-                    cube_coord.points = \
-                        cube_coord.points + 180.
-                    _fix_bounds(cube, cube_coord)
+                points = cube_coord.points
+                if points[0] < 0. and points[-1] < 181.:
+                    cube_coord.points = points + 180.
+                    _fix_bounds(cube_coord)
                     cube.attributes['geospatial_lon_min'] = 0.
                     cube.attributes['geospatial_lon_max'] = 360.
-                    nlon = len(cube_coord.points)
-                    _roll_cube_data(cube, nlon // 2, -1)
-
-        # fix latitude
-        if cube_coord.var_name == 'lat':
-            logger.info("Fixing latitude...")
-            _fix_bounds(cube, cube.coord('latitude'))
-
-        # fix depth
-        if cube_coord.var_name == 'lev':
-            logger.info("Fixing depth...")
-            _fix_bounds(cube, cube.coord('depth'))
+                    _roll_cube_data(cube, len(points) // 2, -1)
 
-        # fix air_pressure
-        if cube_coord.var_name == 'air_pressure':
-            logger.info("Fixing air pressure...")
-            _fix_bounds(cube, cube.coord('air_pressure'))
+        # fix latitude, depth and air_pressure
+        elif var_name in ('lat', 'lev', 'air_pressure'):
+            logger.info("Fixing %s...", cube_coord.name().replace('_', ' '))
+            _fix_bounds(cube_coord)
 
     # remove CS
     cube.coord('latitude').coord_system = None
@@ -133,8 +172,130 @@ def flip_dim_coord(cube, coord_name):
     cube.data = da.flip(cube.core_data(), axis=coord_idx)
 
 
+def get_n_workers(config_user):
+    """Get the number of workers used for parallel CMORization jobs."""
+    n_workers = config_user.get('max_parallel_tasks')
+    if n_workers is None:
+        n_workers = max(int(os.cpu_count() / 1.5), 1)
+    return n_workers
+
+
+def run_jobs(function, jobs, n_workers=1, executor='process',
+             max_pending=None):
+    """Run CMORization jobs, e.g. one per variable and input file chunk.
+
+    Parameters
+    ----------
+    function : callable
+        Function that processes a single job. It must be defined at module
+        level when running on a process pool.
+    jobs : iterable of list or tuple
+        Positional arguments of `function` for each job. Jobs are only
+        consumed when they are submitted, so a generator can be used to
+        avoid preparing all jobs at once.
+    n_workers : int, optional (default: 1)
+        Number of workers. If 1, jobs are run sequentially in the current
+        process.
+    executor : str, optional (default: 'process')
+        Use a pool of processes (``'process'``) or threads (``'thread'``).
+        Note that the netCDF library is not thread-safe, so use threads only
+        for jobs that do not read or write netCDF files concurrently.
+    max_pending : int, optional
+        Maximum number of jobs that are submitted, but not finished yet. This
+        bounds the memory needed for the job arguments and results. Defaults
+        to `n_workers`.
+
+    Returns
+    -------
+    list
+        Return values of `function`, in the order of `jobs`.
+
+    Raises
+    ------
+    ValueError
+        Invalid `executor` given.
+
+    """
+    if n_workers == 1:
+        return [function(*job) for job in jobs]
+
+    if executor == 'process':
+        pool = ProcessPoolExecutor(max_workers=n_workers,
+                                   initializer=_init_worker)
+    elif executor == 'thread':
+        pool = ThreadPoolExecutor(max_workers=n_workers)
+    else:
+        raise ValueError(
+            f"Expected 'process' or 'thread' for executor, got '{executor}'")
+    if max_pending is None:
+        max_pending = n_workers
+
+    results = {}
+    pending = {}
+    with pool:
+        for (idx, job) in enumerate(jobs):
+            if len(pending) >= max_pending:
+                _collect_results(function, pending, results)
+            pending[pool.submit(function, *job)] = (idx, job)
+        while pending:
+            _collect_results(function, pending, results)
+    return [results[idx] for idx in sorted(results)]
+
+
+def grid_indices(lat, lon, grid_lats, grid_lons):
+    """Get flat indices of the grid points at the given locations.
+
+    Only locations that coincide with a point of the grid (e.g. after rounding
+    the coordinates) are mapped, all other locations get the index -1.
+
+    Parameters
+    ----------
+    lat : numpy.ndarray
+        Latitudes of the locations.
+    lon : numpy.ndarray
+        Longitudes of the locations.
+    grid_lats : numpy.ndarray
+        Latitudes of the grid (strictly increasing).
+    grid_lons : numpy.ndarray
+        Longitudes of the grid (strictly increasing).
+
+    Returns
+    -------
+    numpy.ndarray
+        Index of each location in the flattened (lat, lon) grid.
+
+    """
+    lat = np.ma.filled(lat, np.nan)
+    lon = np.ma.filled(lon, np.nan)
+    lat_idx = np.clip(np.searchsorted(grid_lats, lat), 0, len(grid_lats) - 1)
+    lon_idx = np.clip(np.searchsorted(grid_lons, lon), 0, len(grid_lons) - 1)
+    on_grid = (grid_lats[lat_idx] == lat) & (grid_lons[lon_idx] == lon)
+    return np.where(on_grid, lat_idx * len(grid_lons) + lon_idx, -1)
+
+
+def is_up_to_date(in_files, config_user):
+    """Check if the output of `in_files` is current in incremental mode.
+
+    In incremental mode, :mod:`esmvaltool.cmorizers.obs.cmorize_obs` stores
+    the input files that did not change since the last successful run of the
+    cmorizer in the user configuration. Cmorizers that write one output file
+    per variable or year can use this to skip files that are up to date.
+    """
+    up_to_date_files = config_user.get(UP_TO_DATE_KEY)
+    if not up_to_date_files or not in_files:
+        return False
+    return all(
+        os.path.abspath(in_file) in up_to_date_files for in_file in in_files)
+
+
 def read_cmor_config(dataset):
-    """Read the associated dataset-specific config file."""
+    """Read the associated dataset-specific config file.
+
+    The optional ``output`` section of the config file, which configures
+    how :func:`save_variable` writes the files, is made available in the
+    global attributes ``cfg['attributes']``, which are passed to
+    :func:`save_variable` by all cmorizers.
+    """
     reg_path = os.path.join(os.path.dirname(__file__), 'cmor_config',
                             dataset + '.yml')
     with open(reg_path, 'r') as file:
@@ -143,44 +304,42 @@ def read_cmor_config(dataset):
         CMOR_TABLES[cfg['attributes']['project_id']]
     if 'comment' not in cfg['attributes']:
         cfg['attributes']['comment'] = ''
+    if OUTPUT_KEY in cfg:
+        cfg['attributes'][OUTPUT_KEY] = cfg[OUTPUT_KEY]
     return cfg
 
 
 def save_variable(cube, var, outdir, attrs, **kwargs):
-    """Saver function."""
+    """Saver function.
+
+    The data is written lazily, i.e. chunk by chunk if the cube has lazy
+    data. The ``output`` item of `attrs` (see :func:`read_cmor_config`) may
+    contain the keys ``zlib``, ``complevel`` and ``shuffle`` to configure
+    compression, ``chunksizes`` to set the NetCDF chunk shape (a mapping of
+    coordinate names to chunk sizes, missing dimensions are not chunked)
+    and ``split_by_year`` to write one file per year. Keyword arguments are
+    passed to :func:`iris.save` and take precedence over these settings.
+    """
     _fix_dtype(cube)
-    # CMOR standard
-    try:
-        time = cube.coord('time')
-    except iris.exceptions.CoordinateNotFoundError:
-        time_suffix = None
+    settings = dict(attrs.get(OUTPUT_KEY) or {})
+    split_by_year = settings.pop('split_by_year', False)
+    chunksizes = settings.pop('chunksizes', None)
+    for (key, val) in settings.items():
+        kwargs.setdefault(key, val)
+
+    if split_by_year and cube.coords('time') and cube.coord_dims('time'):
+        cubes = _split_by_year(cube)
     else:
-        if len(time.points) == 1:
-            year = str(time.cell(0).point.year)
-            time_suffix = '-'.join([year + '01', year + '12'])
-        else:
-            date1 = str(time.cell(0).point.year) + '%02d' % \
-                time.cell(0).point.month
-            date2 = str(time.cell(-1).point.year) + '%02d' % \
-                time.cell(-1).point.month
-            time_suffix = '-'.join([date1, date2])
-
-    name_elements = [
-        attrs['project_id'],
-        attrs['dataset_id'],
-        attrs['modeling_realm'],
-        attrs['version'],
-        attrs['mip'],
-        var,
-    ]
-    if time_suffix:
-        name_elements.append(time_suffix)
-    file_name = '_'.join(name_elements) + '.nc'
-    file_path = os.path.join(outdir, file_name)
-    logger.info('Saving: %s', file_path)
-    status = 'lazy' if cube.has_lazy_data() else 'realized'
-    logger.info('Cube has %s data [lazy is preferred]', status)
-    iris.save(cube, file_path, fill_value=1e20, **kwargs)
+        cubes = [cube]
+    for sub_cube in cubes:
+        save_kwargs = dict(kwargs)
+        if chunksizes is not None and 'chunksizes' not in save_kwargs:
+            save_kwargs['chunksizes'] = _get_chunksizes(sub_cube, chunksizes)
+        file_path = _get_file_path(sub_cube, var, outdir, attrs)
+        logger.info('Saving: %s', file_path)
+        status = 'lazy' if sub_cube.has_lazy_data() else 'realized'
+        logger.info('Cube has %s data [lazy is preferred]', status)
+        iris.save(sub_cube, file_path, fill_value=1e20, **save_kwargs)
 
 
 def extract_doi_value(tag):
@@ -211,6 +370,8 @@ def set_global_atts(cube, attrs):
     timestamp_format = "%Y-%m-%d %H:%M:%S"
     now_time = timestamp.strftime(timestamp_format)
 
+    attrs.pop(OUTPUT_KEY, None)
+
     # Necessary attributes
     try:
         glob_dict = {
@@ -251,17 +412,95 @@ def var_name_constraint(var_name):
     return iris.Constraint(cube_func=lambda c: c.var_name == var_name)
 
 
-def _fix_bounds(cube, dim_coord):
+def _collect_results(function, pending, results):
+    """Wait until at least one pending job is finished and store results."""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        (idx, job) = pending.pop(future)
+        try:
+            results[idx] = future.result()
+        except:  # noqa
+            logger.error("Failed to run %s for %s", function.__name__,
+                         job[0] if job else 'job {}'.format(idx))
+            raise
+
+
+def _init_worker():
+    """Let dask compute sequentially in worker processes.
+
+    This avoids starting a dask thread pool in each worker process, which
+    would oversubscribe the CPUs and multiply the memory usage.
+    """
+    dask.config.set(scheduler='synchronous')
+
+
+def _get_chunksizes(cube, chunksizes):
+    """Get NetCDF chunk shape from a mapping of coordinate names to sizes."""
+    if not isinstance(chunksizes, dict):
+        return list(chunksizes)
+    shape = list(cube.shape)
+    for (name, size) in chunksizes.items():
+        if not cube.coords(name, dim_coords=True):
+            continue
+        dim = cube.coord_dims(cube.coord(name, dim_coords=True))[0]
+        shape[dim] = min(size, cube.shape[dim])
+    return shape
+
+
+def _get_file_path(cube, var, outdir, attrs):
+    """Get CMOR standard file path of a cube."""
+    try:
+        time = cube.coord('time')
+    except iris.exceptions.CoordinateNotFoundError:
+        time_suffix = None
+    else:
+        if len(time.points) == 1:
+            year = str(time.cell(0).point.year)
+            time_suffix = '-'.join([year + '01', year + '12'])
+        else:
+            date1 = str(time.cell(0).point.year) + '%02d' % \
+                time.cell(0).point.month
+            date2 = str(time.cell(-1).point.year) + '%02d' % \
+                time.cell(-1).point.month
+            time_suffix = '-'.join([date1, date2])
+
+    name_elements = [
+        attrs['project_id'],
+        attrs['dataset_id'],
+        attrs['modeling_realm'],
+        attrs['version'],
+        attrs['mip'],
+        var,
+    ]
+    if time_suffix:
+        name_elements.append(time_suffix)
+    file_name = '_'.join(name_elements) + '.nc'
+    return os.path.join(outdir, file_name)
+
+
+def _split_by_year(cube):
+    """Split cube along time into one cube per year (without loading)."""
+    time = cube.coord('time')
+    time_dim = cube.coord_dims(time)[0]
+    years = np.array([date.year for date in time.units.num2date(time.points)])
+    cubes = []
+    for year in np.unique(years):
+        indices = np.nonzero(years == year)[0]
+        slices = [slice(None)] * cube.ndim
+        slices[time_dim] = slice(indices[0], indices[-1] + 1)
+        cubes.append(cube[tuple(slices)])
+    return cubes
+
+
+def _fix_bounds(coord):
     """Reset and fix all bounds."""
-    if len(cube.coord(dim_coord).points) > 1:
-        if cube.coord(dim_coord).has_bounds():
-            cube.coord(dim_coord).bounds = None
-        cube.coord(dim_coord).guess_bounds()
-
-    if cube.coord(dim_coord).has_bounds():
-        cube.coord(dim_coord).bounds = da.array(
-            cube.coord(dim_coord).core_bounds(), dtype='float64')
-    return cube
+    if coord.shape[0] > 1:
+        coord.bounds = None
+        coord.guess_bounds()
+
+    if coord.has_bounds():
+        coord.bounds = da.array(coord.core_bounds(), dtype='float64')
+    return coord
 
 
 def _fix_dim_coordnames(cube):
@@ -335,8 +574,24 @@ def _fix_dtype(cube):
 
 
 def _roll_cube_data(cube, shift, axis):
-    """Roll a cube data on specified axis."""
-    cube.data = da.roll(cube.core_data(), shift, axis=axis)
+    """Roll a cube data on specified axis.
+
+    Realized data is rolled in memory. Lazy data whose axis consists of a
+    single chunk is rolled chunk by chunk; otherwise, the axis is rechunked
+    to its original chunks, since :func:`dask.array.roll` splits the chunks
+    along the axis at the roll position.
+    """
+    data = cube.core_data()
+    if not cube.has_lazy_data():
+        cube.data = np.roll(data, shift, axis=axis)
+        return cube
+    axis = axis % data.ndim
+    if len(data.chunks[axis]) == 1:
+        cube.data = data.map_blocks(np.roll, shift, axis=axis,
+                                    dtype=data.dtype)
+    else:
+        cube.data = da.roll(data, shift, axis=axis).rechunk(
+            {axis: data.chunks[axis]})
     return cube
 
 
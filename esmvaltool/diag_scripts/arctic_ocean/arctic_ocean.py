@@ -29,6 +29,7 @@ import itertools
 import logging
 import os
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 import cartopy.crs as ccrs
 from matplotlib import cm
@@ -41,8 +42,8 @@ from esmvaltool.diag_scripts.arctic_ocean.plotting import (
     hofm_plot, plot2d_bias, plot2d_original_grid, plot_aw_core_stat,
     plot_profile, transect_map, transect_plot, tsplot_plot)
 from esmvaltool.diag_scripts.arctic_ocean.utils import (
-    find_observations_name, get_clim_model_filenames, get_cmap,
-    get_fx_filenames, timmean)
+    compute_timmean, find_observations_name, get_clim_model_filenames,
+    get_cmap, get_fx_filenames, timmean)
 from esmvaltool.diag_scripts.shared import run_diagnostic
 
 
@@ -66,6 +67,8 @@ def run_hofm_data(cfg):
                  to extract monthly values for `hofm_regions`")
 
     logger.info("`hofm_vars` are: %s", cfg['hofm_vars'])
+    # indexes of the regions, reused for all variables
+    region_indexes = {}
     # doing the loop for every variable
     for hofm_var in cfg['hofm_vars']:
         logger.info("Processing %s", hofm_var)
@@ -74,11 +77,10 @@ def run_hofm_data(cfg):
         model_filenames = get_clim_model_filenames(cfg, hofm_var)
         model_filenames = OrderedDict(
             sorted(model_filenames.items(), key=lambda t: t[0]))
-        # loop over regions and models
-        for mmodel, region in itertools.product(model_filenames,
-                                                cfg['hofm_regions']):
-            # actual extraction of the data for specific model and region
-            hofm_data(cfg, model_filenames, mmodel, hofm_var, region)
+        # loop over models, extracting the data for all regions at once
+        for mmodel in model_filenames:
+            hofm_data(cfg, model_filenames, mmodel, hofm_var,
+                      cfg['hofm_regions'], region_indexes)
 
 
 def hofm_plot_params(cfg, hofm_var, var_number, observations):
@@ -142,6 +144,9 @@ def run_hofm_plot(cfg, observations):
 def run_mean(cfg, observations):
     """Create time mean.
 
+    The time means of all model/variable pairs are computed in parallel
+    if `n_workers` is larger than one.
+
     Parameters
     ----------
     cfg: dict
@@ -149,7 +154,8 @@ def run_mean(cfg, observations):
     observations: str
         name of the observation data set
     """
-    # loop over variables
+    # collect all variables and models
+    tasks = []
     for hofm_var in cfg['hofm_vars']:
         model_filenames = get_clim_model_filenames(
             cfg,
@@ -157,13 +163,28 @@ def run_mean(cfg, observations):
         )
         model_filenames = OrderedDict(
             sorted(model_filenames.items(), key=lambda t: t[0]))
-        # loop over models
         for model in model_filenames:
-            timmean(cfg,
-                    model_filenames,
-                    model,
-                    hofm_var,
-                    observations=observations)
+            tasks.append((hofm_var, model, model_filenames))
+
+    n_workers = cfg.get('n_workers', 1)
+    if n_workers > 1:
+        logger.info("Calculate timmean using %s worker processes",
+                    n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(
+                executor.map(compute_timmean,
+                             [files[model] for _, model, files in tasks],
+                             [hofm_var for hofm_var, _, _ in tasks]))
+    else:
+        results = [None] * len(tasks)
+
+    for (hofm_var, model, model_filenames), result in zip(tasks, results):
+        timmean(cfg,
+                model_filenames,
+                model,
+                hofm_var,
+                observations=observations,
+                timmean_data=result)
 
 
 def plot_profile_params(cfg, hofm_var, observations):
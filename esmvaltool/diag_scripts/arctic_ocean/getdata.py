@@ -4,8 +4,11 @@
 This module contains functions for extracting the data
 from netCDF files and prepearing them for plotting.
 """
+import hashlib
 import logging
 import os
+from collections import OrderedDict
+
 import ESMF
 import numpy as np
 from netCDF4 import Dataset, num2date
@@ -16,11 +19,17 @@ from esmvaltool.diag_scripts.arctic_ocean.utils import (genfilename,
                                                         point_distance,
                                                         get_fx_filenames,
                                                         get_series_lenght,
-                                                        get_provenance_record)
+                                                        get_provenance_record,
+                                                        get_timmean,
+                                                        get_timmean_file)
 from esmvaltool.diag_scripts.shared import ProvenanceLogger
 
 logger = logging.getLogger(os.path.basename(__file__))
 
+# Nearest source points of the destination points, see
+# `esmf_nearest_indices`
+_NEAREST_INDICES = {}
+
 
 def load_meta(datapath, fxpath=None):
     """Load metadata of the netCDF file.
@@ -78,21 +87,73 @@ def load_meta(datapath, fxpath=None):
     return metadata
 
 
-def hofm_extract_region(metadata, cmor_var, indexes, level, time=0):
-    """Calculates mean over the region."""
-    # fix for climatology
-    if metadata['datafile'].variables[cmor_var].ndim < 4:
-        level_pp = metadata['datafile'].variables[cmor_var][level, :, :]
-    else:
-        level_pp = metadata['datafile'].variables[cmor_var][time, level, :, :]
-    if not isinstance(level_pp, np.ma.MaskedArray):
-        level_pp = np.ma.masked_equal(level_pp, 0)
-    data_mask = level_pp[indexes[0], indexes[1]].mask
-    area_masked = np.ma.masked_where(
-        data_mask, metadata['areacello'][indexes[0], indexes[1]])
-    result = (area_masked *
-              level_pp[indexes[0], indexes[1]]).sum() / area_masked.sum()
-    return result
+def hofm_extract_regions(metadata, cmor_var, regions, lev_limit,
+                         block_bytes=64 * (1 << 20)):
+    """Calculates means over several regions for all levels and time steps.
+
+    The data are read in blocks of time steps and all regional means are
+    computed in a single reduction per block.
+
+    Parameters
+    ----------
+    metadata: dict
+        metadata of the netCDF file, as returned by `load_meta`.
+    cmor_var: str
+        name of the CMOR variable.
+    regions: OrderedDict
+        region names as keys and indexes of the region points,
+        as returned by `hofm_regions`, as values.
+    lev_limit: int
+        number of levels to process.
+    block_bytes: int
+        approximate size of the blocks of data read at once.
+
+    Returns
+    -------
+    OrderedDict
+        region names as keys and arrays (level, time) with the
+        area weighted means as values.
+    """
+    variable = metadata['datafile'].variables[cmor_var]
+    series_lenght = get_series_lenght(metadata['datafile'], cmor_var)
+    nlev = metadata['lev'][0:lev_limit].shape[0]
+
+    # Gather the points of all regions, so they can be reduced at once
+    indexesi = np.hstack([regions[region][0] for region in regions])
+    indexesj = np.hstack([regions[region][1] for region in regions])
+    sizes = np.array([len(regions[region][0]) for region in regions])
+    nonempty = sizes > 0
+    offsets = (np.cumsum(sizes) - sizes)[nonempty]
+    area = metadata['areacello'][indexesi, indexesj]
+    area_valid = ~np.ma.getmaskarray(area)
+    area = np.ma.filled(area, 0.)
+
+    # Number of time steps read at once
+    step_bytes = np.prod(variable.shape[-3:]) * variable.dtype.itemsize
+    ntime = max(1, block_bytes // step_bytes)
+
+    oce_hofm = np.full((len(regions), nlev, series_lenght), np.nan)
+    for start in range(0, series_lenght if nonempty.any() else 0, ntime):
+        # fix for climatology
+        if variable.ndim < 4:
+            block = variable[0:lev_limit, :, :][np.newaxis]
+        else:
+            block = variable[start:start + ntime, 0:lev_limit, :, :]
+        if not isinstance(block, np.ma.MaskedArray):
+            block = np.ma.masked_equal(block, 0)
+        block = block[:, :, indexesi, indexesj]
+        weights = np.where(np.ma.getmaskarray(block) | ~area_valid, 0., area)
+        weight_sums = np.add.reduceat(weights, offsets, axis=-1)
+        value_sums = np.add.reduceat(weights * np.ma.filled(block, 0.),
+                                     offsets,
+                                     axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(weight_sums > 0, value_sums / weight_sums,
+                             np.nan)
+        # (time, level, region) -> (region, level, time)
+        oce_hofm[nonempty, :, start:start + ntime] = means.transpose(2, 1, 0)
+
+    return OrderedDict(zip(regions, oce_hofm))
 
 
 def hofm_save_data(cfg, data_info, oce_hofm):
@@ -126,7 +187,8 @@ def hofm_save_data(cfg, data_info, oce_hofm):
                               provenance_record)
 
 
-def hofm_data(cfg, model_filenames, mmodel, cmor_var, region):
+def hofm_data(cfg, model_filenames, mmodel, cmor_var, regions,
+              region_indexes=None):
     """Extract data for Hovmoeller diagrams from monthly values.
 
     Saves the data to files in `diagworkdir`.
@@ -139,20 +201,22 @@ def hofm_data(cfg, model_filenames, mmodel, cmor_var, region):
         model name that will be processed.
     cmor_var: str
         name of the CMOR variable
-    areacello_fx: OrderedDict.
-        dictionary with model names as keys and paths to fx files as values.
-    max_level: float
-        maximum depth level the Hovmoeller diagrams should go to.
-    region: str
-        name of the region predefined in `hofm_regions` function.
-    diagworkdir: str
-        path to work directory.
+    regions: list or str
+        names of the regions predefined in `hofm_regions` function.
+    region_indexes: dict
+        cache for the indexes of the regions, with (model, region) as keys.
+        Pass the same dictionary for all variables to reuse the indexes.
 
     Returns
     -------
     None
     """
-    logger.info("Extract  %s data for %s, region %s", cmor_var, mmodel, region)
+    if isinstance(regions, str):
+        regions = [regions]
+    if region_indexes is None:
+        region_indexes = {}
+    logger.info("Extract  %s data for %s, regions %s", cmor_var, mmodel,
+                ', '.join(regions))
     areacello_fx = get_fx_filenames(cfg, 'areacello')
     metadata = load_meta(datapath=model_filenames[mmodel],
                          fxpath=areacello_fx[mmodel])
@@ -160,69 +224,93 @@ def hofm_data(cfg, model_filenames, mmodel, cmor_var, region):
     lev_limit = metadata['lev'][
         metadata['lev'] <= cfg['hofm_depth']].shape[0] + 1
 
-    indexes = hofm_regions(region, metadata['lon2d'], metadata['lat2d'])
-
-    series_lenght = get_series_lenght(metadata['datafile'], cmor_var)
-
-    oce_hofm = np.zeros((metadata['lev'][0:lev_limit].shape[0], series_lenght))
-    for mon in range(series_lenght):
-        for ind, _ in enumerate(metadata['lev'][0:lev_limit]):
-            oce_hofm[ind, mon] = hofm_extract_region(metadata, cmor_var,
-                                                     indexes, ind, mon)
-    data_info = {}
-    data_info['basedir'] = cfg['work_dir']
-    data_info['variable'] = cmor_var
-    data_info['mmodel'] = mmodel
-    data_info['region'] = region
-    data_info['time'] = metadata['time']
-    data_info['levels'] = metadata['lev']
-    data_info['lev_limit'] = lev_limit
-    data_info['ori_file'] = model_filenames[mmodel]
-    data_info['areacello'] = areacello_fx[mmodel]
-
-    hofm_save_data(cfg, data_info, oce_hofm)
+    indexes = OrderedDict()
+    for region in regions:
+        if (mmodel, region) not in region_indexes:
+            region_indexes[(mmodel, region)] = hofm_regions(
+                region, metadata['lon2d'], metadata['lat2d'])
+        indexes[region] = region_indexes[(mmodel, region)]
+
+    oce_hofm = hofm_extract_regions(metadata, cmor_var, indexes, lev_limit)
+
+    for region in regions:
+        data_info = {}
+        data_info['basedir'] = cfg['work_dir']
+        data_info['variable'] = cmor_var
+        data_info['mmodel'] = mmodel
+        data_info['region'] = region
+        data_info['time'] = metadata['time']
+        data_info['levels'] = metadata['lev']
+        data_info['lev_limit'] = lev_limit
+        data_info['ori_file'] = model_filenames[mmodel]
+        data_info['areacello'] = areacello_fx[mmodel]
+
+        hofm_save_data(cfg, data_info, oce_hofm[region])
 
     metadata['datafile'].close()
 
 
-def transect_level(datafile, cmor_var, level, grid, locstream):
-    """Interpolation for one level of transect."""
+def array_key(*arrays):
+    """Hash of the content of (masked) arrays, to be used as a cache key."""
+    key = hashlib.sha1()
+    for array in arrays:
+        key.update(np.ascontiguousarray(np.ma.getdata(array)).tobytes())
+        key.update(np.ascontiguousarray(np.ma.getmaskarray(array)).tobytes())
+    return key.hexdigest()
 
-    sourcefield = ESMF.Field(
-        grid,
-        staggerloc=ESMF.StaggerLoc.CENTER,
-        name='MPI',
-    )
-    # load model data
-    model_data = datafile.variables[cmor_var][0, level, :, :]
 
-    # ESMF do not understand masked arrays, so fill them
-    if isinstance(model_data, np.ma.core.MaskedArray):
-        sourcefield.data[...] = model_data.filled(0).T
-    else:
-        sourcefield.data[...] = model_data.T
+def esmf_nearest_indices(key, make_fields, **kwargs):
+    """Find the source points used by ESMF nearest neighbour regridding.
 
-    # create a field we giong to intorpolate TO
-    dstfield = ESMF.Field(locstream, name='dstfield')
-    dstfield.data[:] = 0.0
+    Nearest neighbour (NEAREST_STOD) regridding only copies the values of
+    the source points, so its weights can be stored as the index of the
+    source point of each destination point. The indexes are computed
+    once for each key, by regridding the indexes of the source points,
+    and reused for all levels and variables on the same grids.
 
-    # create an object to regrid data
-    # from the source to the destination field
-    dst_mask_values = None
-    # if domask:
-    dst_mask_values = np.array([0])
-
-    regrid = ESMF.Regrid(
-        sourcefield,
-        dstfield,
-        regrid_method=ESMF.RegridMethod.NEAREST_STOD,
-        # regrid_method=ESMF.RegridMethod.BILINEAR,
-        unmapped_action=ESMF.UnmappedAction.IGNORE,
-        dst_mask_values=dst_mask_values)
+    Parameters
+    ----------
+    key: hashable
+        identifies the source and destination grids and masks.
+    make_fields: callable
+        returns the ESMF.Field on the source grid and the ESMF.Field on the
+        destination grid or location stream. Only called if the indexes
+        for key are not known yet.
+    **kwargs:
+        additional arguments of ESMF.Regrid, like the mask values.
 
-    # do the regridding from source to destination field
-    dstfield = regrid(sourcefield, dstfield)
-    return dstfield
+    Returns
+    -------
+    numpy array
+        flat indexes of the source points in the (lat, lon) data, in the
+        (lat, lon) shape of the destination. Unmapped or masked
+        destination points get -1.
+    """
+    if key not in _NEAREST_INDICES:
+        sourcefield, dstfield = make_fields()
+        # ESMF fields are transposed with respect to the netCDF data
+        shape = sourcefield.data.T.shape
+        sourcefield.data[...] = (np.arange(np.prod(shape)).reshape(shape).T +
+                                 1)
+        dstfield.data[...] = 0.0
+        regrid = ESMF.Regrid(sourcefield,
+                             dstfield,
+                             regrid_method=ESMF.RegridMethod.NEAREST_STOD,
+                             unmapped_action=ESMF.UnmappedAction.IGNORE,
+                             **kwargs)
+        dstfield = regrid(sourcefield, dstfield)
+        _NEAREST_INDICES[key] = np.rint(dstfield.data.T).astype(int) - 1
+    return _NEAREST_INDICES[key]
+
+
+def apply_nearest_indices(data, indices):
+    """Regrid (level, lat, lon) or (lat, lon) data with nearest indexes.
+
+    Masked source values are set to 0, as are unmapped destination points.
+    """
+    data = np.ma.filled(data, 0)
+    data = data.reshape(data.shape[:-2] + (-1, ))
+    return np.where(indices >= 0, data[..., indices], 0.)
 
 
 def transect_save_data(cfg, data_info, secfield, lon_s4new, lat_s4new):
@@ -284,68 +372,66 @@ def transect_data(cfg, mmodel, cmor_var, region, mult=2):
     """
     logger.info("Extract  %s transect data for %s, region %s", cmor_var,
                 mmodel, region)
-    # get the path to preprocessed file
-    ifilename = genfilename(cfg['work_dir'],
-                            cmor_var,
-                            mmodel,
-                            data_type='timmean',
-                            extension='.nc')
-    # open with netCDF4
-    datafile = Dataset(ifilename)
-    # open with ESMF
-    grid = ESMF.Grid(filename=ifilename, filetype=ESMF.FileFormat.GRIDSPEC)
+    # get the time mean created by `timmean`
+    timmean_data = get_timmean(cfg, cmor_var, mmodel)
 
     # get depth of the levels
-    lev = datafile.variables['lev'][:]
+    lev = timmean_data['lev']
 
     # indexesi, indexesj = hofm_regions(region, lon2d, lat2d)
     lon_s4new, lat_s4new = transect_points(region, mult=mult)
 
-    # masking true
-    # domask = True
-
-    # create instans of the location stream (set of points)
-    locstream = ESMF.LocStream(lon_s4new.shape[0],
-                               name="Atlantic Inflow Section",
-                               coord_sys=ESMF.CoordSys.SPH_DEG)
-
-    # appoint the section locations
-    locstream["ESMF:Lon"] = lon_s4new
-    locstream["ESMF:Lat"] = lat_s4new
-    # if domask:
-    locstream["ESMF:Mask"] = np.array(np.ones(lon_s4new.shape[0]),
-                                      dtype=np.int32)
-    # initialise array for the section
-    secfield = np.zeros(
-        (lon_s4new.shape[0], datafile.variables[cmor_var].shape[1]))
-
-    # loop over depth levels
-    for level in range(0, datafile.variables[cmor_var].shape[1]):
-        secfield[:, level] = transect_level(datafile, cmor_var, level, grid,
-                                            locstream).data
+    # the interpolation weights are the same for all levels and variables
+    def make_fields():
+        # open with ESMF
+        grid = ESMF.Grid(filename=get_timmean_file(cfg, cmor_var, mmodel),
+                         filetype=ESMF.FileFormat.GRIDSPEC)
+        sourcefield = ESMF.Field(
+            grid,
+            staggerloc=ESMF.StaggerLoc.CENTER,
+            name='MPI',
+        )
+
+        # create instans of the location stream (set of points)
+        locstream = ESMF.LocStream(lon_s4new.shape[0],
+                                   name="Atlantic Inflow Section",
+                                   coord_sys=ESMF.CoordSys.SPH_DEG)
+
+        # appoint the section locations
+        locstream["ESMF:Lon"] = lon_s4new
+        locstream["ESMF:Lat"] = lat_s4new
+        locstream["ESMF:Mask"] = np.array(np.ones(lon_s4new.shape[0]),
+                                          dtype=np.int32)
+        # create a field we giong to intorpolate TO
+        dstfield = ESMF.Field(locstream, name='dstfield')
+        return sourcefield, dstfield
+
+    # the interpolation weights are the same for all levels and variables
+    key = ('transect', region, mult,
+           array_key(timmean_data['lon'], timmean_data['lat']))
+    indices = esmf_nearest_indices(key,
+                                   make_fields,
+                                   dst_mask_values=np.array([0]))
+
+    # interpolate all depth levels at once, section is (point, level)
+    secfield = apply_nearest_indices(timmean_data['data'], indices).T
     data_info = {}
     data_info['basedir'] = cfg['work_dir']
     data_info['variable'] = cmor_var
     data_info['mmodel'] = mmodel
     data_info['region'] = region
     data_info['levels'] = lev
-    data_info['ori_file'] = ifilename
+    data_info['ori_file'] = timmean_data['ori_file']
     data_info['areacello'] = None
 
     transect_save_data(cfg, data_info, secfield, lon_s4new, lat_s4new)
 
-    datafile.close()
-
 
 def tsplot_extract_data(mmodel, observations, metadata_t, metadata_s, ind):
-    """Extracts level data from the files for TS plots."""
+    """Extracts level data from the time means for TS plots."""
 
-    if mmodel != observations:
-        level_pp = metadata_t['datafile'].variables['thetao'][0, ind, :, :]
-        level_pp_s = metadata_s['datafile'].variables['so'][0, ind, :, :]
-    else:
-        level_pp = metadata_t['datafile'].variables['thetao'][0, ind, :, :]
-        level_pp_s = metadata_s['datafile'].variables['so'][0, ind, :, :]
+    level_pp = metadata_t['data'][ind, :, :]
+    level_pp_s = metadata_s['data'][ind, :, :]
     # This is fix fo make models with 0 as missing values work,
     # should be fixed in fixes that do not work for now in the new backend
     if not isinstance(level_pp, np.ma.MaskedArray):
@@ -404,22 +490,9 @@ def tsplot_data(cfg, mmodel, region, observations='PHC'):
     """
     logger.info("Extract  TS data for %s, region %s", mmodel, region)
 
-    # generate input names for T and S. The files are generated by the
-    # `timmean` function.
-    ifilename_t = genfilename(cfg['work_dir'],
-                              'thetao',
-                              mmodel,
-                              data_type='timmean',
-                              extension='.nc')
-    ifilename_s = genfilename(cfg['work_dir'],
-                              'so',
-                              mmodel,
-                              data_type='timmean',
-                              extension='.nc')
-    # get the metadata for T and S
-
-    metadata_t = load_meta(datapath=ifilename_t, fxpath=None)
-    metadata_s = load_meta(datapath=ifilename_s, fxpath=None)
+    # get the time means of T and S created by the `timmean` function.
+    metadata_t = get_timmean(cfg, 'thetao', mmodel)
+    metadata_s = get_timmean(cfg, 'so', mmodel)
 
     # find index of the max_level
     lev_limit = metadata_t['lev'][
@@ -449,13 +522,10 @@ def tsplot_data(cfg, mmodel, region, observations='PHC'):
     data_info['mmodel'] = mmodel
     data_info['region'] = region
     data_info['levels'] = metadata_t['lev']
-    data_info['ori_file'] = [ifilename_t, ifilename_s]
+    data_info['ori_file'] = [metadata_t['ori_file'], metadata_s['ori_file']]
     data_info['areacello'] = None
     tsplot_save_data(cfg, data_info, temp, salt, depth_model)
 
-    metadata_t['datafile'].close()
-    metadata_s['datafile'].close()
-
 
 def aw_core(model_filenames, diagworkdir, region, cmor_var):
     """Calculate Atlantic Water (AW) core depth the region.
@@ -11,7 +11,8 @@ import numpy as np
 from cartopy.util import add_cyclic_point
 # from netCDF4 import Dataset
 
-from esmvaltool.diag_scripts.arctic_ocean.getdata import load_meta
+from esmvaltool.diag_scripts.arctic_ocean.getdata import (
+    apply_nearest_indices, array_key, esmf_nearest_indices, load_meta)
 
 logger = logging.getLogger(os.path.basename(__file__))
 
@@ -89,27 +90,6 @@ def add_esmf_cyclic(metadata_obs, data_onlevel, interpolated):
     return lonc, latc, data_onlevel_cyc, interpolated_cyc
 
 
-def esmf_regriding(sourcefield, distfield, metadata_obs, data_onlev_obs):
-    """Use ESMF fields to do the regriding."""
-    # define the regrider
-    regrid = ESMF.Regrid(
-        sourcefield,
-        distfield,
-        regrid_method=ESMF.RegridMethod.NEAREST_STOD,
-        # regrid_method=ESMF.RegridMethod.BILINEAR,
-        unmapped_action=ESMF.UnmappedAction.IGNORE,
-        dst_mask_values=np.array([1]),
-        src_mask_values=np.array([1]))
-    # actual regriding
-    distfield = regrid(sourcefield, distfield)
-    # reshape the data and convert to masked array
-    data_interpolated = distfield.data[:].T
-    data_interpolated = np.ma.masked_equal(data_interpolated, 0)
-    lonc, latc, data_onlevel_cyc, interpolated_cyc = add_esmf_cyclic(
-        metadata_obs, data_onlev_obs, data_interpolated)
-    return lonc, latc, data_onlevel_cyc, interpolated_cyc
-
-
 def interpolate_esmf(obs_file, mod_file, depth, cmor_var):
     """The 2d interpolation with ESMF.
 
@@ -138,14 +118,27 @@ def interpolate_esmf(obs_file, mod_file, depth, cmor_var):
     data_onlev_mod = interpolate_vert(metadata_mod['lev'], target_depth,
                                       data_model[0, :, :, :])
 
-    # prepear interpolation fields
-    distfield = define_esmf_field(obs_file, data_onlev_obs, 'OBS')
-    distfield.data[:] = 0.0
-
-    sourcefield = define_esmf_field(mod_file, data_onlev_mod, 'Model')
-    sourcefield.data[...] = data_onlev_mod.T
-
-    lonc, latc, data_onlev_obs_cyc, data_interpolated_cyc = esmf_regriding(
-        sourcefield, distfield, metadata_obs, data_onlev_obs)
+    # the interpolation weights only depend on the grids and masks,
+    # so they are reused for other variables with the same masks
+    key = ('grid', array_key(metadata_mod['lon2d'], metadata_mod['lat2d'],
+                             np.ma.getmaskarray(data_onlev_mod)),
+           array_key(metadata_obs['lon2d'], metadata_obs['lat2d'],
+                     np.ma.getmaskarray(data_onlev_obs)))
+
+    def make_fields():
+        # prepear interpolation fields
+        sourcefield = define_esmf_field(mod_file, data_onlev_mod, 'Model')
+        distfield = define_esmf_field(obs_file, data_onlev_obs, 'OBS')
+        return sourcefield, distfield
+
+    indices = esmf_nearest_indices(key,
+                                   make_fields,
+                                   dst_mask_values=np.array([1]),
+                                   src_mask_values=np.array([1]))
+
+    data_interpolated = np.ma.masked_equal(
+        apply_nearest_indices(data_onlev_mod, indices), 0)
+    lonc, latc, data_onlev_obs_cyc, data_interpolated_cyc = add_esmf_cyclic(
+        metadata_obs, data_onlev_obs, data_interpolated)
 
     return lonc, latc, target_depth, data_onlev_obs_cyc, data_interpolated_cyc
@@ -21,7 +21,9 @@ from esmvaltool.diag_scripts.arctic_ocean.interpolation import (
     closest_depth, interpolate_esmf)
 from esmvaltool.diag_scripts.arctic_ocean.utils import (dens_back, genfilename,
                                                         point_distance,
-                                                        get_provenance_record)
+                                                        get_provenance_record,
+                                                        get_timmean,
+                                                        get_timmean_file)
 from esmvaltool.diag_scripts.shared._base import (ProvenanceLogger)
 logger = logging.getLogger(os.path.basename(__file__))
 
@@ -510,14 +512,7 @@ def plot2d_original_grid(cfg, plot_params):
         logger.info("Plot plot2d_original_grid %s for %s",
                     plot_params['variable'], mmodel)
 
-        ifilename = genfilename(cfg['work_dir'],
-                                plot_params['variable'],
-                                mmodel,
-                                data_type='timmean',
-                                extension='.nc')
-
-        metadata = load_meta(ifilename, fxpath=None)
-        datafile = metadata['datafile']
+        metadata = get_timmean(cfg, plot_params['variable'], mmodel)
         lon2d = metadata['lon2d']
         lat2d = metadata['lat2d']
         lev = metadata['lev']
@@ -530,12 +525,7 @@ def plot2d_original_grid(cfg, plot_params):
                 'maxvalue_index']
             depth_target = lev[level_target]
 
-        if datafile.variables[plot_params['variable']].ndim < 4:
-            data = datafile.variables[
-                plot_params['variable']][level_target, :, :]
-        else:
-            data = datafile.variables[
-                plot_params['variable']][0, level_target, :, :]
+        data = metadata['data'][level_target, :, :]
 
         cb_label, data = label_and_conversion(plot_params['variable'], data)
 
@@ -590,7 +580,7 @@ def plot2d_original_grid(cfg, plot_params):
                              data_type=plot_type)
 
     plot_params['basedir'] = cfg['plot_dir']
-    plot_params['ori_file'] = [ifilename]
+    plot_params['ori_file'] = [metadata['ori_file']]
     plot_params['areacello'] = None
     plot_params['mmodel'] = None
     plot_params['region'] = "Global"
@@ -638,11 +628,8 @@ def plot2d_bias(cfg, plot_params):
                                ncols=plot_params['ncols'],
                                projection=plot_params['projection'])
     # get the filename of observations
-    ifilename_obs = genfilename(cfg['work_dir'],
-                                plot_params['variable'],
-                                plot_params['observations'],
-                                data_type='timmean',
-                                extension='.nc')
+    ifilename_obs = get_timmean_file(cfg, plot_params['variable'],
+                                     plot_params['observations'])
     # get the metadata for observations (we just need a size)
     metadata = load_meta(
         datapath=plot_params['model_filenames'][plot_params['observations']],
@@ -663,11 +650,7 @@ def plot2d_bias(cfg, plot_params):
         logger.info("Plot plot2d_bias %s for %s", plot_params['variable'],
                     mmodel)
         # get the filename with the mean generated by the `timemean`
-        ifilename = genfilename(cfg['work_dir'],
-                                plot_params['variable'],
-                                mmodel,
-                                data_type='timmean',
-                                extension='.nc')
+        ifilename = get_timmean_file(cfg, plot_params['variable'], mmodel)
         # do the interpolation to the observation grid
         # the output is
         lonc, latc, target_depth, data_obs, interpolated = interpolate_esmf(
@@ -5,20 +5,23 @@ This module contains utility functions.
 """
 import logging
 import os
-import shutil
 
 import cmocean.cm as cmo
+import dask.array as da
 import matplotlib as mpl
 import matplotlib.cm as cm
 import numpy as np
 import pyproj
 import seawater as sw
-from cdo import Cdo
+from netCDF4 import Dataset
 
 from esmvaltool.diag_scripts.shared import ProvenanceLogger
 
 logger = logging.getLogger(os.path.basename(__file__))
 
+# time means created by `timmean`, by work directory, variable and model
+_TIMMEAN_CACHE = {}
+
 
 class DiagnosticError(Exception):
     """Error in diagnostic."""
@@ -69,8 +72,75 @@ def genfilename(basedir,
     return ifilename
 
 
-def timmean(cfg, model_filenames, mmodel, cmor_var, observations='PHC'):
-    """Create time mean of input data with cdo.
+def compute_timmean(ifilename, cmor_var, block_bytes=64 * (1 << 20)):
+    """Compute the time mean of a variable from a netCDF file.
+
+    The data are read lazily with dask in blocks of time steps,
+    so the memory use does not depend on the length of the time series.
+    As with `cdo timmean`, missing values are ignored in the mean.
+
+    Parameters
+    ----------
+    ifilename: str
+        path to the netCDF file.
+    cmor_var: str
+        name of the CMOR variable.
+    block_bytes: int
+        approximate size of the blocks of data read at once.
+
+    Returns
+    -------
+    dict
+        the time mean (`data`, without the time dimension) together with
+        the coordinates (`lon`, `lat`, `lev`), the `time` and `time_bnds`
+        of the averaged period and the input file (`ori_file`).
+    """
+    with Dataset(ifilename) as datafile:
+        variable = datafile.variables[cmor_var]
+        timmean_data = {
+            'lon': datafile.variables['lon'][:],
+            'lat': datafile.variables['lat'][:],
+            'lev': datafile.variables['lev'][:],
+            'ori_file': ifilename,
+        }
+        if variable.ndim < 4:
+            # climatology without time dimension
+            timmean_data['data'] = variable[:]
+            timmean_data['time'] = None
+            timmean_data['time_bnds'] = None
+            return timmean_data
+
+        step_bytes = variable.dtype.itemsize * int(
+            np.prod(variable.shape[1:]))
+        chunks = (max(1, block_bytes // step_bytes), ) + variable.shape[1:]
+        data = da.from_array(variable, chunks=chunks, asarray=False,
+                             lock=True)
+        timmean_data['data'] = data.mean(
+            axis=0, dtype=np.float64).compute().astype(variable.dtype)
+
+        time = datafile.variables['time']
+        bounds = time.__dict__.get('bounds')
+        if bounds in datafile.variables:
+            time_bnds = np.array([[
+                datafile.variables[bounds][0, 0],
+                datafile.variables[bounds][-1, 1]
+            ]])
+        else:
+            time_bnds = np.array([[time[0], time[-1]]])
+        timmean_data['time'] = time_bnds.mean(axis=1)
+        timmean_data['time_bnds'] = time_bnds
+    return timmean_data
+
+
+def timmean(cfg, model_filenames, mmodel, cmor_var, observations='PHC',
+            timmean_data=None):
+    """Create time mean of input data.
+
+    The time mean is kept in memory for the other diagnostics
+    (see `get_timmean`) and is only written to a netCDF file if
+    `save_timmean` is set in the recipe or if a file is requested
+    later (see `get_timmean_file`). For the observations the input
+    file is used as it is.
 
     Parameters
     ----------
@@ -84,32 +154,140 @@ def timmean(cfg, model_filenames, mmodel, cmor_var, observations='PHC'):
         name of the CMOR variable
     observations: str
         name of observational/climatology data set.
+    timmean_data: dict, optional
+        already computed time mean, as returned by `compute_timmean`.
 
     Returns
     -------
     None
     """
     logger.info("Calculate timmean %s for %s", cmor_var, mmodel)
-    cdo = Cdo()
-    ofilename = genfilename(cfg['work_dir'],
-                            cmor_var,
-                            mmodel,
-                            data_type='timmean',
-                            extension='.nc')
-    if mmodel != observations:
-        cdo.timmean(input=model_filenames[mmodel], output=ofilename)
-    else:
-        shutil.copy2(model_filenames[mmodel], ofilename)
+    if timmean_data is None:
+        timmean_data = compute_timmean(model_filenames[mmodel], cmor_var)
+    timmean_data['observations'] = mmodel == observations
+    _TIMMEAN_CACHE[(cfg['work_dir'], cmor_var, mmodel)] = timmean_data
+    if cfg.get('save_timmean', False):
+        get_timmean_file(cfg, cmor_var, mmodel)
+
+
+def get_timmean(cfg, cmor_var, mmodel):
+    """Get the time mean created by `timmean`.
 
-    attributes = {}
-    attributes['region'] = 'global'
-    attributes['mmodel'] = mmodel
-    attributes['ori_file'] = model_filenames[mmodel]
-    attributes['areacello'] = None
+    Returns
+    -------
+    dict
+        the time mean, as returned by `compute_timmean`,
+        with the two dimentional `lon2d` and `lat2d`.
+    """
+    key = (cfg['work_dir'], cmor_var, mmodel)
+    if key not in _TIMMEAN_CACHE:
+        # the time mean was saved by a previous run
+        ifilename = genfilename(cfg['work_dir'],
+                                cmor_var,
+                                mmodel,
+                                data_type='timmean',
+                                extension='.nc')
+        timmean_data = compute_timmean(ifilename, cmor_var)
+        timmean_data['ofilename'] = ifilename
+        _TIMMEAN_CACHE[key] = timmean_data
+    timmean_data = _TIMMEAN_CACHE[key]
+
+    lon = timmean_data['lon']
+    lat = timmean_data['lat'].copy()
+    # hack for HadGEM2-ES
+    lat[lat > 90] = 90
+    if lon.ndim == 2:
+        lon2d, lat2d = lon, lat
+    elif lon.ndim == 1:
+        lon2d, lat2d = np.meshgrid(lon, lat)
+    return dict(timmean_data, lon2d=lon2d, lat2d=lat2d)
+
+
+def get_timmean_file(cfg, cmor_var, mmodel):
+    """Get the path to a netCDF file with the time mean.
+
+    The file is written from the time mean created by `timmean`
+    the first time it is requested.
+    For the observations the input file is returned.
 
-    provenance_record = get_provenance_record(attributes, 'timmean', 'nc')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofilename, provenance_record)
+    Returns
+    -------
+    str
+        path to the file.
+    """
+    timmean_data = _TIMMEAN_CACHE.get((cfg['work_dir'], cmor_var, mmodel))
+    if timmean_data is None:
+        return genfilename(cfg['work_dir'],
+                           cmor_var,
+                           mmodel,
+                           data_type='timmean',
+                           extension='.nc')
+    if timmean_data.get('observations'):
+        return timmean_data['ori_file']
+    if 'ofilename' not in timmean_data:
+        ofilename = genfilename(cfg['work_dir'],
+                                cmor_var,
+                                mmodel,
+                                data_type='timmean',
+                                extension='.nc')
+        save_timmean(ofilename, cmor_var, timmean_data)
+        timmean_data['ofilename'] = ofilename
+
+        attributes = {}
+        attributes['region'] = 'global'
+        attributes['mmodel'] = mmodel
+        attributes['ori_file'] = timmean_data['ori_file']
+        attributes['areacello'] = None
+
+        provenance_record = get_provenance_record(attributes, 'timmean', 'nc')
+        with ProvenanceLogger(cfg) as provenance_logger:
+            provenance_logger.log(ofilename, provenance_record)
+    return timmean_data['ofilename']
+
+
+def save_timmean(ofilename, cmor_var, timmean_data):
+    """Save the time mean to a netCDF file.
+
+    The dimensions, attributes and time independent variables are copied
+    from the input file, the time dimension has a length of one.
+    """
+    with Dataset(timmean_data['ori_file']) as ifile, \
+            Dataset(ofilename, 'w') as ofile:
+        ofile.setncatts(ifile.__dict__)
+        time_dim = None
+        time_bounds = None
+        if timmean_data['time'] is not None:
+            time_dim = ifile.variables['time'].dimensions[0]
+            time_bounds = ifile.variables['time'].__dict__.get('bounds')
+        for name, dimension in ifile.dimensions.items():
+            if name == time_dim:
+                ofile.createDimension(name, None)
+            else:
+                ofile.createDimension(name, len(dimension))
+        for name, ivar in ifile.variables.items():
+            if (time_dim in ivar.dimensions
+                    and name not in (cmor_var, 'time', time_bounds)):
+                continue
+            fill_value = ivar.__dict__.get('_FillValue')
+            ovar = ofile.createVariable(name,
+                                        ivar.datatype,
+                                        ivar.dimensions,
+                                        fill_value=fill_value)
+            ovar.setncatts({
+                key: value
+                for key, value in ivar.__dict__.items() if key != '_FillValue'
+            })
+            if name == cmor_var:
+                if time_dim is None:
+                    ovar[:] = timmean_data['data']
+                else:
+                    ovar[0] = timmean_data['data']
+            elif name == 'time':
+                ovar[:] = timmean_data['time']
+            elif name == time_bounds:
+                ovar[:] = timmean_data['time_bnds']
+            else:
+                ovar[:] = ivar[:]
 
 
 def get_clim_model_filenames(config, variable):
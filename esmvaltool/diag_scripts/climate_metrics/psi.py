@@ -5,7 +5,8 @@
 Description
 -----------
 Calculate global temperature variability metric psi following Cox et al.
-(2018).
+(2018). If the input data are not averaged over space, psi is calculated for
+every grid point.
 
 Author
 ------
@@ -40,44 +41,144 @@ from esmvaltool.diag_scripts.shared import (
 logger = logging.getLogger(os.path.basename(__file__))
 
 
-def calculate_psi(cube, cfg):
-    """Calculate temperature variability metric psi for a given cube."""
-    window_length = cfg.get('window_length', 55)
-    lag = cfg.get('lag', 1)
-    psi_years = []
-    psis = []
+def _moving_sum(data, length, n_windows, start=0):
+    """Sum `data` over `n_windows` windows along the first axis."""
+    csum = np.zeros((len(data) + 1, ) + data.shape[1:])
+    np.cumsum(data, axis=0, out=csum[1:])
+    stop = start + n_windows
+    return csum[start + length:stop + length] - csum[start:stop]
+
+
+def _sliding_psi(data, years, window_length, lag):
+    """Calculate psi for all moving windows along the first axis of `data`.
+
+    The linear trend, the lagged autocorrelation and the standard deviation of
+    every window are computed from moving sums, so that all windows (and all
+    grid points along the other axes) are handled at once.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Annual temperatures with time as first dimension. Missing values are
+        given as NaN.
+    years : numpy.ndarray
+        Years of the first dimension of `data`.
+    window_length : int
+        Number of years in each window.
+    lag : int
+        Lag (in years) for the autocorrelation function.
+
+    Returns
+    -------
+    numpy.ndarray
+        Psi for the windows starting at the first ``len(years) -
+        window_length`` years, with the same trailing dimensions as `data`.
+        Windows that contain missing values are NaN.
+
+    """
+    n_windows = len(years) - window_length
+    length = window_length - lag
+
+    # Remove overall means to avoid cancellation errors in the moving sums.
+    # Missing values are set to zero, the windows containing them to NaN.
+    valid = np.isfinite(data)
+    n_valid = np.maximum(np.count_nonzero(valid, axis=0), 1)
+    tas = np.where(valid, data, 0.)
+    tas = np.where(valid, tas - tas.sum(axis=0) / n_valid, 0.)
+    years = np.asarray(years, dtype=np.float64)
+    years = (years - years.mean()).reshape((-1, ) + (1, ) * (tas.ndim - 1))
+
+    def msum(values, win=window_length, start=0):
+        return _moving_sum(values, win, n_windows, start)
+
+    # Linear regression in every window
+    sum_t = msum(years)
+    sum_y = msum(tas)
+    sum_ty = msum(years * tas)
+    sum_tt = msum(years**2)
+    slope = ((sum_ty - sum_t * sum_y / window_length) /
+             (sum_tt - sum_t**2 / window_length))
+    intercept = (sum_y - slope * sum_t) / window_length
 
-    # Moving average
-    for yr_idx in range(cube.shape[0] - window_length):
+    # Sum of squares of residuals (orthogonal to constant and trend)
+    norm = msum(tas**2) - intercept * sum_y - slope * sum_ty
+
+    # Lagged product of residuals (y_i - a - b t_i) * (y_j - a - b t_j)
+    (t_i, t_j) = (years[:-lag], years[lag:])
+    (y_i, y_j) = (tas[:-lag], tas[lag:])
+    lagged = (msum(y_i * y_j, length) -
+              intercept * (msum(tas, length) + msum(tas, length, lag)) -
+              slope * (msum(t_i * y_j, length) + msum(t_j * y_i, length)) +
+              intercept**2 * length + intercept * slope *
+              (msum(years, length) + msum(years, length, lag)) +
+              slope**2 * msum(t_i * t_j, length))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        psis = (np.sqrt(norm / window_length) /
+                np.sqrt(-np.log(lagged / norm)))
+    psis[msum(~valid) > 0] = np.nan
+    return psis
+
+
+def _sliding_psi_loop(data, years, window_length, lag):
+    """Calculate psi window by window for 1D `data` (reference)."""
+    psis = []
+    for yr_idx in range(len(years) - window_length):
         slc = slice(yr_idx, yr_idx + window_length)
-        years = cube.coord('year').points[slc]
-        tas = np.copy(cube.data[slc])
+        tas = np.copy(data[slc])
 
         # De-trend data
-        reg = stats.linregress(years, tas)
-        tas -= reg.slope * years + reg.intercept
+        reg = stats.linregress(years[slc], tas)
+        tas -= reg.slope * years[slc] + reg.intercept
 
         # Autocorrelation
         norm = np.sum(np.square(tas))
         [autocorr] = np.correlate(tas[:-lag], tas[lag:], mode='valid') / norm
 
         # Psi
-        psi_years.append(years[-1])
         psis.append(np.std(tas) / np.sqrt(-np.log(autocorr)))
+    return np.array(psis)
+
+
+def calculate_psi(cube, cfg):
+    """Calculate temperature variability metric psi for a given cube.
+
+    The cube needs a ``year`` coordinate. All other dimensions are kept, i.e.
+    psi is calculated for every grid point of N-dimensional cubes.
+
+    """
+    window_length = cfg.get('window_length', 55)
+    lag = cfg.get('lag', 1)
+    [time_dim] = cube.coord_dims('year')
+    years = cube.coord('year').points
+    data = np.moveaxis(cube.data, time_dim, 0)
+    psis = _sliding_psi(np.ma.filled(data.astype(np.float64), np.nan),
+                        years, window_length, lag)
+    if np.ma.is_masked(data):
+        psis = np.ma.masked_invalid(psis)
 
-    # Return new cube
+    # Return new cube (windows are labeled with their last year)
     year_coord = iris.coords.DimCoord(
-        np.array(psi_years),
+        years[window_length - 1:-1],
         var_name='year',
         long_name='year',
         units=cf_units.Unit('year'))
     psi_cube = iris.cube.Cube(
-        np.array(psis),
+        psis,
         dim_coords_and_dims=[(year_coord, 0)],
         attributes={
             'window_length': window_length,
             'lag': lag
         })
+    for coord in cube.coords():
+        dims = cube.coord_dims(coord)
+        if time_dim in dims:
+            continue
+        dims = tuple(dim + 1 if dim < time_dim else dim for dim in dims)
+        if coord in cube.coords(dim_coords=True):
+            psi_cube.add_dim_coord(coord.copy(), dims)
+        else:
+            psi_cube.add_aux_coord(coord.copy(), dims)
     return psi_cube
 
 
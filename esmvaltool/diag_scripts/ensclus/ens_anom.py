@@ -2,13 +2,57 @@
 
 import os
 import numpy as np
-from scipy import stats
 
 # User-defined packages
 from read_netcdf import read_iris, save_n_2d_fields
 from sel_season_area import sel_area, sel_season
 
 
+def trend_slope(var, axis=0):
+    """Least-squares linear trend of var along the time axis.
+
+    Closed-form equivalent of scipy.stats.linregress applied separately
+    to each grid point, against the time index 0, 1, ..., n-1.
+    NaN values are left out of the regression of their grid point.
+    Works on any number of dimensions, e.g. on (time x lat x lon) fields
+    or on stacked (member x time x lat x lon) fields with axis=1.
+    """
+    var = np.moveaxis(np.asarray(var, dtype=float), axis, 0)
+    valid = np.isfinite(var)
+    time = np.arange(var.shape[0], dtype=float).reshape(
+        (-1, ) + (1, ) * (var.ndim - 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        count = valid.sum(axis=0)
+        time_anom = np.where(valid, time, 0.)
+        time_anom = np.where(valid, time - time_anom.sum(axis=0) / count, 0.)
+        var_anom = np.where(valid, var, 0.)
+        var_anom = np.where(valid, var - var_anom.sum(axis=0) / count, 0.)
+        slope = ((time_anom * var_anom).sum(axis=0) /
+                 (time_anom * time_anom).sum(axis=0))
+    return slope
+
+
+def _extreme_value(var, extreme):
+    """Reduce a (time x lat x lon) field to the selected 2D value."""
+    if extreme == 'mean':
+        # Compute the time mean over the entire period
+        return np.nanmean(var, axis=0)
+    if len(extreme.split("_")) == 2:
+        # Compute the chosen percentile over the period
+        quant = int(extreme.partition("th")[0])
+        return np.nanpercentile(var, quant, axis=0)
+    if extreme == 'maximum':
+        # Compute the maximum value over the period
+        return np.nanmax(var, axis=0)
+    if extreme == 'std':
+        # Compute the standard deviation over the period
+        return np.nanstd(var, axis=0)
+    if extreme == 'trend':
+        # Compute the linear trend over the period
+        return trend_slope(var)
+    raise ValueError("Unknown extreme value '{0}'".format(extreme))
+
+
 def ens_anom(filenames, dir_output, name_outputs, varname, numens, season,
              area, extreme):
     """Ensemble anomalies.
@@ -24,8 +68,10 @@ def ens_anom(filenames, dir_output, name_outputs, varname, numens, season,
     print('Number of ensemble members: {0}'.format(numens))
 
     outfiles = []
-    # Reading the netCDF file of 3Dfield, for all the ensemble members
-    var_ens = []
+    # Reading the netCDF file of 3Dfield, one ensemble member at a time, and
+    # keeping only the selected value and the climatology of each member
+    varextreme_ens = []
+    vartimemean_ens = []
     for ens in range(numens):
         ifile = filenames[ens]
         # print('ENSEMBLE MEMBER %s' %ens)
@@ -42,7 +88,8 @@ def ens_anom(filenames, dir_output, name_outputs, varname, numens, season,
         # Selecting only [latS-latN, lonW-lonE] box region
         var_area, lat_area, lon_area = sel_area(lat, lon, var_season, area)
 
-        var_ens.append(var_area)
+        varextreme_ens.append(_extreme_value(var_area, extreme))
+        vartimemean_ens.append(np.mean(var_area, axis=0))
 
     if varunits == 'kg m-2 s-1':
         print('\nPrecipitation rate units were converted from kg m-2 s-1 '
@@ -53,39 +100,6 @@ def ens_anom(filenames, dir_output, name_outputs, varname, numens, season,
     print('var shape after selecting season {0} and area {1}: '
           '(time x lat x lon)={2}'.format(season, area, var_area.shape))
 
-    if extreme == 'mean':
-        # Compute the time mean over the entire period, for each ens member
-        varextreme_ens = [np.nanmean(var_ens[i], axis=0)
-                          for i in range(numens)]
-
-    elif len(extreme.split("_")) == 2:
-        # Compute the chosen percentile over the period, for each ens member
-        quant = int(extreme.partition("th")[0])
-        varextreme_ens = [np.nanpercentile(var_ens[i], quant, axis=0)
-                          for i in range(numens)]
-
-    elif extreme == 'maximum':
-        # Compute the maximum value over the period, for each ensemble member
-        varextreme_ens = [np.nanmax(var_ens[i], axis=0) for i in range(numens)]
-
-    elif extreme == 'std':
-        # Compute the standard deviation over the period, for each ens member
-        varextreme_ens = [np.nanstd(var_ens[i], axis=0) for i in range(numens)]
-
-    elif extreme == 'trend':
-        # Compute the linear trend over the period, for each ensemble member
-        trendmap = np.empty((var_ens[0].shape[1], var_ens[0].shape[2]))
-        trendmap_ens = []
-        for i in range(numens):
-            for jla in range(var_ens[0].shape[1]):
-                for jlo in range(var_ens[0].shape[2]):
-                    slope, _, _, _, _ = \
-                        stats.linregress(range(var_ens[0].shape[0]),
-                                         var_ens[i][:, jla, jlo])
-                    trendmap[jla, jlo] = slope
-            trendmap_ens.append(trendmap.copy())
-        varextreme_ens = trendmap_ens
-
     varextreme_ens_np = np.array(varextreme_ens)
     print('Anomalies are computed with respect to the {0}'.format(extreme))
 
@@ -101,7 +115,6 @@ def ens_anom(filenames, dir_output, name_outputs, varname, numens, season,
                      varunits, ofile)
     outfiles.append(ofile)
     # Compute and save the climatology
-    vartimemean_ens = [np.mean(var_ens[i], axis=0) for i in range(numens)]
     ens_climatologies = np.array(vartimemean_ens)
     varsave = 'ens_climatologies'
     ofile = os.path.join(dir_output, 'ens_climatologies_{0}.nc'
@@ -7,20 +7,69 @@ import os
 
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
 from sklearn.cluster import KMeans
 
 # User-defined libraries
-from eof_tool import eof_computation
+from eof_tool import eof_computation, eof_computation_fast
 from read_netcdf import read_n_2d_fields
 
 
-def ens_eof_kmeans(dir_output, name_outputs, numens, numpcs, perc, numclus):
+def _fit_kmeans(pcs, numclus, n_init, max_iter, seed):
+    """Fit k-means with n_init restarts and return the fitted estimator."""
+    return KMeans(n_clusters=numclus, n_init=n_init, init='k-means++',
+                  tol=1e-4, max_iter=max_iter, random_state=seed).fit(pcs)
+
+
+def kmeans_restarts(pcs, numclus, n_init=2000, max_iter=1000, n_jobs=-1,
+                    patience=None, batch_size=50, random_state=42):
+    """K-means cluster analysis with restarts run in parallel.
+
+    The n_init restarts are split in batches of batch_size restarts,
+    which are distributed over n_jobs parallel jobs. If patience is set,
+    the restarts stop after patience rounds of parallel batches that did
+    not lower the inertia of the best clustering found so far.
+    OUTPUT: centroids (numclus x numpcs) and labels (numens) of the
+    clustering with the lowest inertia.
+    """
+    n_jobs = effective_n_jobs(n_jobs)
+    seeds = np.random.RandomState(random_state).randint(
+        np.iinfo(np.int32).max, size=-(-n_init // batch_size))
+    sizes = [batch_size] * (len(seeds) - 1)
+    sizes.append(n_init - batch_size * (len(seeds) - 1))
+    best = None
+    rounds_without_improvement = 0
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for first in range(0, len(seeds), n_jobs):
+            fits = parallel(
+                delayed(_fit_kmeans)(pcs, numclus, size, max_iter, seed)
+                for size, seed in zip(sizes[first:first + n_jobs],
+                                      seeds[first:first + n_jobs]))
+            fit = min(fits, key=lambda x: x.inertia_)
+            if best is None or fit.inertia_ < best.inertia_:
+                best = fit
+                rounds_without_improvement = 0
+            else:
+                rounds_without_improvement += 1
+            if patience and rounds_without_improvement >= patience:
+                print('k-means stopped early after {0} of {1} restarts'
+                      .format(sum(sizes[:first + n_jobs]), n_init))
+                break
+    return best.cluster_centers_, best.labels_
+
+
+def ens_eof_kmeans(dir_output, name_outputs, numens, numpcs, perc, numclus,
+                   fast=False, kmeans_options=None):
     """Find the most representative ensemble member for each cluster.
 
     METHODS:
     - Empirical Orthogonal Function (EOF) analysis of the input file
     - K-means cluster analysis applied to the retained
       Principal Components (PCs)
+    If fast is set, only the leading EOFs are computed with a randomized
+    SVD and the k-means restarts are run in parallel (see kmeans_restarts,
+    which accepts kmeans_options as keyword arguments); otherwise the full
+    EOF solver and a single KMeans with 2000 restarts are used.
     OUTPUT:
     Frequency
     """
@@ -54,7 +103,12 @@ def ens_eof_kmeans(dir_output, name_outputs, numens, numpcs, perc, numclus):
     print('_________________________________________________________')
     print('EOF analysis:')
     # --------------------------------------------------------------------
-    _, _, _, pcs_unscal0, eofs_unscal0, varfrac = eof_computation(var, lat)
+    if fast:
+        pcs_unscal0, eofs_unscal0, varfrac = eof_computation_fast(
+            var, lat, numpcs, perc)
+    else:
+        _, _, _, pcs_unscal0, eofs_unscal0, varfrac = eof_computation(var,
+                                                                      lat)
 
     acc = np.cumsum(varfrac * 100)
     if numpcs:
@@ -77,16 +131,20 @@ def ens_eof_kmeans(dir_output, name_outputs, numens, numpcs, perc, numclus):
 
     pcs = pcs_unscal0[:, :numpcs]
 
-    clus = KMeans(n_clusters=numclus, n_init=2000,
-                  init='k-means++', tol=1e-4,
-                  max_iter=1000, random_state=42)
     start = datetime.datetime.now()
-    clus.fit(pcs)
+    if fast:
+        centroids, labels = kmeans_restarts(pcs, numclus,
+                                            **(kmeans_options or {}))
+    else:
+        clus = KMeans(n_clusters=numclus, n_init=2000,
+                      init='k-means++', tol=1e-4,
+                      max_iter=1000, random_state=42)
+        clus.fit(pcs)
+        centroids = clus.cluster_centers_
+        labels = clus.labels_
     end = datetime.datetime.now()
     print('k-means algorithm took me %s seconds' % (end - start))
-
-    centroids = clus.cluster_centers_          # shape---> (numclus,numpcs)
-    labels = clus.labels_                      # shape---> (numens,)
+    # centroids shape---> (numclus,numpcs), labels shape---> (numens,)
 
     print('\nClusters are identified for {0} PCs (explained variance {1}%)'
           .format(numpcs, "%.2f" % exctperc))
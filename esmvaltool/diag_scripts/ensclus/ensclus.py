@@ -68,6 +68,12 @@ def main(cfg):
     max_plot_panels = cfg.get('max_plot_panels', 72)
     numpcs = cfg.get('numpcs', 0)
     perc = cfg.get('numpcs', 80)
+    kmeans_options = {
+        key: cfg[name]
+        for key, name in [('n_init', 'kmeans_n_init'),
+                          ('n_jobs', 'kmeans_n_jobs'),
+                          ('patience', 'kmeans_patience')] if name in cfg
+    }
 
     filenames_cat = []
     legend_cat = []
@@ -93,7 +99,9 @@ def main(cfg):
 
     # ###################### EOF AND K-MEANS ANALYSES #######################
     outfiles2 = ens_eof_kmeans(out_dir, name_outputs, numens, numpcs,
-                               perc, cfg['numclus'])
+                               perc, cfg['numclus'],
+                               fast=cfg.get('fast', False),
+                               kmeans_options=kmeans_options)
 
     outfiles = outfiles + outfiles2
     provenance_record = get_provenance_record(
@@ -7,6 +7,7 @@ import numpy as np
 
 import cartopy.crs as ccrs
 from eofs.standard import Eof
+from sklearn.utils.extmath import randomized_svd
 
 
 def eof_computation(var, lat):
@@ -45,6 +46,51 @@ def eof_computation(var, lat):
     return solver, pcs_scal1, eofs_scal2, pcs_unscal0, eofs_unscal0, varfrac
 
 
+def eof_computation_fast(var, lat, numpcs=0, perc=80, random_state=42):
+    """Computing only the leading EOFs and PCs.
+
+    Same weighting and scaling conventions as the unscaled PCs and EOFs of
+    eof_computation, but a truncated randomized SVD is used and only the
+    PCs needed to retain numpcs PCs (if set) or to explain more than perc
+    of the total variance are computed. The number of computed PCs is
+    doubled until perc is reached.
+    OUTPUT: unscaled PCs (ntime x neofs), unscaled EOFs (neofs x nlat x nlon)
+    and variance fractions of the computed PCs.
+    """
+    print('_________________________________________________________')
+    print('Computing the leading EOFs and PCs')
+    weights_array = np.sqrt(np.cos(np.deg2rad(lat)))[:, np.newaxis]
+
+    start = datetime.datetime.now()
+    ntime = var.shape[0]
+    data = (var - var.mean(axis=0)) * weights_array
+    data = data.reshape((ntime, -1))
+    nonmissing = np.isfinite(data).all(axis=0)
+    data = data[:, nonmissing]
+    total_variance = np.sum(data**2)
+    rank = min(data.shape)
+    neofs = min(int(numpcs) if numpcs else 8, rank)
+    while True:
+        if 2 * neofs >= rank:
+            lhs, sing, rhs = np.linalg.svd(data, full_matrices=False)
+        else:
+            lhs, sing, rhs = randomized_svd(data, neofs, n_iter=7,
+                                            random_state=random_state)
+        varfrac = sing**2 / total_variance
+        if numpcs or len(sing) >= rank or np.sum(varfrac) * 100 > perc:
+            break
+        neofs = 2 * neofs
+    end = datetime.datetime.now()
+    print('EOF computation took me %s seconds' % (end - start))
+
+    pcs_unscal0 = lhs * sing
+    eofs_unscal0 = np.full((len(sing), nonmissing.size), np.nan)
+    eofs_unscal0[:, nonmissing] = rhs
+    eofs_unscal0 = eofs_unscal0.reshape((len(sing), ) + var.shape[1:])
+
+    return pcs_unscal0, eofs_unscal0, varfrac
+
+
 def eof_plots(neof, pcs_scal1, eofs_scal2, var, varunits, lat, lon,
               tit, numens, varfrac):
     """Plot of the nth the EOFs and PCs.
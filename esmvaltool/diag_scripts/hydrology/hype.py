@@ -1,11 +1,10 @@
 """HYPE diagnostic."""
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-import dask.array as da
 import iris
 import numpy
-import pandas
 
 from esmvaltool.diag_scripts.shared import (ProvenanceLogger,
                                             get_diagnostic_filename,
@@ -54,53 +53,105 @@ def get_output_stem(attributes):
 
 
 def get_data_times_and_ids(attributes):
-    """Get the data table to be written and the times and indices."""
+    """Get the (lazy) data table to be written and the times and indices."""
     input_file = attributes['filename']
 
     cube = iris.load_cube(input_file)
 
-    data = numpy.array(cube.core_data())
+    data = cube.lazy_data()
 
     # Round times to integer number of days
     time_coord = cube.coord('time')
-    time_coord.points = da.floor(time_coord.core_points())
-    time_coord.bounds = None
-
-    times = [str(x.point.date()) for x in time_coord.cells()]
-    ids = cube.coord('shape_id').core_points()
+    dates = time_coord.units.num2date(numpy.floor(time_coord.points))
+    times = [
+        f'{date.year:04d}-{date.month:02d}-{date.day:02d}' for date in dates
+    ]
+    ids = cube.coord('shape_id').points
 
     return data, times, ids
 
 
+def _format_label(label, float_format):
+    """Format a column label like :meth:`pandas.DataFrame.to_csv` does."""
+    if isinstance(label, (float, numpy.floating)):
+        return float_format % label
+    label = str(label)
+    if ' ' in label or '"' in label:
+        label = '"' + label.replace('"', '""') + '"'
+    return label
+
+
+def write_table(output_file, data, times, ids, float_format='%.3f',
+                block_bytes=64 * (1 << 20)):
+    """Write the data table to a space separated text file.
+
+    The (time, shape_id) data is computed and written in blocks of about
+    block_bytes bytes along the time dimension, so the full table is never
+    kept in memory. Missing (NaN) values are written as empty fields.
+    """
+    ntime, nids = data.shape
+    nrows = max(1, block_bytes // (nids * data.dtype.itemsize))
+    row_format = ' '.join([float_format] * nids)
+    with open(output_file, 'w') as file:
+        labels = [_format_label(i, float_format) for i in ids]
+        file.write(' '.join(['DATE'] + labels) + '\n')
+        for start in range(0, ntime, nrows):
+            block = numpy.array(data[start:start + nrows]).astype(float)
+            lines = []
+            for time, values in zip(times[start:start + nrows], block):
+                if numpy.isnan(values).any():
+                    line = ' '.join('' if numpy.isnan(value) else
+                                    float_format % value for value in values)
+                else:
+                    line = row_format % tuple(values.tolist())
+                lines.append(time + ' ' + line + '\n')
+            file.writelines(lines)
+
+
+def write_forcing(attributes, cfg):
+    """Write the HYPE forcing file of a dataset and return its name."""
+    logger.info("Processing variable %s of dataset %s",
+                attributes['long_name'], attributes['dataset'])
+
+    output_file = get_diagnostic_filename(get_output_stem(attributes), cfg,
+                                          'txt')
+    Path(output_file).parent.mkdir(exist_ok=True)
+
+    data, times, ids = get_data_times_and_ids(attributes)
+    write_table(output_file, data, times, ids)
+
+    return output_file
+
+
 def main(cfg):
     """Process data for use as input to the HYPE hydrological model."""
     input_data = cfg['input_data'].values()
     grouped_input_data = group_metadata(input_data,
                                         'long_name',
                                         sort='dataset')
-
-    for long_name in grouped_input_data:
-        logger.info("Processing variable %s", long_name)
-        for attributes in grouped_input_data[long_name]:
-            logger.info("Processing dataset %s", attributes['dataset'])
-
-            output_file = get_diagnostic_filename(get_output_stem(attributes),
-                                                  cfg, 'txt')
-            Path(output_file).parent.mkdir(exist_ok=True)
-
-            data, times, ids = get_data_times_and_ids(attributes)
-
-            frame = pandas.DataFrame(data, index=times, columns=ids)
-
-            frame.to_csv(output_file,
-                         sep=' ',
-                         index_label="DATE",
-                         float_format='%.3f')
-
-            # Store provenance
-            provenance_record = get_provenance_record(attributes)
-            with ProvenanceLogger(cfg) as provenance_logger:
-                provenance_logger.log(output_file, provenance_record)
+    all_attributes = [
+        attributes for long_name in grouped_input_data
+        for attributes in grouped_input_data[long_name]
+    ]
+
+    n_workers = cfg.get('n_workers', 1)
+    if n_workers > 1:
+        logger.info("Writing the forcing files using %s worker processes",
+                    n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            output_files = list(
+                executor.map(write_forcing, all_attributes,
+                             [cfg] * len(all_attributes)))
+    else:
+        output_files = [
+            write_forcing(attributes, cfg) for attributes in all_attributes
+        ]
+
+    for output_file, attributes in zip(output_files, all_attributes):
+        # Store provenance
+        provenance_record = get_provenance_record(attributes)
+        with ProvenanceLogger(cfg) as provenance_logger:
+            provenance_logger.log(output_file, provenance_record)
 
 
 if __name__ == '__main__':
@@ -4,10 +4,19 @@ Iris issue requesting the feature:
 https://github.com/SciTools/iris/issues/3700
 """
 import copy
+import hashlib
+import logging
+import os
+import pickle
+from collections import OrderedDict
 
+import dask.array as da
 import iris
+import iris.analysis
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 HORIZONTAL_SCHEMES = {
     'linear': iris.analysis.Linear(extrapolation_mode='mask'),
     'linear_extrapolate':
@@ -17,11 +26,68 @@ HORIZONTAL_SCHEMES = {
 }
 """Supported horizontal regridding schemes."""
 
+BLOCK_BYTES = 50 * (1 << 20)
+"""Default size in bytes of the regridded data blocks (50 MB)."""
 
-def _compute_chunks(src, tgt):
-    """Compute the chunk sizes needed to regrid src to tgt."""
-    block_bytes = 50 * (1 << 20)  # 50 MB block size
+REGRIDDER_CACHE_SIZE = 8
+"""Maximum number of regridders kept in memory."""
+
+_REGRIDDER_CACHE = OrderedDict()
+
+
+def _grid_key(cube):
+    """Compute a key identifying the horizontal grid of cube."""
+    key = hashlib.sha256()
+    for name in ('latitude', 'longitude'):
+        coord = cube.coord(name)
+        key.update(repr(coord.metadata).encode())
+        key.update(np.ascontiguousarray(coord.points).tobytes())
+        if coord.has_bounds():
+            key.update(np.ascontiguousarray(coord.bounds).tobytes())
+    return key.hexdigest()
+
+
+def _get_regridder(src, tgt, scheme, cache_dir=None):
+    """Get a regridder from cube src to cube tgt, reusing cached weights.
+
+    Regridders are kept in memory in a least recently used cache and, if
+    cache_dir is given, also stored on disk so they can be reused by
+    later runs.
+    """
+    if scheme not in HORIZONTAL_SCHEMES:
+        raise ValueError(f"Regridding scheme {scheme} not supported, "
+                         f"choose from {HORIZONTAL_SCHEMES.keys()}.")
+    key = (scheme, _grid_key(src), _grid_key(tgt))
+    if key in _REGRIDDER_CACHE:
+        _REGRIDDER_CACHE.move_to_end(key)
+        return _REGRIDDER_CACHE[key]
+
+    cache_file = None
+    if cache_dir is not None:
+        name = hashlib.sha256(repr((iris.__version__, ) +
+                                   key).encode()).hexdigest()
+        cache_file = os.path.join(cache_dir, f'regridder_{name}.pickle')
+
+    if cache_file is not None and os.path.exists(cache_file):
+        logger.debug("Loading regridder from %s", cache_file)
+        with open(cache_file, 'rb') as file:
+            regridder = pickle.load(file)
+    else:
+        regridder = HORIZONTAL_SCHEMES[scheme].regridder(src, tgt)
+        if cache_file is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_file, 'wb') as file:
+                pickle.dump(regridder, file)
+            logger.debug("Saved regridder to %s", cache_file)
 
+    _REGRIDDER_CACHE[key] = regridder
+    if len(_REGRIDDER_CACHE) > REGRIDDER_CACHE_SIZE:
+        _REGRIDDER_CACHE.popitem(last=False)
+    return regridder
+
+
+def _compute_chunks(src, tgt, block_bytes=BLOCK_BYTES):
+    """Compute the chunk sizes needed to regrid src to tgt."""
     if src.dtype == np.float32:
         dtype_bytes = 4  # size of float32 in bytes
     else:
@@ -34,7 +100,7 @@ def _compute_chunks(src, tgt):
     # Define blocks along the time dimension
     min_nblocks = int(ntime * tgt_nlat * tgt_nlon * dtype_bytes / block_bytes)
     min_nblocks = max(min_nblocks, 1)
-    timefull = ntime // min_nblocks
+    timefull = max(ntime // min_nblocks, 1)
     timepart = ntime % timefull
 
     nfullblocks = ntime // timefull
@@ -55,15 +121,12 @@ def _compute_chunks(src, tgt):
     return src_chunks, tgt_chunks
 
 
-def _regrid_data(src, tgt, scheme):
+def _regrid_data(src, tgt, scheme, block_bytes=BLOCK_BYTES, cache_dir=None):
     """Regrid data from cube src onto grid of cube tgt."""
-    src_chunks, tgt_chunks = _compute_chunks(src, tgt)
+    src_chunks, tgt_chunks = _compute_chunks(src, tgt, block_bytes)
 
     # Define the block regrid function
-    if scheme not in HORIZONTAL_SCHEMES:
-        raise ValueError(f"Regridding scheme {scheme} not supported, "
-                         f"choose from {HORIZONTAL_SCHEMES.keys()}.")
-    regridder = HORIZONTAL_SCHEMES[scheme].regridder(src, tgt)
+    regridder = _get_regridder(src, tgt, scheme, cache_dir)
 
     def regrid(block):
         tlen = block.shape[0]
@@ -80,10 +143,47 @@ def _regrid_data(src, tgt, scheme):
     return data
 
 
-def lazy_regrid(src, tgt, scheme):
-    """Regrid cube src onto the grid of cube tgt."""
-    data = _regrid_data(src, tgt, scheme)
+def _regrid_stacked_data(srcs, tgt, scheme, block_bytes=BLOCK_BYTES,
+                         cache_dir=None):
+    """Regrid data from cubes srcs on the same grid in a single pass.
+
+    The data of the cubes is stacked along a new leading variable axis,
+    so every block contains all variables for a range of time steps.
+    """
+    src = srcs[0]
+    nvar = len(srcs)
+    src_chunks, tgt_chunks = _compute_chunks(src, tgt, block_bytes // nvar)
+
+    # Define the block regrid function
+    regridder = _get_regridder(src, tgt, scheme, cache_dir)
+    lat = src.coord('latitude')
+    lon = src.coord('longitude')
+
+    def regrid(block):
+        shape = block.shape
+        cube = iris.cube.Cube(
+            block.reshape((-1, ) + shape[2:]),
+            dim_coords_and_dims=[(lat.copy(), 1), (lon.copy(), 2)],
+        )
+        data = regridder(cube).core_data()
+        return data.reshape(shape[:2] + data.shape[1:])
 
+    # Regrid
+    dtype = np.result_type(*[cube.dtype for cube in srcs])
+    data = da.stack([
+        cube.core_data().astype(dtype).rechunk(src_chunks) for cube in srcs
+    ]).rechunk(((nvar, ), ) + src_chunks)
+    data = data.map_blocks(
+        regrid,
+        dtype=dtype,
+        chunks=((nvar, ), ) + tgt_chunks,
+    )
+
+    return [data[i].astype(cube.dtype) for i, cube in enumerate(srcs)]
+
+
+def _regridded_cube(src, tgt, data):
+    """Create the cube with the data of src regridded onto tgt."""
     result = iris.cube.Cube(data)
     result.metadata = copy.deepcopy(src.metadata)
 
@@ -101,3 +201,44 @@ def lazy_regrid(src, tgt, scheme):
     copy_coords(src.aux_coords, result.add_aux_coord)
 
     return result
+
+
+def lazy_regrid(src, tgt, scheme, block_bytes=BLOCK_BYTES, cache_dir=None):
+    """Regrid cube src onto the grid of cube tgt.
+
+    The data is regridded in blocks of about block_bytes bytes along the
+    time dimension. The regridding weights are reused for all cubes on the
+    same grids and, if cache_dir is given, stored on disk.
+    """
+    data = _regrid_data(src, tgt, scheme, block_bytes, cache_dir)
+    return _regridded_cube(src, tgt, data)
+
+
+def lazy_regrid_multi(srcs, tgt, scheme, block_bytes=BLOCK_BYTES,
+                      cache_dir=None):
+    """Regrid a list of cubes onto the grid of cube tgt.
+
+    Cubes with the same shape and horizontal grid are regridded together,
+    in a single pass over blocks of about block_bytes bytes that contain
+    all these variables. To read and regrid each block only once, compute
+    the data of the resulting cubes together, e.g. with a single call to
+    :func:`dask.compute`.
+
+    Returns
+    -------
+    list of iris.cube.Cube
+        The regridded cubes, in the same order as srcs.
+    """
+    groups = OrderedDict()
+    for i, src in enumerate(srcs):
+        groups.setdefault((src.shape, _grid_key(src)), []).append(i)
+
+    results = [None] * len(srcs)
+    for indices in groups.values():
+        group = [srcs[i] for i in indices]
+        datasets = _regrid_stacked_data(group, tgt, scheme, block_bytes,
+                                        cache_dir)
+        for i, src, data in zip(indices, group, datasets):
+            results[i] = _regridded_cube(src, tgt, data)
+
+    return results
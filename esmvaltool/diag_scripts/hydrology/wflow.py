@@ -1,13 +1,19 @@
 """wflow diagnostic."""
+import inspect
 import logging
 from pathlib import Path
 
+import dask
+import dask.array as da
 import iris
+import iris.fileformats.netcdf
 import numpy as np
+from netCDF4 import Dataset
 from osgeo import gdal
 
 from esmvaltool.diag_scripts.hydrology.derive_evspsblpot import debruin_pet
-from esmvaltool.diag_scripts.hydrology.lazy_regrid import lazy_regrid
+from esmvaltool.diag_scripts.hydrology.lazy_regrid import (
+    lazy_regrid, lazy_regrid_multi)
 from esmvaltool.diag_scripts.shared import (ProvenanceLogger,
                                             get_diagnostic_filename,
                                             group_metadata, run_diagnostic)
@@ -58,6 +64,31 @@ def get_input_cubes(metadata):
     return all_vars, provenance
 
 
+def save_lazy(cubes, output_file):
+    """Save cubes to a netCDF file, computing their data in a single pass.
+
+    The cubes share the graph of the stacked regridding, so their data is
+    computed and written together, block by block, instead of one cube
+    after the other.
+    """
+    if 'compute' in inspect.signature(iris.fileformats.netcdf.save).parameters:
+        delayed = iris.save(cubes, output_file, fill_value=1.e20,
+                            compute=False)
+        dask.compute(delayed)
+        return
+
+    # Older iris versions compute every cube separately when saving, so
+    # write the file with placeholder data and store all data at once
+    placeholders = iris.cube.CubeList(
+        cube.copy(da.zeros(cube.shape, dtype=cube.dtype,
+                           chunks=cube.lazy_data().chunks)) for cube in cubes)
+    iris.save(placeholders, output_file, fill_value=1.e20)
+    with Dataset(output_file, 'a') as dataset:
+        da.store([cube.lazy_data() for cube in cubes],
+                 [dataset.variables[cube.var_name] for cube in cubes],
+                 lock=True)
+
+
 def save(cubes, dataset, provenance, cfg):
     """Save cubes to file.
 
@@ -75,7 +106,7 @@ def save(cubes, dataset, provenance, cfg):
     ])
     output_file = get_diagnostic_filename(basename, cfg)
     logger.info("Saving cubes to file %s", output_file)
-    iris.save(cubes, output_file, fill_value=1.e20)
+    save_lazy(cubes, output_file)
 
     # Store provenance
     with ProvenanceLogger(cfg) as provenance_logger:
@@ -90,16 +121,29 @@ def lapse_rate_correction(height):
     return height * gamma
 
 
-def regrid_temperature(src_temp, src_height, target_height, scheme):
-    """Convert temperature to target grid with lapse rate correction."""
+def regrid_temperature(src_temp, src_height, target_height, scheme,
+                       **regrid_options):
+    """Convert temperature to target grid with lapse rate correction.
+
+    Additional keyword arguments are passed to lazy_regrid.
+    """
     # Convert 2m temperature to sea-level temperature (slt)
-    src_dtemp = lapse_rate_correction(src_height)
-    src_slt = src_temp.copy(data=src_temp.core_data() + src_dtemp.core_data())
+    src_slt = sea_level_temperature(src_temp, src_height)
 
     # Interpolate sea-level temperature to target grid
-    target_slt = lazy_regrid(src_slt, target_height, scheme)
+    target_slt = lazy_regrid(src_slt, target_height, scheme, **regrid_options)
+
+    return elevation_temperature(target_slt, target_height)
 
-    # Convert sea-level temperature to new target elevation
+
+def sea_level_temperature(temp, height):
+    """Convert temperature to sea-level temperature."""
+    dtemp = lapse_rate_correction(height)
+    return temp.copy(data=temp.core_data() + dtemp.core_data())
+
+
+def elevation_temperature(target_slt, target_height):
+    """Convert sea-level temperature to temperature at target elevation."""
     target_dtemp = lapse_rate_correction(target_height)
     target_temp = target_slt
     target_temp.data = target_slt.core_data() - target_dtemp.core_data()
@@ -214,32 +258,38 @@ def main(cfg):
         dem = load_dem(dem_path)
         check_dem(dem, all_vars['pr'])
 
-        logger.info("Processing variable precipitation_flux")
-        scheme = cfg['regrid']
-        pr_dem = lazy_regrid(all_vars['pr'], dem, scheme)
-
-        logger.info("Processing variable temperature")
-        tas_dem = regrid_temperature(
-            all_vars['tas'],
-            all_vars['orog'],
+        # Regrid all variables together, temperature with lapse rate
+        # correction via sea-level temperature
+        if 'evspsblpot' in all_vars:
+            names = ['pr', 'evspsblpot']
+        else:
+            names = ['pr', 'psl', 'rsds', 'rsdt']
+        src_cubes = [all_vars[name] for name in names]
+        src_cubes.append(
+            sea_level_temperature(all_vars['tas'], all_vars['orog']))
+        logger.info("Regridding variables %s and temperature",
+                    ', '.join(names))
+        dem_cubes = lazy_regrid_multi(
+            src_cubes,
             dem,
-            scheme,
+            cfg['regrid'],
+            block_bytes=int(cfg.get('regrid_block_size', 50) * (1 << 20)),
+            cache_dir=cfg.get('regrid_cache_dir'),
         )
+        dem_vars = dict(zip(names, dem_cubes))
+        pr_dem = dem_vars['pr']
+        tas_dem = elevation_temperature(dem_cubes[-1], dem)
 
         logger.info("Processing variable potential evapotranspiration")
         if 'evspsblpot' in all_vars:
-            pet = all_vars['evspsblpot']
-            pet_dem = lazy_regrid(pet, dem, scheme)
+            pet_dem = dem_vars['evspsblpot']
         else:
             logger.info("Potential evapotransporation not available, deriving")
-            psl_dem = lazy_regrid(all_vars['psl'], dem, scheme)
-            rsds_dem = lazy_regrid(all_vars['rsds'], dem, scheme)
-            rsdt_dem = lazy_regrid(all_vars['rsdt'], dem, scheme)
             pet_dem = debruin_pet(
                 tas=tas_dem,
-                psl=psl_dem,
-                rsds=rsds_dem,
-                rsdt=rsdt_dem,
+                psl=dem_vars['psl'],
+                rsds=dem_vars['rsds'],
+                rsdt=dem_vars['rsdt'],
             )
         pet_dem.var_name = 'pet'
 
@@ -67,6 +67,7 @@ import sys
 from itertools import product
 
 import cartopy
+import dask.array as da
 import iris
 import iris.coord_categorisation
 import iris.quickplot as qplt
@@ -111,6 +112,42 @@ def create_ice_cmap(threshold=0.15):
     return matplotlib.colors.LinearSegmentedColormap('ice_cmap', ice_cmap_dict)
 
 
+def calculate_ice_extent_and_area(cube, threshold):
+    """
+    Calculate the total ice extent and ice area at every time step.
+
+    The cell areas are computed once, and both totals are evaluated for all
+    time steps in a single lazy pass over the data. Requires a cube with a
+    time dimension followed by two spacial dimensions (no depth coordinate).
+
+    Parameters
+    ----------
+    cube: iris.cube.Cube
+        Data Cube
+    threshold: float
+        The threshold for ice fraction (typically 15%)
+
+    Returns
+    -------
+    numpy.array:
+        An numpy array containing the total ice extent: the area of the
+        unmasked cells with an ice fraction above the threshold.
+    numpy.array:
+        An numpy array containing the total ice area: the sum of the ice
+        fraction times the cell area of the unmasked cells.
+
+    """
+    area = iris.analysis.cartography.area_weights(cube[0])
+    icedata = cube.lazy_data()
+    mask = da.ma.getmaskarray(icedata)
+    icedata = da.ma.getdata(icedata)
+    extent = da.where(mask | (icedata < threshold), 0., area)
+    ice_area = da.where(mask, 0., icedata * area)
+    extent, ice_area = da.compute(extent.sum(axis=(-2, -1)),
+                                  ice_area.sum(axis=(-2, -1)))
+    return extent, ice_area
+
+
 def calculate_area_time_series(cube, plot_type, threshold):
     """
     Calculate the area of unmasked cube cells.
@@ -134,28 +171,11 @@ def calculate_area_time_series(cube, plot_type, threshold):
         An numpy array containing the total ice extent or total ice area.
 
     """
-    data = []
     times = diagtools.cube_time_to_float(cube)
-    for time_itr, time in enumerate(times):
-        icedata = cube[time_itr].data
-
-        area = iris.analysis.cartography.area_weights(cube[time_itr])
-        if plot_type.lower() == 'ice extent':
-            # Ice extend is the area with more than 15% ice cover.
-            icedata = np.ma.masked_where(icedata < threshold, icedata)
-            total_area = np.ma.masked_where(icedata.mask, area.data).sum()
-        if plot_type.lower() == 'ice area':
-            # Ice area is cover * cell area
-            total_area = np.sum(icedata * area)
-
-        logger.debug('Calculating time series area: %s, %s, %s,', time_itr,
-                     time, total_area)
-        data.append(total_area)
-
-    ######
-    # Create a small dummy output array
-    data = np.array(data)
-    return times, data
+    extent, ice_area = calculate_ice_extent_and_area(cube, threshold)
+    if plot_type.lower() == 'ice extent':
+        return times, extent
+    return times, ice_area
 
 
 def make_ts_plots(
@@ -196,14 +216,20 @@ def make_ts_plots(
     pole = get_pole(cube)
     season = get_season(cube)
 
+    # Calculate the ice extent and area of each layer in a single pass
+    totals = {}
+    for layer, cube_layer in cubes.items():
+        times = diagtools.cube_time_to_float(cube_layer)
+        extent, ice_area = calculate_ice_extent_and_area(cube_layer, threshold)
+        totals[layer] = (times, {'Ice Extent': extent, 'Ice Area': ice_area})
+
     # Making plots for each layer
     for plot_type in ['Ice Extent', 'Ice Area']:
         for layer_index, (layer, cube_layer) in enumerate(cubes.items()):
+            times, data = totals[layer]
+            data = data[plot_type]
             layer = str(layer)
 
-            times, data = calculate_area_time_series(cube_layer, plot_type,
-                                                     threshold)
-
             plt.plot(times, data)
 
             # Add title to plot
@@ -577,8 +603,13 @@ def make_map_extent_plots(
             logger.warning('make_polar_map: Not able to add coastlines')
 
         times = np.array(cube.coord('time').points.astype(float))
+        extent, _ = calculate_ice_extent_and_area(cube_layer, threshold)
         plot_desc = {}
         for time_itr, time in enumerate(times):
+            if not extent[time_itr]:
+                # No ice above the threshold: there is no contour to draw.
+                logger.debug('No ice extent at time step %s', time_itr)
+                continue
             cube = cube_layer[time_itr]
             line_width = 1
             color = plt.cm.jet(float(time_itr) / float(len(times)))
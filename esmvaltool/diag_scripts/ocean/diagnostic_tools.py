@@ -20,6 +20,7 @@ import cftime
 import matplotlib.pyplot as plt
 import yaml
 
+from esmvaltool.utils import calendar_helpers
 from esmvaltool.diag_scripts.shared._base import _get_input_data_files
 
 # This part sends debug statements to stdout
@@ -211,30 +212,7 @@ def cube_time_to_float(cube):
 
     """
     times = cube.coord('time')
-    datetime = guess_calendar_datetime(cube)
-
-    dtimes = times.units.num2date(times.points)
-    floattimes = []
-    for dtime in dtimes:
-        # TODO: it would be better to have a calendar dependent value
-        # for daysperyear, as this is not accurate for 360 day calendars.
-        daysperyear = 365.25
-
-        try:
-            dayofyr = dtime.dayofyr
-        except AttributeError:
-            time = datetime(dtime.year, dtime.month, dtime.day)
-            time0 = datetime(dtime.year, 1, 1, 0, 0)
-            dayofyr = (time - time0).days
-
-        floattime = dtime.year + dayofyr / daysperyear + dtime.hour / (
-            24. * daysperyear)
-        if dtime.hour:
-            floattime += dtime.hour / (24. * daysperyear)
-        if dtime.minute:
-            floattime += dtime.minute / (24. * 60. * daysperyear)
-        floattimes.append(floattime)
-    return floattimes
+    return calendar_helpers.decimal_year(times.points, times.units).tolist()
 
 
 def guess_calendar_datetime(cube):
@@ -27,7 +27,6 @@ Description
 ###############################################################
 
 """
-import calendar
 import logging
 import os
 from itertools import cycle
@@ -37,6 +36,7 @@ import iris.coord_categorisation
 import numpy as np
 
 import esmvaltool.diag_scripts.shared as diag
+from esmvaltool.utils import calendar_helpers
 
 logger = logging.getLogger(os.path.basename(__file__))
 
@@ -519,9 +519,8 @@ def get_sim_data(cfg, datapath, catchment_cube):
                          new_cube.long_name.lower(), ' flux')
     # Convert to unit mm per month
     timelist = new_cube.coord('time')
-    daypermonth = []
-    for mydate in timelist.units.num2date(timelist.points):
-        daypermonth.append(calendar.monthrange(mydate.year, mydate.month)[1])
+    daypermonth = calendar_helpers.days_in_month(timelist.points,
+                                                 timelist.units)
     new_cube.data *= 86400.0
     for i, days in enumerate(daypermonth):
         new_cube.data[i] *= days
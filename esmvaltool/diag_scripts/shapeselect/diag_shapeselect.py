@@ -1,15 +1,16 @@
 """Diagnostic to select grid points within a shapefile."""
+import hashlib
 import logging
 import os
-from copy import deepcopy
 
 import fiona
 import iris
 import numpy as np
+import scipy.sparse
+import shapely
 import xlsxwriter
 from netCDF4 import Dataset, num2date
-from shapely.geometry import MultiPoint, shape
-from shapely.ops import nearest_points
+from shapely.geometry import shape
 
 from esmvaltool.diag_scripts.shared import (run_diagnostic, ProvenanceLogger,
                                             get_diagnostic_filename)
@@ -127,94 +128,108 @@ def shapeselect(cfg, cube):
     if not os.path.isabs(shppath):
         shppath = os.path.join(cfg['auxiliary_data_dir'], shppath)
     wgtmet = cfg['weighting_method']
-    if ((cube.coord('latitude').ndim == 1
-         and cube.coord('longitude').ndim == 1)):
-        coordpoints = [(x, y) for x in cube.coord('longitude').points
-                       for y in cube.coord('latitude').points]
-        for i, crd in enumerate(coordpoints):
-            if crd[0] > 180:
-                coordpoints[i] = (coordpoints[i][0] - 360., coordpoints[i][1])
-    else:
+    if not ((cube.coord('latitude').ndim == 1
+             and cube.coord('longitude').ndim == 1)):
         raise ValueError("Support for 2-d coords not implemented!")
-    points = MultiPoint(coordpoints)
+    weights, gxx, gyy = polygon_weights(cfg, cube, shppath, wgtmet)
+
+    # Average the grid points of each polygon for all time steps at once
+    data = cube.data
+    data = data.reshape((data.shape[0], -1))
+    valid = ~np.ma.getmaskarray(data)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ncts = (weights @ np.ma.filled(data, 0.).T).T
+        ncts /= (weights @ valid.T).T
+    nclon = cube.coord('longitude').points[gxx]
+    nclat = cube.coord('latitude').points[gyy]
+    return ncts, nclon, nclat
+
+
+def polygon_weights(cfg, cube, shppath, wgtmet):
+    """Get the grid points of each polygon in a shapefile.
+
+    The result is cached in the directory given by the ``weights_dir``
+    option (default: the run directory), keyed by the content of the
+    shapefile, the weighting method and the grid.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Matrix of shape (number of polygons, number of grid points), with
+        ones for the selected grid points of each polygon. The grid points
+        are ordered as the flattened (latitude, longitude) data.
+    numpy.ndarray
+        Longitude index of the representative grid point of each polygon.
+    numpy.ndarray
+        Latitude index of the representative grid point of each polygon.
+    """
+    lon = cube.coord('longitude').points
+    lat = cube.coord('latitude').points
+    key = hashlib.sha256()
+    with open(shppath, 'rb') as file:
+        key.update(file.read())
+    key.update(wgtmet.encode())
+    key.update(np.ascontiguousarray(lon, dtype=np.float64).tobytes())
+    key.update(np.ascontiguousarray(lat, dtype=np.float64).tobytes())
+    cache_file = os.path.join(
+        cfg.get('weights_dir', cfg['run_dir']),
+        'shapeselect_weights_{}.npz'.format(key.hexdigest()))
+    if os.path.exists(cache_file):
+        logger.debug("Loading polygon weights from %s", cache_file)
+        with np.load(cache_file) as cache:
+            weights = scipy.sparse.csr_matrix(
+                (cache['data'], cache['indices'], cache['indptr']),
+                shape=tuple(cache['shape']))
+            return weights, cache['gxx'], cache['gyy']
+
+    # Use longitudes in [-180, 180] to match the shapefiles
+    lon = np.where(lon > 180, lon - 360., lon)
+    rows = []
+    cols = []
     with fiona.open(shppath) as shp:
-        gpx = []
-        gpy = []
-        cnt = -1
-        ncts = np.zeros((cube.coord('time').shape[0], len(shp)))
-        nclon = np.zeros((len(shp)))  # Takes representative point
-        nclat = np.zeros((len(shp)))
+        gxx = np.zeros(len(shp), dtype=int)
+        gyy = np.zeros(len(shp), dtype=int)
         for ishp, multipol in enumerate(shp):
-            cnt += 1
             multi = shape(multipol['geometry'])
+            gxx[ishp], gyy[ishp] = representative(lon, lat, multi)
+            gpx = gpy = []
             if wgtmet == 'mean_inside':
-                gpx, gpy = mean_inside(gpx, gpy, points, multi, cube)
-                if not gpx:
-                    gpx, gpy = representative(gpx, gpy, points, multi, cube)
-            elif wgtmet == 'representative':
-                gpx, gpy = representative(gpx, gpy, points, multi, cube)
-            if len(gpx) == 1:
-                ncts[:, ishp] = np.reshape(cube.data[:, gpy, gpx],
-                                           (cube.data.shape[0], ))
-            else:
-                ncts[:, ishp] = np.mean(cube.data[:, gpy, gpx], axis=1)
-            gxx, gyy = representative([], [], points, multi, cube)
-            nclon[ishp] = cube.coord('longitude').points[gxx]
-            nclat[ishp] = cube.coord('latitude').points[gyy]
-    return ncts, nclon, nclat
+                gpx, gpy = mean_inside(lon, lat, multi)
+            if len(gpx) == 0:
+                gpx, gpy = [gxx[ishp]], [gyy[ishp]]
+            rows.extend([ishp] * len(gpx))
+            cols.extend(np.asarray(gpy) * len(lon) + np.asarray(gpx))
+    weights = scipy.sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)),
+        shape=(len(gxx), len(lat) * len(lon)))
 
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    np.savez(cache_file, data=weights.data, indices=weights.indices,
+             indptr=weights.indptr, shape=weights.shape, gxx=gxx, gyy=gyy)
+    logger.debug("Saved polygon weights to %s", cache_file)
+    return weights, gxx, gyy
 
-def mean_inside(gpx, gpy, points, multi, cube):
+
+def mean_inside(lon, lat, multi):
     """Find points inside shape."""
-    for point in points:
-        if point.within(multi):
-            if point.x < 0:
-                addx = 360.
-            else:
-                addx = 0.
-            xxx, yyy = best_match(
-                cube.coord('longitude').points,
-                cube.coord('latitude').points, point.x + addx, point.y)
-            gpx.append(xxx)
-            gpy.append(yyy)
-    return gpx, gpy
+    minx, miny, maxx, maxy = multi.bounds
+    candx = np.nonzero((lon >= minx) & (lon <= maxx))[0]
+    candy = np.nonzero((lat >= miny) & (lat <= maxy))[0]
+    # Test all candidate grid points of the bounding box at once
+    candx, candy = np.meshgrid(candx, candy, indexing='ij')
+    shapely.prepare(multi)
+    inside = shapely.contains_xy(multi, lon[candx], lat[candy])
+    return candx[inside], candy[inside]
 
 
-def representative(gpx, gpy, points, multi, cube):
+def representative(lon, lat, multi):
     """Find representative point in shape."""
     reprpoint = multi.representative_point()
-    nearest = nearest_points(reprpoint, points)
-    npx = nearest[1].coords[0][0]
-    npy = nearest[1].coords[0][1]
-    if npx < 0:
-        addx = 360.
-    else:
-        addx = 0.
-    xxx, yyy = best_match(
-        cube.coord('longitude').points,
-        cube.coord('latitude').points, npx + addx, npy)
-    gpx.append(xxx)
-    gpy.append(yyy)
-    return gpx, gpy
-
-
-def best_match(iin, jin, pex, pey):
-    """Identify the grid points in 2-d with minimum distance."""
-    if iin.shape != 2 or jin.shape != 2:
-        gpx = deepcopy(iin)
-        gpy = deepcopy(jin)
-        gpxx = np.zeros((len(gpx), len(gpy)))
-        gpyy = np.zeros((len(gpx), len(gpy)))
-        for gpi in range(0, len(gpy)):
-            gpxx[:, gpi] = gpx
-        for gpj in range(0, len(gpx)):
-            gpyy[gpj, :] = gpy
-    else:
-        gpxx = deepcopy(iin)
-        gpyy = deepcopy(jin)
-    distance = ((gpxx - pex)**2 + (gpyy - pey)**2)**0.5
-    ind = np.unravel_index(np.argmin(distance, axis=None), distance.shape)
-    return ind[0], ind[1]
+    # On a regular grid the nearest point has the nearest longitude and
+    # the nearest latitude
+    xxx = np.argmin(np.abs(lon - reprpoint.x))
+    yyy = np.argmin(np.abs(lat - reprpoint.y))
+    return xxx, yyy
 
 
 def write_netcdf(path, var, plon, plat, cube, cfg):
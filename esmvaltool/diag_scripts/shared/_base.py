@@ -13,6 +13,10 @@ import yaml
 
 logger = logging.getLogger(__name__)
 
+# Use the fast libyaml based loader and dumper for the provenance if available
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
 
 def get_plot_filename(basename, cfg):
     """Get a valid path for saving a diagnostic plot.
@@ -60,6 +64,69 @@ def get_diagnostic_filename(basename, cfg, extension='nc'):
     )
 
 
+def _load_provenance(log_file):
+    """Load the provenance records from file."""
+    if not os.path.exists(log_file):
+        return {}
+    with open(log_file, 'r') as file:
+        return yaml.load(file, Loader=_YAML_LOADER) or {}
+
+
+def _save_provenance(log_file, table):
+    """Save the provenance records to file."""
+    dirname = os.path.dirname(log_file)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    with open(log_file, 'w') as file:
+        yaml.dump(table, file, Dumper=_YAML_DUMPER)
+
+
+class _ProvenanceBuffer:
+    """In-memory provenance records of the running diagnostic.
+
+    The buffer is only active in the process that started it, so records
+    logged in worker processes are still written to file directly.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._tables = {}
+
+    @property
+    def active(self):
+        """Whether the records of this process are buffered."""
+        return self._pid == os.getpid()
+
+    def start(self):
+        """Start buffering the provenance records of this process."""
+        self._pid = os.getpid()
+        self._tables = {}
+
+    def get_table(self, log_file):
+        """Get the buffered provenance records of a provenance file."""
+        if log_file not in self._tables:
+            self._tables[log_file] = _load_provenance(log_file)
+        return self._tables[log_file]
+
+    def flush(self):
+        """Write the buffered records to file and stop buffering."""
+        tables = self._tables
+        self._pid = None
+        self._tables = {}
+        for log_file, table in tables.items():
+            if not table:
+                continue
+            # Keep the records written meanwhile by other processes
+            records = _load_provenance(log_file)
+            records.update(table)
+            _save_provenance(log_file, records)
+        logger.debug("Saved provenance of %s files",
+                     sum(len(table) for table in tables.values()))
+
+
+_PROVENANCE_BUFFER = _ProvenanceBuffer()
+
+
 class ProvenanceLogger:
     """Open the provenance logger.
 
@@ -95,6 +162,12 @@ class ProvenanceLogger:
             with ProvenanceLogger(cfg) as provenance_logger:
                 provenance_logger.log(output_file, record)
 
+    Note
+    ----
+        Inside :func:`run_diagnostic`, the records are kept in a buffer
+        shared by all provenance loggers of the process and written to
+        file once, at the end of the diagnostic run.
+
     """
 
     def __init__(self, cfg):
@@ -102,11 +175,10 @@ class ProvenanceLogger:
         self._log_file = os.path.join(cfg['run_dir'],
                                       'diagnostic_provenance.yml')
 
-        if not os.path.exists(self._log_file):
-            self.table = {}
+        if _PROVENANCE_BUFFER.active:
+            self.table = _PROVENANCE_BUFFER.get_table(self._log_file)
         else:
-            with open(self._log_file, 'r') as file:
-                self.table = yaml.safe_load(file)
+            self.table = _load_provenance(self._log_file)
 
     def log(self, filename, record):
         """Record provenance.
@@ -139,11 +211,7 @@ class ProvenanceLogger:
 
     def _save(self):
         """Save the provenance log to file."""
-        dirname = os.path.dirname(self._log_file)
-        if not os.path.exists(dirname):
-            os.makedirs(dirname)
-        with open(self._log_file, 'w') as file:
-            yaml.safe_dump(self.table, file)
+        _save_provenance(self._log_file, self.table)
 
     def __enter__(self):
         """Enter context."""
@@ -151,7 +219,8 @@ class ProvenanceLogger:
 
     def __exit__(self, *_):
         """Save the provenance log before exiting context."""
-        self._save()
+        if not _PROVENANCE_BUFFER.active:
+            self._save()
 
 
 def select_metadata(metadata, **attributes):
@@ -475,6 +544,10 @@ def run_diagnostic():
     if os.path.exists(provenance_file):
         os.remove(provenance_file)
 
-    yield cfg
+    _PROVENANCE_BUFFER.start()
+    try:
+        yield cfg
+    finally:
+        _PROVENANCE_BUFFER.flush()
 
     logger.info("End of diagnostic script run.")
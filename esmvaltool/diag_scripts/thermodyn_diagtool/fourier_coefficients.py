@@ -11,6 +11,11 @@ this is used for the computation of the Lorenz Energy Cycle.
 @author: valerio.lembo@uni-hamburg.de, Valerio Lembo, Hamburg University, 2018.
 """
 
+import logging
+import os
+import resource
+import sys
+
 import numpy as np
 from netCDF4 import Dataset
 
@@ -21,8 +26,11 @@ GAM = 0.0065  # Standard atmosphere lapse rate
 GAS_CON = 287.0  # Gas constant
 P_0 = 10000  # Reference tropospheric pressure
 
+logger = logging.getLogger(os.path.basename(__file__))
+
 
-def fourier_coeff(tadiagfile, outfile, ta_input, tas_input):
+def fourier_coeff(tadiagfile, outfile, ta_input, tas_input,
+                  block_size=None):
     """Compute Fourier coefficients in lon direction.
 
     Arguments:
@@ -30,27 +38,110 @@ def fourier_coeff(tadiagfile, outfile, ta_input, tas_input):
     - tadiagfile: the name of a file to store modified t fields;
     - outfile: the name of a file to store the Fourier coefficients;
     - ta_input: the name of a file containing t,u,v,w fields;
-    - tas_input: the name of a file containing t2m field.
+    - tas_input: the name of a file containing t2m field;
+    - block_size: if given, use the low-memory mode of compute_coeff. The
+      input fields are then read and the outputs written one block of
+      timesteps at a time.
     """
+    if block_size is not None:
+        _fourier_coeff_blocks(tadiagfile, outfile, ta_input, tas_input,
+                              block_size)
+        return
     with Dataset(ta_input) as dataset:
-        lon = dataset.variables['lon'][:]
-        lat = dataset.variables['lat'][:]
         lev = dataset.variables['plev'][:]
-        time = dataset.variables['time'][:]
         t_a = dataset.variables['ta'][:, :, :, :]
         u_a = dataset.variables['ua'][:, :, :, :]
         v_a = dataset.variables['va'][:, :, :, :]
         wap = dataset.variables['wap'][:, :, :, :]
-    nlon = len(lon)
-    nlat = len(lat)
-    nlev = len(lev)
-    ntime = len(time)
-    i = np.min(np.where(2 * nlat <= GP_RES))
-    trunc = FC_RES[i] + 1
-    wave2 = np.linspace(0, trunc - 1, trunc)
     with Dataset(tas_input) as dataset:
         tas = dataset.variables['tas'][:, :, :]
     tas = tas[:, ::-1, :]
+    t_a, dict_v, wave2 = compute_coeff(t_a, u_a, v_a, wap, tas, lev)
+    pr_output_diag(t_a, ta_input, tadiagfile, 'ta')
+    file_desc = 'Fourier coefficients'
+    pr_output(dict_v, ta_input, outfile, file_desc, wave2)
+
+
+def _fourier_coeff_blocks(tadiagfile, outfile, ta_input, tas_input,
+                          block_size):
+    """Compute Fourier coefficients in blocks, without reading all inputs.
+
+    The netCDF variables of the input and output files are passed to
+    compute_coeff, so only one block of timesteps is kept in memory.
+    """
+    with Dataset(ta_input) as dataset, Dataset(tas_input) as tas_dataset:
+        lev = dataset.variables['plev'][:]
+        t_a, u_a, v_a, wap = [
+            dataset.variables[key] for key in ('ta', 'ua', 'va', 'wap')
+        ]
+        _, wave2 = _truncation(t_a.shape[2])
+        with _output_dataset(ta_input, tadiagfile, "Fourier coefficients",
+                             lon=True) as diag_fid, _output_dataset(
+                                 ta_input, outfile, 'Fourier coefficients',
+                                 wave2=wave2) as coeff_fid:
+            ta_out = diag_fid.createVariable('ta', 'f8',
+                                             ('time', 'plev', 'lat', 'lon'))
+            varatts(ta_out, 'ta')
+            coeffs = {}
+            for key in ('ta', 'ua', 'va', 'wap'):
+                coeffs[key] = coeff_fid.createVariable(
+                    key, 'f8', ('time', 'plev', 'lat', 'wave'))
+                varatts(coeffs[key], key)
+            compute_coeff(t_a, u_a, v_a, wap,
+                          _ReversedLat(tas_dataset.variables['tas']), lev,
+                          block_size=block_size, ta_out=ta_out,
+                          coeffs=coeffs)
+
+
+class _ReversedLat:
+    """Read timesteps of a (time,lat,lon) variable with latitudes reversed."""
+
+    def __init__(self, var):
+        self.var = var
+
+    def __getitem__(self, key):
+        return self.var[key][:, ::-1, :]
+
+
+def _truncation(nlat):
+    """Get the spectral truncation and the zonal wavenumbers."""
+    i = np.min(np.where(2 * nlat <= GP_RES))
+    trunc = FC_RES[i] + 1
+    return trunc, np.linspace(0, trunc - 1, trunc)
+
+
+def compute_coeff(t_a, u_a, v_a, wap, tas, lev, block_size=None,
+                  ta_out=None, coeffs=None):
+    """Fill the temperature below the surface and compute the coefficients.
+
+    Arguments:
+    ---------
+    - t_a, u_a, v_a, wap: the t,u,v,w fields as (time,level,lat,lon), with
+      the latitudes from N to S and 0 below the surface;
+    - tas: the t2m field as (time,lat,lon), with the latitudes from N to S;
+    - lev: the pressure levels;
+    - block_size: if given, the fields are processed in blocks of block_size
+      timesteps, in single precision and with real FFTs, instead of all at
+      once in double precision (see compute_coeff_blocks);
+    - ta_out, coeffs: in the low-memory mode, optional arrays (or netCDF
+      variables) to store the filled t field and the Fourier coefficients
+      in, see compute_coeff_blocks.
+
+    Returns the filled t field, a dictionary with the Fourier coefficients
+    of t,u,v,w as (time,level,lat,wave), with the real and imaginary parts
+    as even and odd wave indices, and the zonal wavenumbers.
+    """
+    ntime, nlev, nlat, nlon = np.shape(t_a)
+    trunc, wave2 = _truncation(nlat)
+    if block_size is not None:
+        dict_v = compute_coeff_blocks(t_a, u_a, v_a, wap, tas, lev, trunc,
+                                      block_size, ta_out, coeffs)
+        if ta_out is not None:
+            t_a = ta_out
+        logger.info(
+            "Fourier coefficients of %s timesteps computed in blocks of %s, "
+            "peak memory usage: %.0f MiB", ntime, block_size, _peak_memory())
+        return t_a, dict_v, wave2
     ta1_fx = np.array(t_a)
     deltat = np.zeros([ntime, nlev, nlat, nlon])
     p_s = np.full([ntime, nlat, nlon], P_0)
@@ -91,7 +182,6 @@ def fourier_coeff(tadiagfile, outfile, ta_input, tas_input):
         dat[i, :, :, :] = (ta2_fx[:, i, :, :] *
                            (1 - 1 * np.array(mask[i, :, :, :])))
         t_a[:, i, :, :] = dat[i, :, :, :] + tafr_bar[i, :, :, :]
-    pr_output_diag(t_a, ta_input, tadiagfile, 'ta')
     tafft_p = np.fft.fft(t_a, axis=3)[:, :, :, :int(trunc / 2)] / (nlon)
     uafft_p = np.fft.fft(u_a, axis=3)[:, :, :, :int(trunc / 2)] / (nlon)
     vafft_p = np.fft.fft(v_a, axis=3)[:, :, :, :int(trunc / 2)] / (nlon)
@@ -109,8 +199,133 @@ def fourier_coeff(tadiagfile, outfile, ta_input, tas_input):
     wapfft[:, :, :, 0::2] = np.real(wapfft_p)
     wapfft[:, :, :, 1::2] = np.imag(wapfft_p)
     dict_v = {'ta': tafft, 'ua': uafft, 'va': vafft, 'wap': wapfft}
-    file_desc = 'Fourier coefficients'
-    pr_output(dict_v, ta_input, outfile, file_desc, wave2)
+    logger.info(
+        "Fourier coefficients of %s timesteps computed, peak memory usage: "
+        "%.0f MiB", ntime, _peak_memory())
+    return t_a, dict_v, wave2
+
+
+def compute_coeff_blocks(t_a, u_a, v_a, wap, tas, lev, trunc, block_size,
+                         ta_out=None, coeffs=None):
+    """Compute the Fourier coefficients in blocks of timesteps.
+
+    This is the low-memory mode of compute_coeff. For each block of
+    timesteps, the surface pressure is estimated and t is extrapolated
+    below the surface in a single vectorised pass, then the coefficients
+    are obtained from real FFTs in single precision. The temporary arrays
+    only cover one block and the coefficients are stored in single
+    precision. The filled t field is written back to t_a, or to ta_out if
+    given.
+
+    Arguments:
+    ---------
+    - t_a, u_a, v_a, wap: the t,u,v,w fields as (time,level,lat,lon), with
+      the latitudes from N to S and 0 below the surface;
+    - tas: the t2m field as (time,lat,lon), with the latitudes from N to S;
+    - lev: the pressure levels;
+    - trunc: the spectral truncation;
+    - block_size: the number of timesteps per block;
+    - ta_out: if given, where to store the filled t field instead of t_a;
+    - coeffs: if given, a dictionary of the arrays where to store the
+      coefficients of t,u,v,w, e.g. the variables of an output file.
+
+    The input fields are only indexed by blocks of timesteps, so they can
+    also be netCDF variables, which are then read one block at a time.
+    """
+    ntime, nlev, nlat, nlon = np.shape(t_a)
+    lev = np.asarray(lev)
+    # Levels without data above the surface are skipped in the extrapolation
+    has_data = [
+        any(np.any(t_a[t_0:t_0 + block_size, i_l] != 0)
+            for t_0 in range(0, ntime, block_size)) for i_l in range(nlev)
+    ]
+    if ta_out is None:
+        ta_out = t_a
+    dict_v = coeffs
+    if dict_v is None:
+        dict_v = {}
+        for key in ('ta', 'ua', 'va', 'wap'):
+            dict_v[key] = np.zeros([ntime, nlev, nlat, trunc],
+                                   dtype=np.float32)
+    for t_0 in range(0, ntime, block_size):
+        blk = slice(t_0, t_0 + block_size)
+        ta_blk = np.asarray(t_a[blk], dtype=np.float32)
+        tas_blk = np.asarray(tas[blk], dtype=np.float32)
+        if nlev > 2 and all(has_data[1:]):
+            p_s = _surface_pressure(ta_blk, tas_blk, lev)
+        else:
+            p_s = _surface_pressure_loop(ta_blk, tas_blk, lev, has_data)
+        p_s = p_s[:, np.newaxis, :, :]
+        deltap = p_s - lev[np.newaxis, :, np.newaxis, np.newaxis]
+        tas_blk = tas_blk[:, np.newaxis, :, :]
+        ta_blk = np.where(ta_blk == 0,
+                          tas_blk - GAM * GAS_CON / (G_0 * p_s) * deltap *
+                          tas_blk, ta_blk).astype(np.float32)
+        ta_out[blk] = ta_blk
+        for key, fld in zip(('ta', 'ua', 'va', 'wap'),
+                            (ta_blk, u_a[blk], v_a[blk], wap[blk])):
+            fld = np.asarray(fld, dtype=np.float32)
+            coeff = np.fft.rfft(fld, axis=3)[:, :, :, :int(trunc / 2)] / nlon
+            coeff_blk = np.zeros(fld.shape[:3] + (trunc, ), dtype=np.float32)
+            coeff_blk[..., 0::2] = np.real(coeff)
+            coeff_blk[..., 1::2] = np.imag(coeff)
+            dict_v[key][blk] = coeff_blk
+    return dict_v
+
+
+def _peak_memory():
+    """Return the peak resident memory of the process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / 1024**2
+    return peak / 1024
+
+
+def _surface_pressure(t_a, tas, lev):
+    """Estimate the surface pressure from the levels below the surface.
+
+    The surface is placed below the lowest level with data, extrapolating
+    from the temperature difference between that level and the surface. At
+    the gridpoints where all levels have data, P_0 is returned.
+
+    This gives the same result as _surface_pressure_loop, when all levels
+    but the first have data at some gridpoint and there are more than two
+    levels.
+    """
+    nlev = np.shape(t_a)[1]
+    below = t_a[:, :-1, :, :] == 0
+    has_below = np.any(below, axis=1)
+    # Index of the highest level below the surface, excluding the top level
+    i_b = nlev - 2 - np.argmax(below[:, ::-1, :, :], axis=1)
+    ta_up = np.take_along_axis(t_a, i_b[:, np.newaxis, :, :] + 1,
+                               axis=1)[:, 0, :, :]
+    d_p = -((P_0 * G_0 / (GAM * GAS_CON)) * (ta_up - tas) / tas)
+    return np.where(has_below, lev[i_b] + d_p, P_0)
+
+
+def _surface_pressure_loop(t_a, tas, lev, has_data):
+    """Estimate the surface pressure, looping over the levels.
+
+    This follows the extrapolation in compute_coeff, with the levels
+    without data above the surface given in has_data.
+    """
+    nlev = np.shape(t_a)[1]
+    p_s = np.full(np.shape(tas), P_0)
+    for i in np.arange(nlev - 1, 0, -1):
+        if has_data[i]:
+            deltat = np.where(t_a[:, i - 1, :, :] != 0, 0.,
+                              (t_a[:, i, :, :] - tas))
+            deltat = (t_a[:, i, :, :] != 0) * deltat
+            d_p = -((P_0 * G_0 / (GAM * GAS_CON)) * deltat / tas)
+            p_s = np.where(t_a[:, i - 1, :, :] != 0, p_s, lev[i - 1] + d_p)
+            for k in np.arange(0, nlev - i - 1, 1):
+                if has_data[i + k]:
+                    deltat = np.where(t_a[:, i + k, :, :] != 0, deltat,
+                                      (t_a[:, i + k + 1, :, :] - tas))
+                    d_p = -((P_0 * G_0 / (GAM * GAS_CON)) * deltat / tas)
+                    p_s = np.where(t_a[:, i + k, :, :] != 0, p_s,
+                                   lev[i + k] + d_p)
+    return p_s
 
 
 def pr_output(dict_v, nc_f, fileo, file_desc, wave2):
@@ -136,17 +351,7 @@ def pr_output(dict_v, nc_f, fileo, file_desc, wave2):
         Chris Slocum (2014), modified by Valerio Lembo (2018).
     """
     # Writing NetCDF files
-    with Dataset(fileo, 'w', format='NETCDF4') as var_nc_fid:
-        var_nc_fid.description = file_desc
-        with Dataset(nc_f, 'r') as nc_fid:
-            extr_time(nc_fid, var_nc_fid)
-            extr_lat(nc_fid, var_nc_fid, 'lat')
-            extr_plev(nc_fid, var_nc_fid)
-            # Write the wave dimension
-            var_nc_fid.createDimension('wave', len(wave2))
-            var_nc_fid.createVariable('wave', nc_fid.variables['plev'].dtype,
-                                      ('wave', ))
-        var_nc_fid.variables['wave'][:] = wave2
+    with _output_dataset(nc_f, fileo, file_desc, wave2=wave2) as var_nc_fid:
         for key in dict_v:
             value = dict_v[key]
             var1_nc_var = var_nc_fid.createVariable(
@@ -174,20 +379,40 @@ def pr_output_diag(var1, nc_f, fileo, name1):
     PROGRAMMER(S)
         Chris Slocum (2014), modified by Valerio Lembo (2018).
     """
-    with Dataset(fileo, 'w', format='NETCDF4') as var_nc_fid:
-        var_nc_fid.description = "Fourier coefficients"
-        with Dataset(nc_f, 'r') as nc_fid:
-            # Extract data from NetCDF file nad write them to the new file
-            extr_time(nc_fid, var_nc_fid)
-            extr_lat(nc_fid, var_nc_fid, 'lat')
-            extr_lon(nc_fid, var_nc_fid)
-            extr_plev(nc_fid, var_nc_fid)
+    with _output_dataset(nc_f, fileo, "Fourier coefficients",
+                         lon=True) as var_nc_fid:
         var1_nc_var = var_nc_fid.createVariable(name1, 'f8',
                                                 ('time', 'plev', 'lat', 'lon'))
         varatts(var1_nc_var, name1)
         var_nc_fid.variables[name1][:, :, :, :] = var1
 
 
+def _output_dataset(nc_f, fileo, file_desc, lon=False, wave2=None):
+    """Create a NetCDF file with the coordinates of an existing file.
+
+    The time, lat and plev coordinates (and lon, if requested) are copied
+    from nc_f, and a wave coordinate is added if wave2 is given. Returns the
+    new dataset, open for writing the fields.
+    """
+    var_nc_fid = Dataset(fileo, 'w', format='NETCDF4')
+    var_nc_fid.description = file_desc
+    with Dataset(nc_f, 'r') as nc_fid:
+        # Extract data from NetCDF file nad write them to the new file
+        extr_time(nc_fid, var_nc_fid)
+        extr_lat(nc_fid, var_nc_fid, 'lat')
+        if lon:
+            extr_lon(nc_fid, var_nc_fid)
+        extr_plev(nc_fid, var_nc_fid)
+        if wave2 is not None:
+            # Write the wave dimension
+            var_nc_fid.createDimension('wave', len(wave2))
+            var_nc_fid.createVariable('wave', nc_fid.variables['plev'].dtype,
+                                      ('wave', ))
+    if wave2 is not None:
+        var_nc_fid.variables['wave'][:] = wave2
+    return var_nc_fid
+
+
 def extr_lat(nc_fid, var_nc_fid, latn):
     """Extract lat coord. from NC files and save them to a new NC file.
 
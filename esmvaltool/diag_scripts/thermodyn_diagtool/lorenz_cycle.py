@@ -6,7 +6,6 @@ The module contains the following functions:
               NetCDF files and providing a flux diagram and a table outputs,
               the latter separately for the two hemispheres;
     - averages: a script computing time, global and zonal averages;
-    - averages_comp: a script computing global mean of the output fields;
     - bsslzr: it contains the coefficients for the conversion from regular
               lonlat grid to Gaussian grid;
     - diagram: it is the interface between the main program and a
@@ -16,6 +15,13 @@ The module contains the following functions:
     - globall_cg: it computes the global and hemispheric means at each
                   timestep;
     - init: initializes the table and ingests input fields;
+    - lec_coeffs: reads the input fields one year at a time, fills them below
+                  the surface and computes their Fourier coefficients in
+                  memory;
+    - lec_terms: computes the time mean of the transient reservoirs and
+                 conversion terms, processing blocks of timesteps at once;
+    - lec_terms_timestep: the per-timestep reference implementation of
+                          lec_terms;
     - makek: computes the KE reservoirs;
     - makea: computes the APE reservoirs;
     - mka2k: computes the APE->KE conversion terms;
@@ -28,6 +34,8 @@ The module contains the following functions:
                       from imaginary part of the Fourier coefficients,
                       reordering the latitudinal dimension (from N to S),
                       interpolating on a reference sigma coordinate,
+    - preproc_lec_cdo: the same preprocessing, performed with CDO through
+                       temporary files;
     - pr_output: prints a single component of the LEC computations to a
                  single Nc file;
     - removeif: removes a file if it exists;
@@ -48,13 +56,14 @@ References.
 @author: valerio.lembo@uni-hamburg.de, Valerio Lembo, Hamburg University, 2018.
 """
 
+import logging
 import math
 import os
 import sys
 
 import numpy as np
 from cdo import Cdo
-from netCDF4 import Dataset
+from netCDF4 import Dataset, num2date
 
 import esmvaltool.diag_scripts.shared as e
 from esmvaltool.diag_scripts.thermodyn_diagtool import (fluxogram,
@@ -69,8 +78,73 @@ NW_1 = 3
 NW_2 = 9
 NW_3 = 21
 
+logger = logging.getLogger(os.path.basename(__file__))
 
-def lorenz(outpath, model, year, filenc, plotfile, logfile):
+
+def _cast(arr, single_precision):
+    """Cast a real or complex array to single precision if requested."""
+    if not single_precision:
+        return arr
+    if np.iscomplexobj(arr):
+        return arr.astype(np.complex64)
+    return arr.astype(np.float32)
+
+
+def _deltas(fld, axis):
+    """Compute the differences between neighbours along an axis.
+
+    Centred differences are used in the interior, forward and backward
+    differences at the boundaries.
+    """
+    fld = np.moveaxis(fld, axis, 0)
+    dfld = np.empty_like(fld)
+    dfld[0] = fld[1] - fld[0]
+    dfld[-1] = fld[-1] - fld[-2]
+    dfld[1:-1] = fld[2:] - fld[:-2]
+    return np.moveaxis(dfld, 0, axis)
+
+
+def _dfdp(fld, p_l):
+    """Compute the vertical derivative of a (lev, ...) field.
+
+    In the interior the forward and backward derivatives are averaged,
+    weighted with the opposite level spacing.
+    """
+    p_l = np.reshape(p_l, (-1, ) + (1, ) * (np.ndim(fld) - 1))
+    dfdp = (fld[1:] - fld[:-1]) / (p_l[1:] - p_l[:-1])
+    dfld = np.empty(np.shape(fld), dtype=dfdp.dtype)
+    dfld[0] = dfdp[0]
+    dfld[-1] = dfdp[-1]
+    dfld[1:-1] = ((dfdp[1:] * (p_l[1:-1] - p_l[:-2]) + dfdp[:-1] *
+                   (p_l[2:] - p_l[1:-1])) / (p_l[2:] - p_l[:-2]))
+    return dfld
+
+
+def _read_year(filename, short_name, time_slice, lev_slice):
+    """Read the timesteps of a year (and the selected levels) of a field."""
+    with Dataset(filename) as dataset:
+        var = dataset.variables[short_name]
+        if var.ndim == 4:
+            return var[time_slice, lev_slice, :, :]
+        return var[time_slice, :, :]
+
+
+def _year_slices(filename):
+    """Get the time slice covered by each year in a file."""
+    with Dataset(filename) as dataset:
+        time = dataset.variables['time']
+        dates = num2date(time[:], time.units,
+                         getattr(time, 'calendar', 'standard'))
+    years = np.array([date.year for date in dates])
+    slices = {}
+    for year in np.unique(years):
+        ind = np.where(years == year)[0]
+        slices[year] = slice(ind[0], ind[-1] + 1)
+    return slices
+
+
+def lorenz(outpath, model, year, filenc, plotfile, logfile, block_size=8,
+           single_precision=False):
     """Manage input and output fields and calling functions.
 
     Receive fields t,u,v,w as input fields in Fourier
@@ -80,74 +154,41 @@ def lorenz(outpath, model, year, filenc, plotfile, logfile):
         - outpath: ath where otput fields are stored (as NetCDF fields);
         - model: name of the model that is analysed;
         - year: year that is considered;
-        - filenc: name of the file containing the input fields;
+        - filenc: name of the file containing the input fields, or a
+          dictionary with the input fields (see lec_coeffs);
         - plotfile: name of the file that will contain the flux diagram;
-        - logfile: name of the file containing the table as a .txt file.
+        - logfile: name of the file containing the table as a .txt file;
+        - block_size: the number of timesteps processed at once for the
+          transient terms (see lec_terms);
+        - single_precision: if True, the transient terms are computed in
+          single precision.
     """
     ta_c, ua_c, va_c, wap_c, dims, lev, lat, log = init(logfile, filenc)
     nlev = int(dims[0])
-    ntime = int(dims[1])
     nlat = int(dims[2])
     ntp = int(dims[3])
     d_s, y_l, g_w = weights(lev, nlev, lat)
-    # Compute time mean
-    ta_tmn = np.nanmean(ta_c, axis=1)
-    ta_ztmn, ta_gmn = averages(ta_tmn, g_w)
-    ua_tmn = np.nanmean(ua_c, axis=1)
-    va_tmn = np.nanmean(va_c, axis=1)
-    wap_tmn = np.nanmean(wap_c, axis=1)
+    fields = [ta_c, ua_c, va_c, wap_c]
+    tmn, terms = lec_terms(fields, lev, y_l, g_w, block_size=block_size,
+                           single_precision=single_precision)
+    ta_tmn, ua_tmn, va_tmn, wap_tmn = tmn
+    e_k, ape, a2k, ae2az, ke2kz, at2as, kt2ks = terms
+    _, ta_gmn = averages(ta_tmn, g_w)
     _, wap_gmn = averages(wap_tmn, g_w)
-    # Compute stability parameter
-    gam_ztmn = np.zeros([nlev, nlat])
-    for l_l in range(nlat):
-        gam_ztmn[:, l_l] = stabil(ta_ztmn[:, l_l], lev, nlev)
     gam_tmn = stabil(ta_gmn, lev, nlev)
-    e_k = np.zeros([nlev, ntime, nlat, ntp - 1])
-    ape = np.zeros([nlev, ntime, nlat, ntp - 1])
-    a2k = np.zeros([nlev, ntime, nlat, ntp - 1])
-    ae2az = np.zeros([nlev, ntime, nlat, ntp - 1])
-    ke2kz = np.zeros([nlev, ntime, nlat, ntp - 1])
-    at2as = np.zeros([nlev, ntime, nlat, ntp - 1])
-    kt2ks = np.zeros([nlev, ntime, nlat, ntp - 1])
-    for t_t in range(ntime):
-        ta_tan = ta_c[:, t_t, :, :] - ta_tmn
-        ua_tan = ua_c[:, t_t, :, :] - ua_tmn
-        va_tan = va_c[:, t_t, :, :] - va_tmn
-        wap_tan = wap_c[:, t_t, :, :] - wap_tmn
-        # Compute zonal means
-        _, ta_tgan = averages(ta_tan, g_w)
-        _, wap_tgan = averages(wap_tan, g_w)
-        # Compute kinetic energy
-        e_k[:, t_t, :, :] = makek(ua_tan, va_tan)
-        # Compute available potential energy
-        ape[:, t_t, :, :] = makea(ta_tan, ta_tgan, gam_tmn)
-        # Compute conversion between kin.en. and pot.en.
-        a2k[:, t_t, :, :] = mka2k(wap_tan, ta_tan, wap_tgan, ta_tgan, lev)
-        # Compute conversion between zonal and eddy APE
-        ae2az[:, t_t, :, :] = mkaeaz(va_tan, wap_tan, ta_tan, ta_tmn, ta_gmn,
-                                     lev, y_l, gam_tmn, nlat, nlev)
-        # Compute conversion between zonal and eddy KE
-        ke2kz[:, t_t, :, :] = mkkekz(ua_tan, va_tan, wap_tan, ua_tmn, va_tmn,
-                                     lev, y_l, nlat, ntp, nlev)
-        # Compute conversion between stationary and transient eddy APE
-        at2as[:, t_t, :, :] = mkatas(ua_tan, va_tan, wap_tan, ta_tan, ta_ztmn,
-                                     gam_ztmn, lev, y_l, nlat, ntp, nlev)
-        # Compute conversion between stationary and transient eddy KE
-        kt2ks[:, t_t, :, :] = mkktks(ua_tan, va_tan, ua_tmn, va_tmn, y_l, nlat,
-                                     ntp, nlev)
-    ek_tgmn = averages_comp(e_k, g_w, d_s, dims)
+    ek_tgmn = globall_cg(e_k, g_w, d_s, dims)
     table(ek_tgmn, ntp, 'TOT. KIN. EN.    ', logfile, flag=0)
-    ape_tgmn = averages_comp(ape, g_w, d_s, dims)
+    ape_tgmn = globall_cg(ape, g_w, d_s, dims)
     table(ape_tgmn, ntp, 'TOT. POT. EN.   ', logfile, flag=0)
-    a2k_tgmn = averages_comp(a2k, g_w, d_s, dims)
+    a2k_tgmn = globall_cg(a2k, g_w, d_s, dims)
     table(a2k_tgmn, ntp, 'KE -> APE (trans) ', logfile, flag=1)
-    ae2az_tgmn = averages_comp(ae2az, g_w, d_s, dims)
+    ae2az_tgmn = globall_cg(ae2az, g_w, d_s, dims)
     table(ae2az_tgmn, ntp, 'AZ <-> AE (trans) ', logfile, flag=1)
-    ke2kz_tgmn = averages_comp(ke2kz, g_w, d_s, dims)
+    ke2kz_tgmn = globall_cg(ke2kz, g_w, d_s, dims)
     table(ke2kz_tgmn, ntp, 'KZ <-> KE (trans) ', logfile, flag=1)
-    at2as_tgmn = averages_comp(at2as, g_w, d_s, dims)
+    at2as_tgmn = globall_cg(at2as, g_w, d_s, dims)
     table(at2as_tgmn, ntp, 'ASE  <->  ATE   ', logfile, flag=1)
-    kt2ks_tgmn = averages_comp(kt2ks, g_w, d_s, dims)
+    kt2ks_tgmn = globall_cg(kt2ks, g_w, d_s, dims)
     table(kt2ks_tgmn, ntp, 'KSE  <->  KTE   ', logfile, flag=1)
     ek_st = makek(ua_tmn, va_tmn)
     ek_stgmn = globall_cg(ek_st, g_w, d_s, dims)
@@ -189,28 +230,15 @@ def averages(x_c, g_w):
     """Compute time, zonal and global mean averages of initial fields.
 
     Arguments:
-    - x_c: the input field as (lev, lat, wave);
+    - x_c: the input field as (lev, lat, wave), optionally with a leading
+      time axis;
     - g_w: the Gaussian weights for meridional averaging;
     """
-    xc_ztmn = np.squeeze(np.real(x_c[:, :, 0]))
-    xc_gmn = np.nansum(xc_ztmn * g_w[np.newaxis, :], axis=1) / np.nansum(g_w)
+    xc_ztmn = np.squeeze(np.real(x_c[..., 0]))
+    xc_gmn = np.nansum(xc_ztmn * g_w, axis=-1) / np.nansum(g_w)
     return xc_ztmn, xc_gmn
 
 
-def averages_comp(fld, g_w, d_s, dims):
-    """Compute the global mean averages of reservoirs and conversion terms.
-
-    Arguments:
-    - fld: the component of the LEC (time, lev, lat, wave);
-    - g_w: the Gaussian weights for meridional averaging;
-    - d_s: the Delta sigma of the sigma levels;
-    - dims: a list containing the dimensions length0;
-    """
-    fld_tmn = np.nanmean(fld, axis=1)
-    fld_tgmn = globall_cg(fld_tmn, g_w, d_s, dims)
-    return fld_tgmn
-
-
 def bsslzr(kdim):
     """Obtain parameters for the Gaussian coefficients.
 
@@ -372,25 +400,20 @@ def globall_cg(d3v, g_w, d_s, dims):
     - d_s: the vertical levels;
     - dims: a list containing the sizes of the dimensions;
     """
-    nlev = int(dims[0])
     nlat = int(dims[2])
     ntp = int(dims[3])
     gmn = np.zeros([3, ntp - 1])
-    aux1 = np.zeros([nlev, int(nlat / 2), ntp - 1])
-    aux2 = np.zeros([nlev, int(nlat / 2), ntp - 1])
-    aux1v = np.zeros([nlev, ntp - 1])
-    aux2v = np.zeros([nlev, ntp - 1])
     nhem = int(nlat / 2)
     fac = 1 / G * PS / 1e5
-    for l_l in range(nlev):
-        for i_h in range(nhem):
-            aux1[l_l, i_h, :] = fac * np.real(d3v[l_l, i_h, :]) * g_w[i_h]
-            aux2[l_l, i_h, :] = (fac * np.real(d3v[l_l, i_h + nhem - 1, :]) *
-                                 g_w[i_h + nhem - 1])
-        aux1v[l_l, :] = (np.nansum(aux1[l_l, :, :], axis=0) /
-                         np.nansum(g_w[0:nhem]) * d_s[l_l])
-        aux2v[l_l, :] = (np.nansum(aux2[l_l, :, :], axis=0) /
-                         np.nansum(g_w[0:nhem]) * d_s[l_l])
+    # The southern hemisphere starts at nhem - 1, as in the original code
+    nh_s = slice(0, nhem)
+    sh_s = slice(nhem - 1, 2 * nhem - 1)
+    aux1 = fac * np.real(d3v[:, nh_s, :]) * g_w[np.newaxis, nh_s, np.newaxis]
+    aux2 = fac * np.real(d3v[:, sh_s, :]) * g_w[np.newaxis, sh_s, np.newaxis]
+    aux1v = (np.nansum(aux1, axis=1) / np.nansum(g_w[0:nhem]) *
+             d_s[:, np.newaxis])
+    aux2v = (np.nansum(aux2, axis=1) / np.nansum(g_w[0:nhem]) *
+             d_s[:, np.newaxis])
     gmn[1, :] = (np.nansum(aux1v, axis=0) / np.nansum(d_s))
     gmn[2, :] = (np.nansum(aux2v, axis=0) / np.nansum(d_s))
     gmn[0, :] = 0.5 * (gmn[1, :] + gmn[2, :])
@@ -405,7 +428,9 @@ def init(logfile, filep):
     as odd. Convert them to complex fields for Python.
 
     Arguments:
-        - filenc: name of the file containing the input fields;
+        - filenc: name of the file containing the input fields, or a
+          dictionary with the input fields and the plev, time and lat
+          coordinates (see lec_coeffs);
         - logfile: name of the file containing the table as a .txt file.
     """
     with open(logfile, 'w') as log:
@@ -414,14 +439,18 @@ def init(logfile, filep):
         log.write('#      LORENZ     ENERGY    CYCLE                      #\n')
         log.write('#                                                      #\n')
         log.write('########################################################\n')
-    with Dataset(filep) as dataset0:
-        t_a = dataset0.variables['ta'][:, :, :, :]
-        u_a = dataset0.variables['ua'][:, :, :, :]
-        v_a = dataset0.variables['va'][:, :, :, :]
-        wap = dataset0.variables['wap'][:, :, :, :]
-        lev = dataset0.variables['plev'][:]
-        time = dataset0.variables['time'][:]
-        lat = dataset0.variables['lat'][:]
+    if isinstance(filep, dict):
+        t_a, u_a, v_a, wap = [filep[key] for key in ('ta', 'ua', 'va', 'wap')]
+        lev, time, lat = [filep[key] for key in ('plev', 'time', 'lat')]
+    else:
+        with Dataset(filep) as dataset0:
+            t_a = dataset0.variables['ta'][:, :, :, :]
+            u_a = dataset0.variables['ua'][:, :, :, :]
+            v_a = dataset0.variables['va'][:, :, :, :]
+            wap = dataset0.variables['wap'][:, :, :, :]
+            lev = dataset0.variables['plev'][:]
+            time = dataset0.variables['time'][:]
+            lat = dataset0.variables['lat'][:]
     nfc = np.shape(t_a)[3]
     nlev = len(lev)
     ntime = len(time)
@@ -471,18 +500,221 @@ def init(logfile, filep):
     return ta_c, ua_c, va_c, wap_c, dims, lev, lat, log
 
 
+def lec_coeffs(files, fourier_block_size=None):
+    """Yield the Fourier coefficients of t,u,v,w for each year.
+
+    This is the in-memory equivalent of the CDO preprocessing in
+    preproc_lec_cdo: u and v are filled below the surface with the
+    near-surface winds, missing values are set to 0, the levels between 100
+    and 900 hPa are selected and the latitudes are reordered from N to S.
+    The input files are read one year at a time and the coefficients are
+    computed with fourier_coefficients.compute_coeff.
+
+    Arguments:
+    - files: a dictionary with the names of the ta, tas, ua, uas, va, vas
+      and wap files;
+    - fourier_block_size: if given, the Fourier coefficients are computed in
+      the low-memory mode of compute_coeff, with blocks of this many
+      timesteps;
+
+    Yields the year and a dictionary with the ta, ua, va, wap coefficients
+    and the plev, time, lat and wave coordinates, as expected by lorenz.
+    Only the years covered by all files are processed.
+    """
+    slices = {key: _year_slices(filename) for key, filename in files.items()}
+    years = set.intersection(*[set(slc) for slc in slices.values()])
+    if not years:
+        raise ValueError("The input files {} have no year in common".format(
+            ', '.join(files.values())))
+    skipped = set.union(*[set(slc) for slc in slices.values()]) - years
+    if skipped:
+        logger.warning(
+            "Skipping years %s, which are not covered by all input files",
+            ', '.join(str(year) for year in sorted(skipped)))
+    with Dataset(files['ta']) as dataset:
+        plev = dataset.variables['plev'][:]
+        time = dataset.variables['time'][:]
+        lat_var = dataset.variables['lat']
+        lat = lat_var[::-1]
+        lat_atts = {
+            att: lat_var.getncattr(att)
+            for att in lat_var.ncattrs() if att != '_FillValue'
+        }
+    levs = np.where((plev >= 10000) & (plev <= 90000))[0]
+    lev_slice = slice(levs[0], levs[-1] + 1)
+    for year in sorted(years):
+        flds = {
+            key: _read_year(filename, key, slices[key][year], lev_slice)
+            for key, filename in files.items()
+        }
+        orog = np.ma.getmaskarray(flds['ua'])
+        for key in ('ua', 'va'):
+            flds[key] = (np.ma.filled(flds[key], 0) + np.where(
+                orog, np.ma.filled(flds[key + 's'], 0)[:, np.newaxis], 0))
+        t_a, u_a, v_a, wap = [
+            np.ma.filled(flds[key], 0).astype(np.float32)[:, :, ::-1, :]
+            for key in ('ta', 'ua', 'va', 'wap')
+        ]
+        tas = flds['tas'].astype(np.float32)[:, ::-1, :]
+        _, coeffs, wave = fourier_coefficients.compute_coeff(
+            t_a, u_a, v_a, wap, tas, plev[lev_slice],
+            block_size=fourier_block_size)
+        coeffs.update({
+            'plev': plev[lev_slice],
+            'time': time[slices['ta'][year]],
+            'lat': lat,
+            'lat_atts': lat_atts,
+            'wave': wave.astype(plev.dtype),
+        })
+        yield str(year), coeffs
+
+
+def lec_terms(fields, lev, y_l, g_w, block_size=8, single_precision=False):
+    """Compute the time mean of the transient reservoirs and conversions.
+
+    The transient eddies are processed in blocks of timesteps, the time
+    being the leading axis of the (time, lev, lat, wave) anomalies passed to
+    the functions computing the reservoirs and conversion terms. Only the
+    sums over time are kept, so that the memory footprint is set by the
+    block size rather than by the length of the year. The per-timestep
+    reference implementation is lec_terms_timestep.
+
+    Arguments:
+    - fields: a list with the ta, ua, va, wap Fourier coefficients as
+      (lev, time, lat, wave);
+    - lev: the pressure levels;
+    - y_l: the latitudes in radians;
+    - g_w: the Gaussian weights for meridional averaging;
+    - block_size: the number of timesteps per block. A few days per block
+      are enough to vectorise the computations, larger blocks only increase
+      the memory usage. If None, the whole year is processed at once;
+    - single_precision: if True, compute the terms in single precision;
+
+    Returns the time mean ta, ua, va, wap fields and the time mean ek, ape,
+    a2k, ae2az, ke2kz, at2as, kt2ks fields, all as (lev, lat, wave).
+    """
+    nlev, ntime, nlat, nwave = np.shape(fields[0])
+    ntp = nwave + 1
+    tmn = [np.nanmean(fld, axis=1) for fld in fields]
+    ta_ztmn, ta_gmn = averages(tmn[0], g_w)
+    gam_ztmn = stabil(ta_ztmn, lev, nlev)
+    gam_tmn = stabil(ta_gmn, lev, nlev)
+    aux = [
+        _cast(fld, single_precision) for fld in tmn +
+        [ta_ztmn, ta_gmn, gam_ztmn, gam_tmn, lev, y_l, g_w]
+    ]
+    ta_tmn, ua_tmn, va_tmn, wap_tmn = aux[:4]
+    ta_ztmn, ta_gmn, gam_ztmn, gam_tmn, p_l, lat, g_w = aux[4:]
+    if block_size is None:
+        block_size = ntime
+    sums = np.zeros([7, nlev, nlat, nwave])
+    counts = np.zeros([7, nlev, nlat, nwave])
+    for t_0 in range(0, ntime, block_size):
+        ta_tan, ua_tan, va_tan, wap_tan = [
+            np.moveaxis(
+                _cast(fld[:, t_0:t_0 + block_size], single_precision), 1, 0) -
+            fld_tmn
+            for fld, fld_tmn in zip(fields, [ta_tmn, ua_tmn, va_tmn, wap_tmn])
+        ]
+        _, ta_tgan = averages(ta_tan, g_w)
+        _, wap_tgan = averages(wap_tan, g_w)
+        terms = [
+            makek(ua_tan, va_tan),
+            makea(ta_tan, ta_tgan, gam_tmn),
+            mka2k(wap_tan, ta_tan, wap_tgan, ta_tgan, p_l),
+            mkaeaz(va_tan, wap_tan, ta_tan, ta_tmn, ta_gmn, p_l, lat, gam_tmn,
+                   nlat, nlev),
+            mkkekz(ua_tan, va_tan, wap_tan, ua_tmn, va_tmn, p_l, lat, nlat,
+                   ntp, nlev),
+            mkatas(ua_tan, va_tan, wap_tan, ta_tan, ta_ztmn, gam_ztmn, p_l,
+                   lat, nlat, ntp, nlev),
+            mkktks(ua_tan, va_tan, ua_tmn, va_tmn, lat, nlat, ntp, nlev),
+        ]
+        for i_t, term in enumerate(terms):
+            term = np.real(term)
+            sums[i_t] += np.nansum(term, axis=0)
+            counts[i_t] += np.sum(~np.isnan(term), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        terms_tmn = sums / counts
+    return tmn, list(terms_tmn)
+
+
+def lec_terms_timestep(fields, lev, y_l, g_w):
+    """Compute the time mean of the transient terms, one timestep at a time.
+
+    This is the reference implementation of lec_terms, storing the
+    reservoirs and conversion terms at each timestep before averaging them.
+
+    Arguments:
+    - fields: a list with the ta, ua, va, wap Fourier coefficients as
+      (lev, time, lat, wave);
+    - lev: the pressure levels;
+    - y_l: the latitudes in radians;
+    - g_w: the Gaussian weights for meridional averaging;
+    """
+    ta_c, ua_c, va_c, wap_c = fields
+    nlev, ntime, nlat, nwave = np.shape(ta_c)
+    ntp = nwave + 1
+    ta_tmn = np.nanmean(ta_c, axis=1)
+    ta_ztmn, ta_gmn = averages(ta_tmn, g_w)
+    ua_tmn = np.nanmean(ua_c, axis=1)
+    va_tmn = np.nanmean(va_c, axis=1)
+    wap_tmn = np.nanmean(wap_c, axis=1)
+    gam_ztmn = np.zeros([nlev, nlat])
+    for l_l in range(nlat):
+        gam_ztmn[:, l_l] = stabil(ta_ztmn[:, l_l], lev, nlev)
+    gam_tmn = stabil(ta_gmn, lev, nlev)
+    e_k = np.zeros([nlev, ntime, nlat, ntp - 1])
+    ape = np.zeros([nlev, ntime, nlat, ntp - 1])
+    a2k = np.zeros([nlev, ntime, nlat, ntp - 1])
+    ae2az = np.zeros([nlev, ntime, nlat, ntp - 1])
+    ke2kz = np.zeros([nlev, ntime, nlat, ntp - 1])
+    at2as = np.zeros([nlev, ntime, nlat, ntp - 1])
+    kt2ks = np.zeros([nlev, ntime, nlat, ntp - 1])
+    for t_t in range(ntime):
+        ta_tan = ta_c[:, t_t, :, :] - ta_tmn
+        ua_tan = ua_c[:, t_t, :, :] - ua_tmn
+        va_tan = va_c[:, t_t, :, :] - va_tmn
+        wap_tan = wap_c[:, t_t, :, :] - wap_tmn
+        # Compute zonal means
+        _, ta_tgan = averages(ta_tan, g_w)
+        _, wap_tgan = averages(wap_tan, g_w)
+        # Compute kinetic energy
+        e_k[:, t_t, :, :] = makek(ua_tan, va_tan)
+        # Compute available potential energy
+        ape[:, t_t, :, :] = makea(ta_tan, ta_tgan, gam_tmn)
+        # Compute conversion between kin.en. and pot.en.
+        a2k[:, t_t, :, :] = np.real(
+            mka2k(wap_tan, ta_tan, wap_tgan, ta_tgan, lev))
+        # Compute conversion between zonal and eddy APE
+        ae2az[:, t_t, :, :] = mkaeaz(va_tan, wap_tan, ta_tan, ta_tmn, ta_gmn,
+                                     lev, y_l, gam_tmn, nlat, nlev)
+        # Compute conversion between zonal and eddy KE
+        ke2kz[:, t_t, :, :] = mkkekz(ua_tan, va_tan, wap_tan, ua_tmn, va_tmn,
+                                     lev, y_l, nlat, ntp, nlev)
+        # Compute conversion between stationary and transient eddy APE
+        at2as[:, t_t, :, :] = mkatas(ua_tan, va_tan, wap_tan, ta_tan, ta_ztmn,
+                                     gam_ztmn, lev, y_l, nlat, ntp, nlev)
+        # Compute conversion between stationary and transient eddy KE
+        kt2ks[:, t_t, :, :] = mkktks(ua_tan, va_tan, ua_tmn, va_tmn, y_l, nlat,
+                                     ntp, nlev)
+    tmn = [ta_tmn, ua_tmn, va_tmn, wap_tmn]
+    terms = [e_k, ape, a2k, ae2az, ke2kz, at2as, kt2ks]
+    return tmn, [np.nanmean(term, axis=1) for term in terms]
+
+
 def makek(u_t, v_t):
     """Compute the kinetic energy reservoirs from u and v.
 
     Arguments:
-    - u_t: a 3D zonal velocity field;
+    - u_t: a 3D zonal velocity field (optionally with a leading time axis);
     - v_t: a 3D meridional velocity field;
     """
     ck1 = u_t * np.conj(u_t)
     ck2 = v_t * np.conj(v_t)
     e_k = np.real(ck1 + ck2)
-    e_k[:, :, 0] = 0.5 * np.real(u_t[:, :, 0] * u_t[:, :, 0] +
-                                 v_t[:, :, 0] * v_t[:, :, 0])
+    e_k[..., 0] = 0.5 * np.real(u_t[..., 0] * u_t[..., 0] +
+                                v_t[..., 0] * v_t[..., 0])
     return e_k
 
 
@@ -490,14 +722,14 @@ def makea(t_t, t_g, gam):
     """Compute the kinetic energy reservoirs from t.
 
     Arguments:
-    - t_t_ a 3D temperature field;
-    - t_g: a temperature vertical profile;
+    - t_t_ a 3D temperature field (optionally with a leading time axis);
+    - t_g: a temperature vertical profile (optionally with a time axis);
     - gam: a vertical profile of the stability parameter;
     """
     ape = gam[:, np.newaxis, np.newaxis] * np.real(t_t * np.conj(t_t))
-    ape[:, :, 0] = (gam[:, np.newaxis] * 0.5 * np.real(
-        (t_t[:, :, 0] - t_g[:, np.newaxis]) *
-        (t_t[:, :, 0] - t_g[:, np.newaxis])))
+    ape[..., 0] = (gam[:, np.newaxis] * 0.5 * np.real(
+        (t_t[..., 0] - t_g[..., np.newaxis]) *
+        (t_t[..., 0] - t_g[..., np.newaxis])))
     return ape
 
 
@@ -505,17 +737,17 @@ def mka2k(wap, t_t, w_g, t_g, p_l):
     """Compute the KE to APE energy conversions from t and w.
 
     Arguments:
-    - wap: a 3D vertical velocity field;
+    - wap: a 3D vertical velocity field (optionally with a leading time axis);
     - t_t: a 3D temperature field;
-    - w_g: a vertical velocity vertical profile;
+    - w_g: a vertical velocity vertical profile (optionally with a time axis);
     - t_g: a temperature vertical profile;
     - p_l: the pressure levels;
     """
     a2k = -(R / p_l[:, np.newaxis, np.newaxis] *
             (t_t * np.conj(wap) + np.conj(t_t) * wap))
-    a2k[:, :, 0] = -(R / p_l[:, np.newaxis] *
-                     (t_t[:, :, 0] - t_g[:, np.newaxis]) *
-                     (wap[:, :, 0] - w_g[:, np.newaxis]))
+    a2k[..., 0] = -(R / p_l[:, np.newaxis] *
+                    (t_t[..., 0] - t_g[..., np.newaxis]) *
+                    (wap[..., 0] - w_g[..., np.newaxis]))
     return a2k
 
 
@@ -523,7 +755,8 @@ def mkaeaz(v_t, wap, t_t, ttt, ttg, p_l, lat, gam, nlat, nlev):
     """Compute the zonal mean - eddy APE conversions from t and v.
 
     Arguments:
-    - v_t: a 3D meridional velocity field;
+    - v_t: a 3D meridional velocity field (optionally with a leading time
+      axis);
     - wap: a 3D vertical velocity field;
     - t_t: a 3D temperature field;
     - ttt: a climatological mean 3D temperature field;
@@ -533,48 +766,16 @@ def mkaeaz(v_t, wap, t_t, ttt, ttg, p_l, lat, gam, nlat, nlev):
     - nlat: the number of latitudes;
     - nlev: the number of levels;
     """
-    dtdp = np.zeros([nlev, nlat])
-    dtdy = np.zeros([nlev, nlat])
-    for l_l in np.arange(nlev):
-        if l_l == 0:
-            t_1 = np.real(ttt[l_l, :, 0]) - ttg[l_l]
-            t_2 = np.real(ttt[l_l + 1, :, 0]) - ttg[l_l + 1]
-            dtdp[l_l, :] = (t_2 - t_1) / (p_l[l_l + 1] - p_l[l_l])
-        elif l_l == nlev - 1:
-            t_1 = np.real(ttt[l_l - 1, :, 0]) - ttg[l_l - 1]
-            t_2 = np.real(ttt[l_l, :, 0]) - ttg[l_l]
-            dtdp[l_l, :] = (t_2 - t_1) / (p_l[l_l] - p_l[l_l - 1])
-        else:
-            t_1 = np.real(ttt[l_l, :, 0]) - ttg[l_l]
-            t_2 = np.real(ttt[l_l + 1, :, 0]) - ttg[l_l + 1]
-            dtdp1 = (t_2 - t_1) / (p_l[l_l + 1] - p_l[l_l])
-            t_2 = t_1
-            t_1 = np.real(ttt[l_l - 1, :, 0]) - ttg[l_l - 1]
-            dtdp2 = (t_2 - t_1) / (p_l[l_l] - p_l[l_l - 1])
-            dtdp[l_l, :] = ((dtdp1 * (p_l[l_l] - p_l[l_l - 1]) + dtdp2 *
-                             (p_l[l_l + 1] - p_l[l_l])) /
-                            (p_l[l_l + 1] - p_l[l_l - 1]))
-        dtdp[l_l, :] = dtdp[l_l, :] - (R / (CP * p_l[l_l]) *
-                                       (ttt[l_l, :, 0] - ttg[l_l]))
-    for i_l in np.arange(nlat):
-        if i_l == 0:
-            t_1 = np.real(ttt[:, i_l, 0])
-            t_2 = np.real(ttt[:, i_l + 1, 0])
-            dtdy[:, i_l] = (t_2 - t_1) / (lat[i_l + 1] - lat[i_l])
-        elif i_l == nlat - 1:
-            t_1 = np.real(ttt[:, i_l - 1, 0])
-            t_2 = np.real(ttt[:, i_l, 0])
-            dtdy[:, i_l] = (t_2 - t_1) / (lat[i_l] - lat[i_l - 1])
-        else:
-            t_1 = np.real(ttt[:, i_l - 1, 0])
-            t_2 = np.real(ttt[:, i_l + 1, 0])
-            dtdy[:, i_l] = (t_2 - t_1) / (lat[i_l + 1] - lat[i_l - 1])
+    t_a = np.real(ttt[:, :, 0]) - ttg[:, np.newaxis]
+    dtdp = (_dfdp(t_a, p_l) - R / (CP * p_l[:, np.newaxis]) *
+            np.real(ttt[:, :, 0] - ttg[:, np.newaxis]))
+    dtdy = _deltas(np.real(ttt[:, :, 0]), 1) / _deltas(lat, 0)
     dtdy = dtdy / AA
     c_1 = np.real(v_t * np.conj(t_t) + t_t * np.conj(v_t))
     c_2 = np.real(wap * np.conj(t_t) + t_t * np.conj(wap))
     ae2az = (gam[:, np.newaxis, np.newaxis] *
              (dtdy[:, :, np.newaxis] * c_1 + dtdp[:, :, np.newaxis] * c_2))
-    ae2az[:, :, 0] = 0.
+    ae2az[..., 0] = 0.
     return ae2az
 
 
@@ -582,7 +783,7 @@ def mkkekz(u_t, v_t, wap, utt, vtt, p_l, lat, nlat, ntp, nlev):
     """Compute the zonal mean - eddy KE conversions from u and v.
 
     Arguments:
-    - u_t: a 3D zonal velocity field;
+    - u_t: a 3D zonal velocity field (optionally with a leading time axis);
     - v_t: a 3D meridional velocity field;
     - wap: a 3D vertical velocity field;
     - utt: a climatological mean 3D zonal velocity field;
@@ -593,81 +794,28 @@ def mkkekz(u_t, v_t, wap, utt, vtt, p_l, lat, nlat, ntp, nlev):
     - ntp: the number of wavenumbers;
     - nlev: the number of vertical levels;
     """
-    dudp = np.zeros([nlev, nlat])
-    dvdp = np.zeros([nlev, nlat])
-    dudy = np.zeros([nlev, nlat])
-    dvdy = np.zeros([nlev, nlat])
-    for l_l in np.arange(nlev):
-        if l_l == 0:
-            dudp[l_l, :] = ((np.real(utt[l_l + 1, :, 0] - utt[l_l, :, 0])) /
-                            (p_l[l_l + 1] - p_l[l_l]))
-            dvdp[l_l, :] = ((np.real(vtt[l_l + 1, :, 0] - vtt[l_l, :, 0])) /
-                            (p_l[l_l + 1] - p_l[l_l]))
-        elif l_l == nlev - 1:
-            dudp[l_l, :] = ((np.real(utt[l_l, :, 0] - utt[l_l - 1, :, 0])) /
-                            (p_l[l_l] - p_l[l_l - 1]))
-            dvdp[l_l, :] = ((np.real(vtt[l_l, :, 0] - vtt[l_l - 1, :, 0])) /
-                            (p_l[l_l] - p_l[l_l - 1]))
-        else:
-            dudp1 = ((np.real(utt[l_l + 1, :, 0] - utt[l_l, :, 0])) /
-                     (p_l[l_l + 1] - p_l[l_l]))
-            dvdp1 = ((np.real(vtt[l_l + 1, :, 0] - vtt[l_l, :, 0])) /
-                     (p_l[l_l + 1] - p_l[l_l]))
-            dudp2 = ((np.real(utt[l_l, :, 0] - utt[l_l - 1, :, 0])) /
-                     (p_l[l_l] - p_l[l_l - 1]))
-            dvdp2 = ((np.real(vtt[l_l, :, 0] - vtt[l_l - 1, :, 0])) /
-                     (p_l[l_l] - p_l[l_l - 1]))
-            dudp[l_l, :] = ((dudp1 * (p_l[l_l] - p_l[l_l - 1]) + dudp2 *
-                             (p_l[l_l + 1] - p_l[l_l])) /
-                            (p_l[l_l + 1] - p_l[l_l - 1]))
-            dvdp[l_l, :] = ((dvdp1 * (p_l[l_l] - p_l[l_l - 1]) + dvdp2 *
-                             (p_l[l_l + 1] - p_l[l_l])) /
-                            (p_l[l_l + 1] - p_l[l_l - 1]))
-    for i_l in np.arange(nlat):
-        if i_l == 0:
-            dudy[:, i_l] = ((np.real(utt[:, i_l + 1, 0] - utt[:, i_l, 0])) /
-                            (lat[i_l + 1] - lat[i_l]))
-            dvdy[:, i_l] = ((np.real(vtt[:, i_l + 1, 0] - vtt[:, i_l, 0])) /
-                            (lat[i_l + 1] - lat[i_l]))
-        elif i_l == nlat - 1:
-            dudy[:, i_l] = ((np.real(utt[:, i_l, 0] - utt[:, i_l - 1, 0])) /
-                            (lat[i_l] - lat[i_l - 1]))
-            dvdy[:, i_l] = ((np.real(vtt[:, i_l, 0] - vtt[:, i_l - 1, 0])) /
-                            (lat[i_l] - lat[i_l - 1]))
-        else:
-            dudy[:, i_l] = (
-                (np.real(utt[:, i_l + 1, 0] - utt[:, i_l - 1, 0])) /
-                (lat[i_l + 1] - lat[i_l - 1]))
-            dvdy[:, i_l] = (
-                (np.real(vtt[:, i_l + 1, 0] - vtt[:, i_l - 1, 0])) /
-                (lat[i_l + 1] - lat[i_l - 1]))
+    u_z = np.real(utt[:, :, 0])
+    v_z = np.real(vtt[:, :, 0])
+    dudp = _dfdp(u_z, p_l)
+    dvdp = _dfdp(v_z, p_l)
+    dudy = _deltas(u_z, 1) / _deltas(lat, 0)
+    dvdy = _deltas(v_z, 1) / _deltas(lat, 0)
     dudy = dudy / AA
     dvdy = dvdy / AA
-    c_1 = np.zeros([nlev, nlat, ntp - 1])
-    c_2 = np.zeros([nlev, nlat, ntp - 1])
-    c_3 = np.zeros([nlev, nlat, ntp - 1])
-    c_4 = np.zeros([nlev, nlat, ntp - 1])
-    c_5 = np.zeros([nlev, nlat, ntp - 1])
-    c_6 = np.zeros([nlev, nlat, ntp - 1])
     u_u = u_t * np.conj(u_t) + u_t * np.conj(u_t)
     u_v = u_t * np.conj(v_t) + v_t * np.conj(u_t)
     v_v = v_t * np.conj(v_t) + v_t * np.conj(v_t)
     u_w = u_t * np.conj(wap) + wap * np.conj(u_t)
     v_w = v_t * np.conj(wap) + wap * np.conj(v_t)
-    for i_l in np.arange(nlat):
-        c_1[:, i_l, :] = dudy[:, i_l][:, np.newaxis] * u_v[:, i_l, :]
-        c_2[:, i_l, :] = dvdy[:, i_l][:, np.newaxis] * v_v[:, i_l, :]
-        c_5[:, i_l, :] = (np.tan(lat[i_l]) / AA *
-                          np.real(utt[:, i_l, 0])[:, np.newaxis] *
-                          (u_v[:, i_l, :]))
-        c_6[:, i_l, :] = -(np.tan(lat[i_l]) / AA *
-                           np.real(vtt[:, i_l, 0])[:, np.newaxis] *
-                           (u_u[:, i_l, :]))
-    for l_l in np.arange(nlev):
-        c_3[l_l, :, :] = dudp[l_l, :][:, np.newaxis] * u_w[l_l, :, :]
-        c_4[l_l, :, :] = dvdp[l_l, :][:, np.newaxis] * v_w[l_l, :, :]
+    tanl = np.tan(lat)[np.newaxis, :] / AA
+    c_1 = np.real(dudy[:, :, np.newaxis] * u_v)
+    c_2 = np.real(dvdy[:, :, np.newaxis] * v_v)
+    c_3 = np.real(dudp[:, :, np.newaxis] * u_w)
+    c_4 = np.real(dvdp[:, :, np.newaxis] * v_w)
+    c_5 = np.real((tanl * u_z)[:, :, np.newaxis] * u_v)
+    c_6 = -np.real((tanl * v_z)[:, :, np.newaxis] * u_u)
     ke2kz = (c_1 + c_2 + c_3 + c_4 + c_5 + c_6)
-    ke2kz[:, :, 0] = 0.
+    ke2kz[..., 0] = 0.
     return ke2kz
 
 
@@ -675,7 +823,7 @@ def mkatas(u_t, v_t, wap, t_t, ttt, g_w, p_l, lat, nlat, ntp, nlev):
     """Compute the stat.-trans. eddy APE conversions from u, v, wap and t.
 
     Arguments:
-    - u_t: a 3D zonal velocity field;
+    - u_t: a 3D zonal velocity field (optionally with a leading time axis);
     - v_t: a 3D meridional velocity field;
     - wap: a 3D vertical velocity field;
     - t_t: a 3D temperature field;
@@ -687,64 +835,25 @@ def mkatas(u_t, v_t, wap, t_t, ttt, g_w, p_l, lat, nlat, ntp, nlev):
     - ntp: the number of wavenumbers;
     - nlev: the number of vertical levels;
     """
-    t_r = np.fft.ifft(t_t, axis=2)
-    u_r = np.fft.ifft(u_t, axis=2)
-    v_r = np.fft.ifft(v_t, axis=2)
-    w_r = np.fft.ifft(wap, axis=2)
+    t_r = np.fft.ifft(t_t, axis=-1)
+    u_r = np.fft.ifft(u_t, axis=-1)
+    v_r = np.fft.ifft(v_t, axis=-1)
+    w_r = np.fft.ifft(wap, axis=-1)
     tur = t_r * u_r
     tvr = t_r * v_r
     twr = t_r * w_r
-    t_u = np.fft.fft(tur, axis=2)
-    t_v = np.fft.fft(tvr, axis=2)
-    t_w = np.fft.fft(twr, axis=2)
+    t_u = np.fft.fft(tur, axis=-1)
+    t_v = np.fft.fft(tvr, axis=-1)
+    t_w = np.fft.fft(twr, axis=-1)
     c_1 = (t_u * np.conj(ttt[:, :, np.newaxis]) -
            ttt[:, :, np.newaxis] * np.conj(t_u))
     c_6 = (t_w * np.conj(ttt[:, :, np.newaxis]) -
            ttt[:, :, np.newaxis] * np.conj(t_w))
-    c_2 = np.zeros([nlev, nlat, ntp - 1])
-    c_3 = np.zeros([nlev, nlat, ntp - 1])
-    c_5 = np.zeros([nlev, nlat, ntp - 1])
-    for i_l in range(nlat):
-        if i_l == 0:
-            c_2[:, i_l, :] = (
-                t_v[:, i_l, :] / (AA * (lat[i_l + 1] - lat[i_l])) *
-                np.conj(ttt[:, i_l + 1, np.newaxis] - ttt[:, i_l, np.newaxis]))
-            c_3[:, i_l, :] = (
-                np.conj(t_v[:, i_l, :]) / (AA * (lat[i_l + 1] - lat[i_l])) *
-                (ttt[:, i_l + 1, np.newaxis] - ttt[:, i_l, np.newaxis]))
-        elif i_l == nlat - 1:
-            c_2[:, i_l, :] = (
-                t_v[:, i_l, :] / (AA * (lat[i_l] - lat[i_l - 1])) *
-                np.conj(ttt[:, i_l, np.newaxis] - ttt[:, i_l - 1, np.newaxis]))
-            c_3[:, i_l, :] = (
-                np.conj(t_v[:, i_l, :]) / (AA * (lat[i_l] - lat[i_l - 1])) *
-                (ttt[:, i_l, np.newaxis] - ttt[:, i_l - 1, np.newaxis]))
-        else:
-            c_2[:, i_l, :] = (t_v[:, i_l, :] /
-                              (AA * (lat[i_l + 1] - lat[i_l - 1])) *
-                              np.conj(ttt[:, i_l + 1, np.newaxis] -
-                                      ttt[:, i_l - 1, np.newaxis]))
-            c_3[:, i_l, :] = (
-                np.conj(t_v[:, i_l, :]) / (AA *
-                                           (lat[i_l + 1] - lat[i_l - 1])) *
-                (ttt[:, i_l + 1, np.newaxis] - ttt[:, i_l - 1, np.newaxis]))
-    for l_l in range(nlev):
-        if l_l == 0:
-            c_5[l_l, :, :] = (
-                (ttt[l_l + 1, :, np.newaxis] - ttt[l_l, :, np.newaxis]) /
-                (p_l[l_l + 1] - p_l[l_l]))
-        elif l_l == nlev - 1:
-            c_5[l_l, :, :] = (
-                (ttt[l_l, :, np.newaxis] - ttt[l_l - 1, :, np.newaxis]) /
-                (p_l[l_l] - p_l[l_l - 1]))
-        else:
-            c51 = ((ttt[l_l + 1, :, np.newaxis] - ttt[l_l, :, np.newaxis]) /
-                   (p_l[l_l + 1] - p_l[l_l]))
-            c52 = ((ttt[l_l, :, np.newaxis] - ttt[l_l - 1, :, np.newaxis]) /
-                   (p_l[l_l] - p_l[l_l - 1]))
-            c_5[l_l, :, :] = ((c51 * (p_l[l_l] - p_l[l_l - 1]) + c52 *
-                               (p_l[l_l + 1] - p_l[l_l])) /
-                              (p_l[l_l + 1] - p_l[l_l - 1]))
+    dlat = AA * _deltas(lat, 0)[:, np.newaxis]
+    dttt = _deltas(ttt, 1)[:, :, np.newaxis]
+    c_2 = np.real(t_v / dlat * np.conj(dttt))
+    c_3 = np.real(np.conj(t_v) / dlat * dttt)
+    c_5 = _dfdp(ttt, p_l)[:, :, np.newaxis]
     k_k = np.arange(0, ntp - 1)
     at2as = (((k_k - 1)[np.newaxis, np.newaxis, :] * np.imag(c_1) /
               (AA * np.cos(lat[np.newaxis, :, np.newaxis])) +
@@ -752,7 +861,7 @@ def mkatas(u_t, v_t, wap, t_t, ttt, g_w, p_l, lat, nlat, ntp, nlev):
               np.real(c_2 + c_3) + R /
               (CP * p_l[:, np.newaxis, np.newaxis]) * np.real(c_6)) *
              g_w[:, :, np.newaxis])
-    at2as[:, :, 0] = 0.
+    at2as[..., 0] = 0.
     return at2as
 
 
@@ -760,7 +869,7 @@ def mkktks(u_t, v_t, utt, vtt, lat, nlat, ntp, nlev):
     """Compute the stat.-trans. eddy KE conversions from u, v and t.
 
     Arguments:
-    - u_t: a 3D zonal velocity field;
+    - u_t: a 3D zonal velocity field (optionally with a leading time axis);
     - v_t: a 3D meridional velocity field;
     - utt: a climatological mean 3D zonal velocity field;
     - vtt: a climatological mean 3D meridional velocity field;
@@ -769,34 +878,21 @@ def mkktks(u_t, v_t, utt, vtt, lat, nlat, ntp, nlev):
     - ntp: the number of wavenumbers;
     - nlev: the number of vertical levels;
     """
-    dut = np.zeros([nlev, nlat, ntp - 1])
-    dvt = np.zeros([nlev, nlat, ntp - 1])
-    dlat = np.zeros([nlat])
-    u_r = np.fft.irfft(u_t, axis=2)
-    v_r = np.fft.irfft(v_t, axis=2)
+    u_r = np.fft.irfft(u_t, axis=-1)
+    v_r = np.fft.irfft(v_t, axis=-1)
     uur = u_r * u_r
     uvr = u_r * v_r
     vvr = v_r * v_r
-    u_u = np.fft.rfft(uur, axis=2)
-    v_v = np.fft.rfft(vvr, axis=2)
-    u_v = np.fft.rfft(uvr, axis=2)
+    u_u = np.fft.rfft(uur, axis=-1)
+    v_v = np.fft.rfft(vvr, axis=-1)
+    u_v = np.fft.rfft(uvr, axis=-1)
     c_1 = u_u * np.conj(u_t) - u_t * np.conj(u_u)
     # c_3 = u_v * np.conj(u_t) + u_t * np.conj(u_v)
     c_5 = u_u * np.conj(v_t) + v_t * np.conj(u_u)
     c_6 = u_v * np.conj(v_t) - v_t * np.conj(u_v)
-    for i_l in range(nlat):
-        if i_l == 0:
-            dut[:, i_l, :] = (utt[:, i_l + 1, :] - utt[:, i_l, :])
-            dvt[:, i_l, :] = (vtt[:, i_l + 1, :] - vtt[:, i_l, :])
-            dlat[i_l] = (lat[i_l + 1] - lat[i_l])
-        elif i_l == nlat - 1:
-            dut[:, i_l, :] = (utt[:, i_l, :] - utt[:, i_l - 1, :])
-            dvt[:, i_l, :] = (vtt[:, i_l, :] - vtt[:, i_l - 1, :])
-            dlat[i_l] = (lat[i_l] - lat[i_l - 1])
-        else:
-            dut[:, i_l, :] = (utt[:, i_l + 1, :] - utt[:, i_l - 1, :])
-            dvt[:, i_l, :] = (vtt[:, i_l + 1, :] - vtt[:, i_l - 1, :])
-            dlat[i_l] = (lat[i_l + 1] - lat[i_l - 1])
+    dut = np.real(_deltas(utt, 1))
+    dvt = np.real(_deltas(vtt, 1))
+    dlat = _deltas(lat, 0)
     c21 = np.conj(u_u) * dut / dlat[np.newaxis, :, np.newaxis]
     c22 = u_u * np.conj(dut) / dlat[np.newaxis, :, np.newaxis]
     c41 = np.conj(v_v) * dvt / dlat[np.newaxis, :, np.newaxis]
@@ -806,7 +902,7 @@ def mkktks(u_t, v_t, utt, vtt, lat, nlat, ntp, nlev):
              np.tan(lat)[np.newaxis, :, np.newaxis] * np.real(c_1 - c_5) / AA +
              np.imag(c_1 + c_6) * (k_k - 1)[np.newaxis, np.newaxis, :] /
              (AA * np.cos(lat)[np.newaxis, :, np.newaxis]))
-    kt2ks[:, :, 0] = 0
+    kt2ks[..., 0] = 0
     return kt2ks
 
 
@@ -820,8 +916,7 @@ def output(fld, d_s, filenc, name, nc_f):
     - name: the variable name;
     - nc_f: the name of the output file (with path)
     """
-    fld_tmn = np.nanmean(fld, axis=1)
-    fld_aux = fld_tmn * d_s[:, np.newaxis, np.newaxis]
+    fld_aux = fld * d_s[:, np.newaxis, np.newaxis]
     fld_vmn = np.nansum(fld_aux, axis=0) / np.nansum(d_s)
     removeif(nc_f)
     pr_output(fld_vmn, name, filenc, nc_f)
@@ -836,7 +931,8 @@ def pr_output(varo, varname, filep, nc_f):
     Arguments:
     - varo: the field to be stored;
     - varname: the name of the variables to be saved;
-    - filep: the existing dataset, containing the metadata;
+    - filep: the existing dataset, containing the metadata, or a dictionary
+      with the lat and wave coordinates (see lec_coeffs);
     - nc_f: the name of the output file;
 
     PROGRAMMER(S)
@@ -845,26 +941,38 @@ def pr_output(varo, varname, filep, nc_f):
     fourc = fourier_coefficients
     with Dataset(nc_f, 'w', format='NETCDF4') as w_nc_fid:
         w_nc_fid.description = "Outputs of LEC program"
-        with Dataset(filep, 'r') as nc_fid:
-            # Extract data from NetCDF file
-            wave = nc_fid.variables['wave'][:]
+        if isinstance(filep, dict):
+            wave = filep['wave']
             ntp = int(len(wave) / 2)
-            # Writing NetCDF files
-            fourc.extr_lat(nc_fid, w_nc_fid, 'lat')
+            w_nc_fid.createDimension('lat', len(filep['lat']))
+            w_nc_lat = w_nc_fid.createVariable('lat', filep['lat'].dtype,
+                                               ('lat', ))
+            w_nc_lat.setncatts(filep['lat_atts'])
+            w_nc_lat[:] = filep['lat']
             w_nc_fid.createDimension('wave', ntp)
-            w_nc_dim = w_nc_fid.createVariable('wave',
-                                               nc_fid.variables['wave'].dtype,
-                                               ('wave', ))
-            for ncattr in nc_fid.variables['wave'].ncattrs():
-                w_nc_dim.setncattr(ncattr,
-                                   nc_fid.variables['wave'].getncattr(ncattr))
+            w_nc_fid.createVariable('wave', wave.dtype, ('wave', ))
+        else:
+            with Dataset(filep, 'r') as nc_fid:
+                # Extract data from NetCDF file
+                wave = nc_fid.variables['wave'][:]
+                ntp = int(len(wave) / 2)
+                # Writing NetCDF files
+                fourc.extr_lat(nc_fid, w_nc_fid, 'lat')
+                w_nc_fid.createDimension('wave', ntp)
+                w_nc_dim = w_nc_fid.createVariable(
+                    'wave', nc_fid.variables['wave'].dtype, ('wave', ))
+                for ncattr in nc_fid.variables['wave'].ncattrs():
+                    w_nc_dim.setncattr(
+                        ncattr, nc_fid.variables['wave'].getncattr(ncattr))
         w_nc_fid.variables['wave'][:] = wave[0:ntp]
         w_nc_var = w_nc_fid.createVariable(varname, 'f8', ('lat', 'wave'))
         varatts(w_nc_var, varname, 1, 0)
         w_nc_fid.variables[varname][:] = varo
 
 
-def preproc_lec(model, wdir, pdir, input_data):
+def preproc_lec(model, wdir, pdir, input_data, block_size=8,
+                single_precision=False, use_tempfiles=False,
+                fourier_block_size=None):
     """Preprocess fields for LEC computations and send it to lorenz program.
 
     This function computes the interpolation of ta, ua, va, wap daily fields to
@@ -880,25 +988,67 @@ def preproc_lec(model, wdir, pdir, input_data):
       to store tables of conversion/reservoir terms and the flux diagram for
       year;
     - filelist: a list of file names containing the input fields;
+    - block_size: the number of timesteps processed at once for the
+      transient terms (see lec_terms);
+    - single_precision: if True, the transient terms are computed in single
+      precision;
+    - use_tempfiles: if True, the fields are preprocessed with CDO and
+      passed to the LEC computations through temporary files in wdir,
+      instead of being processed in memory one year at a time (see
+      lec_coeffs);
+    - fourier_block_size: if given, the Fourier coefficients are computed in
+      blocks of this many timesteps, in single precision, to limit the memory
+      usage (see fourier_coefficients.compute_coeff);
     """
-    cdo = Cdo()
-    fourc = fourier_coefficients
-    ta_file = e.select_metadata(input_data, short_name='ta',
-                                dataset=model)[0]['filename']
-    tas_file = e.select_metadata(input_data, short_name='tas',
-                                 dataset=model)[0]['filename']
-    ua_file = e.select_metadata(input_data, short_name='ua',
-                                dataset=model)[0]['filename']
-    uas_file = e.select_metadata(input_data, short_name='uas',
-                                 dataset=model)[0]['filename']
-    va_file = e.select_metadata(input_data, short_name='va',
-                                dataset=model)[0]['filename']
-    vas_file = e.select_metadata(input_data, short_name='vas',
-                                 dataset=model)[0]['filename']
-    wap_file = e.select_metadata(input_data, short_name='wap',
-                                 dataset=model)[0]['filename']
+    files = {}
+    for short_name in ('ta', 'tas', 'ua', 'uas', 'va', 'vas', 'wap'):
+        files[short_name] = e.select_metadata(input_data,
+                                              short_name=short_name,
+                                              dataset=model)[0]['filename']
     ldir = os.path.join(pdir, 'LEC_results')
     os.makedirs(ldir)
+    if use_tempfiles:
+        return preproc_lec_cdo(model, wdir, ldir, files, block_size,
+                               single_precision, fourier_block_size)
+    lect = []
+    for y_ro, coeffs in lec_coeffs(files, fourier_block_size):
+        diagfile = (ldir + '/{}_{}_lec_diagram.png'.format(model, y_ro))
+        logfile = (ldir + '/{}_{}_lec_table.txt'.format(model, y_ro))
+        lect.append(
+            lorenz(wdir, model, y_ro, coeffs, diagfile, logfile, block_size,
+                   single_precision))
+    return np.array(lect)
+
+
+def preproc_lec_cdo(model, wdir, ldir, files, block_size, single_precision,
+                    fourier_block_size=None):
+    """Preprocess fields for LEC computations through temporary files.
+
+    This is the CDO-based equivalent of lec_coeffs, writing the intermediate
+    fields of every year to files in the working directory.
+
+    Arguments:
+    - model: the model name;
+    - wdir: the working directory where the outputs are stored;
+    - ldir: the directory where tables and flux diagrams are stored;
+    - files: a dictionary with the names of the ta, tas, ua, uas, va, vas
+      and wap files;
+    - block_size: the number of timesteps processed at once for the
+      transient terms (see lec_terms);
+    - single_precision: if True, the transient terms are computed in single
+      precision;
+    - fourier_block_size: if given, the Fourier coefficients are computed in
+      blocks of this many timesteps (see fourier_coefficients.compute_coeff);
+    """
+    cdo = Cdo()
+    fourc = fourier_coefficients
+    ta_file = files['ta']
+    tas_file = files['tas']
+    ua_file = files['ua']
+    uas_file = files['uas']
+    va_file = files['va']
+    vas_file = files['vas']
+    wap_file = files['wap']
     maskorog = wdir + '/orog.nc'
     ua_file_mask = wdir + '/ua_fill.nc'
     va_file_mask = wdir + '/va_fill.nc'
@@ -945,10 +1095,12 @@ def preproc_lec(model, wdir, pdir, input_data):
                     options='-b F32',
                     output=enfile_yr)
         cdo.selyear(y_ro, input=tas_file, options='-b F32', output=tasfile_yr)
-        fourc.fourier_coeff(tadiag_file, ncfile, enfile_yr, tasfile_yr)
+        fourc.fourier_coeff(tadiag_file, ncfile, enfile_yr, tasfile_yr,
+                            block_size=fourier_block_size)
         diagfile = (ldir + '/{}_{}_lec_diagram.png'.format(model, y_ro))
         logfile = (ldir + '/{}_{}_lec_table.txt'.format(model, y_ro))
-        lect[y_i] = lorenz(wdir, model, y_ro, ncfile, diagfile, logfile)
+        lect[y_i] = lorenz(wdir, model, y_ro, ncfile, diagfile, logfile,
+                           block_size, single_precision)
         y_i = y_i + 1
         os.remove(enfile_yr)
         os.remove(tasfile_yr)
@@ -973,25 +1125,15 @@ def stabil(ta_gmn, p_l, nlev):
     """Compute the stability parameter from temp. and pressure levels.
 
     Arguments
-    - ta_gmn: a temperature vertical profile;
+    - ta_gmn: a temperature vertical profile, or a (lev, lat) field;
     - p_l: the vertical levels;
     - nlev: the number of vertical levels;
     """
     cpdr = CP / R
     t_g = ta_gmn
-    g_s = np.zeros(nlev)
-    for i_l in range(nlev):
-        if i_l == 0:
-            dtdp = (t_g[i_l + 1] - t_g[i_l]) / (p_l[i_l + 1] - p_l[i_l])
-        elif i_l == nlev - 1:
-            dtdp = (t_g[i_l] - t_g[i_l - 1]) / (p_l[i_l] - p_l[i_l - 1])
-        else:
-            dtdp1 = (t_g[i_l + 1] - t_g[i_l]) / (p_l[i_l + 1] - p_l[i_l])
-            dtdp2 = (t_g[i_l] - t_g[i_l - 1]) / (p_l[i_l] - p_l[i_l - 1])
-            dtdp = ((dtdp1 * (p_l[i_l] - p_l[i_l - 1]) + dtdp2 *
-                     (p_l[i_l + 1] - p_l[i_l])) /
-                    (p_l[i_l + 1] - p_l[i_l - 1]))
-        g_s[i_l] = CP / (t_g[i_l] - p_l[i_l] * dtdp * cpdr)
+    dtdp = _dfdp(t_g, p_l)
+    p_l = np.reshape(p_l, (-1, ) + (1, ) * (np.ndim(t_g) - 1))
+    g_s = CP / (t_g - p_l * dtdp * cpdr)
     return g_s
 
 
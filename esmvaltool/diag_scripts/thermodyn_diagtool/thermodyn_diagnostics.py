@@ -120,6 +120,19 @@ USAGE
        - met: if set to 1, the program will compute the MEP with the indirect
               method, if set to 2 with the direct method, if set to 3, both
               methods will be computed and compared with each other;
+       - n_workers: (optional) number of worker processes used to process
+              the models in parallel (default: 1);
+       - lec_block_size: (optional) number of timesteps processed at once
+              in the LEC computations (default: 8);
+       - lec_single_precision: (optional) if set to true, the LEC transient
+              terms are computed in single precision (default: false);
+       - lec_use_tempfiles: (optional) if set to true, the LEC input fields
+              are preprocessed with CDO through temporary files, instead of
+              in memory one year at a time (default: false);
+       - lec_fourier_block_size: (optional) if set, the Fourier coefficients
+              for the LEC are computed in blocks of this many days, in single
+              precision, to limit the memory usage (default: all days at
+              once, in double precision);
 4: Run the tool by typing:
          esmvaltool -c $CONFIG_FILE \\
              esmvaltool/recipes/recipe_thermodyn_diagtool.yml
@@ -240,7 +253,9 @@ for immediate model intercomparison.
 # New packages for version 2.0 of ESMValTool
 import logging
 import os
+import shutil
 import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import numpy as np
 
@@ -286,32 +301,21 @@ def compute_land_ocean(model, wdir, file, sftlf_fx, name):
     return (ocean_mean, land_mean)
 
 
-def main(cfg):
-    """Execute the program.
+def compute_model(cfg, model):
+    """Run all modules of the diagnostic for a single model.
 
-    Argument cfg, containing directory paths, preprocessed input dataset
-    filenames and user-defined options, is passed by ESMValTool preprocessor.
+    The model output is written to its own subdirectories of the work and
+    plot directories, and its provenance records to its own subdirectory of
+    the run directory, so that several models can be processed in parallel.
+    Returns a dictionary with the scalar results needed for the multi-model
+    plots.
     """
-    provlog = ProvenanceLogger(cfg)
     lorenz = lorenz_cycle
     comp = computations
-    logger.info('Entering the diagnostic tool')
-    # Load paths
+    plotsmod = plot_script
     wdir_up = cfg['work_dir']
     pdir_up = cfg['plot_dir']
     input_data = cfg['input_data'].values()
-    logger.info('Work directory: %s \n', wdir_up)
-    logger.info('Plot directory: %s \n', pdir_up)
-    plotsmod = plot_script
-    data = e.Datasets(cfg)
-    logger.debug(data)
-    models = data.get_info_list('dataset')
-    model_names = list(set(models))
-    model_names.sort()
-    logger.info(model_names)
-    varnames = data.get_info_list('short_name')
-    curr_vars = list(set(varnames))
-    logger.debug(curr_vars)
     # load user-defined options
     lsm = str(cfg['lsm'])
     wat = str(cfg['wat'])
@@ -319,46 +323,44 @@ def main(cfg):
     entr = str(cfg['entr'])
     met = str(cfg['met'])
     flags = [wat, lec, entr, met]
-    # Initialize multi-model arrays
-    modnum = len(model_names)
-    te_all = np.zeros(modnum)
-    toab_all = np.zeros([modnum, 2])
-    toab_oc_all = np.zeros(modnum)
-    toab_la_all = np.zeros(modnum)
-    atmb_all = np.zeros([modnum, 2])
-    atmb_oc_all = np.zeros(modnum)
-    atmb_la_all = np.zeros(modnum)
-    surb_all = np.zeros([modnum, 2])
-    surb_oc_all = np.zeros(modnum)
-    surb_la_all = np.zeros(modnum)
-    wmb_all = np.zeros([modnum, 2])
-    wmb_oc_all = np.zeros(modnum)
-    wmb_la_all = np.zeros(modnum)
-    latent_all = np.zeros([modnum, 2])
-    latent_oc_all = np.zeros(modnum)
-    latent_la_all = np.zeros(modnum)
-    baroc_eff_all = np.zeros(modnum)
-    lec_all = np.zeros([modnum, 2])
-    horzentr_all = np.zeros([modnum, 2])
-    vertentr_all = np.zeros([modnum, 2])
-    matentr_all = np.zeros([modnum, 2])
-    irrevers_all = np.zeros(modnum)
-    diffentr_all = np.zeros([modnum, 2])
-    logger.info("Entering main loop\n")
-    i_m = 0
-    for model in model_names:
-        # Load paths to individual models output and plotting directories
-        wdir = os.path.join(wdir_up, model)
-        pdir = os.path.join(pdir_up, model)
-        os.makedirs(wdir)
-        os.makedirs(pdir)
-        aux_file = wdir + '/aux.nc'
-        te_ymm_file, te_gmean_constant, te_file = mkthe.init_mkthe_te(
-            model, wdir, input_data)
-        te_all[i_m] = te_gmean_constant
-        logger.info('Computing energy budgets\n')
-        in_list, eb_gmean, eb_file, toab_ymm_file = comp.budgets(
-            model, wdir, aux_file, input_data)
+    res = {
+        'toab': np.zeros(2),
+        'toab_oc': 0.,
+        'toab_la': 0.,
+        'atmb': np.zeros(2),
+        'atmb_oc': 0.,
+        'atmb_la': 0.,
+        'surb': np.zeros(2),
+        'surb_oc': 0.,
+        'surb_la': 0.,
+        'wmb': np.zeros(2),
+        'wmb_oc': 0.,
+        'wmb_la': 0.,
+        'latent': np.zeros(2),
+        'latent_oc': 0.,
+        'latent_la': 0.,
+        'lec': np.zeros(2),
+        'horzentr': np.zeros(2),
+        'vertentr': np.zeros(2),
+        'matentr': np.zeros(2),
+        'irrevers': 0.,
+        'diffentr': np.zeros(2),
+    }
+    # Load paths to individual models output and plotting directories
+    wdir = os.path.join(wdir_up, model)
+    pdir = os.path.join(pdir_up, model)
+    os.makedirs(wdir)
+    os.makedirs(pdir)
+    cfg = dict(cfg)
+    cfg['run_dir'] = os.path.join(cfg['run_dir'], model)
+    aux_file = wdir + '/aux.nc'
+    te_ymm_file, te_gmean_constant, te_file = mkthe.init_mkthe_te(
+        model, wdir, input_data)
+    res['te'] = te_gmean_constant
+    logger.info('Computing energy budgets\n')
+    in_list, eb_gmean, eb_file, toab_ymm_file = comp.budgets(
+        model, wdir, aux_file, input_data)
+    with ProvenanceLogger(cfg) as provlog:
         prov_rec = provenance_meta.get_prov_map(
             ['TOA energy budgets', model],
             [in_list[4], in_list[6], in_list[7]])
@@ -375,130 +377,202 @@ def main(cfg):
                 in_list[7]
             ])
         provlog.log(eb_file[2], prov_rec)
-        toab_all[i_m, 0] = np.nanmean(eb_gmean[0])
-        toab_all[i_m, 1] = np.nanstd(eb_gmean[0])
-        atmb_all[i_m, 0] = np.nanmean(eb_gmean[1])
-        atmb_all[i_m, 1] = np.nanstd(eb_gmean[1])
-        surb_all[i_m, 0] = np.nanmean(eb_gmean[2])
-        surb_all[i_m, 1] = np.nanstd(eb_gmean[2])
-        logger.info('Global mean emission temperature: %s\n',
-                    te_gmean_constant)
-        logger.info('TOA energy budget: %s\n', toab_all[i_m, 0])
-        logger.info('Atmospheric energy budget: %s\n', atmb_all[i_m, 0])
-        logger.info('Surface energy budget: %s\n', surb_all[i_m, 0])
+    res['toab'][0] = np.nanmean(eb_gmean[0])
+    res['toab'][1] = np.nanstd(eb_gmean[0])
+    res['atmb'][0] = np.nanmean(eb_gmean[1])
+    res['atmb'][1] = np.nanstd(eb_gmean[1])
+    res['surb'][0] = np.nanmean(eb_gmean[2])
+    res['surb'][1] = np.nanstd(eb_gmean[2])
+    logger.info('Global mean emission temperature: %s\n',
+                te_gmean_constant)
+    logger.info('TOA energy budget: %s\n', res['toab'][0])
+    logger.info('Atmospheric energy budget: %s\n', res['atmb'][0])
+    logger.info('Surface energy budget: %s\n', res['surb'][0])
+    logger.info('Done\n')
+    res['baroc_eff'] = comp.baroceff(model, wdir, aux_file, toab_ymm_file,
+                                     te_ymm_file)
+    logger.info('Baroclinic efficiency (Lucarini et al., 2011): %s\n',
+                res['baroc_eff'])
+    logger.info('Running the plotting module for the budgets\n')
+    plotsmod.balances(cfg, wdir_up, pdir,
+                      [eb_file[0], eb_file[1], eb_file[2]],
+                      ['toab', 'atmb', 'surb'], model)
+    logger.info('Done\n')
+    # Water mass budget
+    if wat == 'True':
+        (wm_file,
+         res['wmb'][0],
+         res['wmb'][1],
+         res['latent'][0],
+         res['latent'][1]) = compute_water_mass_budget(
+             cfg, wdir_up, pdir, model, wdir, input_data, flags, aux_file)
+    if lsm == 'True':
+        sftlf_fx = e.select_metadata(input_data,
+                                     short_name='sftlf',
+                                     dataset=model)[0]['filename']
+        logger.info('Computing energy budgets over land and oceans\n')
+        res['toab_oc'], res['toab_la'] = compute_land_ocean(
+            model, wdir, eb_file[0], sftlf_fx, 'toab')
+        res['atmb_oc'], res['atmb_la'] = compute_land_ocean(
+            model, wdir, eb_file[1], sftlf_fx, 'atmb')
+        res['surb_oc'], res['surb_la'] = compute_land_ocean(
+            model, wdir, eb_file[2], sftlf_fx, 'surb')
+        if wat == 'True':
+            logger.info('Computing water mass and latent energy'
+                        ' budgets over land and oceans\n')
+            res['wmb_oc'], res['wmb_la'] = compute_land_ocean(
+                model, wdir, wm_file[0], sftlf_fx, 'wmb')
+            res['latent_oc'], res['latent_la'] = compute_land_ocean(
+                model, wdir, wm_file[1], sftlf_fx, 'latent')
         logger.info('Done\n')
-        baroc_eff_all[i_m] = comp.baroceff(model, wdir, aux_file,
-                                           toab_ymm_file, te_ymm_file)
-        logger.info('Baroclinic efficiency (Lucarini et al., 2011): %s\n',
-                    baroc_eff_all[i_m])
-        logger.info('Running the plotting module for the budgets\n')
-        plotsmod.balances(cfg, wdir_up, pdir,
-                          [eb_file[0], eb_file[1], eb_file[2]],
-                          ['toab', 'atmb', 'surb'], model)
+    if lec == 'True':
+        logger.info('Computation of the Lorenz Energy '
+                    'Cycle (year by year)\n')
+        _, _ = mkthe.init_mkthe_lec(model, wdir, input_data)
+        lect = lorenz.preproc_lec(
+            model, wdir, pdir, input_data,
+            block_size=cfg.get('lec_block_size', 8),
+            single_precision=cfg.get('lec_single_precision', False),
+            use_tempfiles=cfg.get('lec_use_tempfiles', False),
+            fourier_block_size=cfg.get('lec_fourier_block_size'))
+        res['lec'][0] = np.nanmean(lect)
+        res['lec'][1] = np.nanstd(lect)
+        logger.info(
+            'Intensity of the annual mean Lorenz Energy '
+            'Cycle: %s\n', res['lec'][0])
         logger.info('Done\n')
-        # Water mass budget
-        if wat == 'True':
-            (wm_file,
-             wmb_all[i_m, 0],
-             wmb_all[i_m, 1],
-             latent_all[i_m, 0],
-             latent_all[i_m, 1]) = compute_water_mass_budget(
-                 cfg, wdir_up, pdir, model, wdir, input_data, flags, aux_file)
-        if lsm == 'True':
-            sftlf_fx = e.select_metadata(input_data,
-                                         short_name='sftlf',
-                                         dataset=model)[0]['filename']
-            logger.info('Computing energy budgets over land and oceans\n')
-            toab_oc_all[i_m], toab_la_all[i_m] = compute_land_ocean(
-                model, wdir, eb_file[0], sftlf_fx, 'toab')
-            atmb_oc_all[i_m], atmb_la_all[i_m] = compute_land_ocean(
-                model, wdir, eb_file[1], sftlf_fx, 'atmb')
-            surb_oc_all[i_m], surb_la_all[i_m] = compute_land_ocean(
-                model, wdir, eb_file[2], sftlf_fx, 'surb')
-            if wat == 'True':
-                logger.info('Computing water mass and latent energy'
-                            ' budgets over land and oceans\n')
-                wmb_oc_all[i_m], wmb_la_all[i_m] = compute_land_ocean(
-                    model, wdir, wm_file[0], sftlf_fx, 'wmb')
-                latent_oc_all[i_m], latent_la_all[i_m] = compute_land_ocean(
-                    model, wdir, wm_file[1], sftlf_fx, 'latent')
-            logger.info('Done\n')
-        if lec == 'True':
-            logger.info('Computation of the Lorenz Energy '
-                        'Cycle (year by year)\n')
-            _, _ = mkthe.init_mkthe_lec(model, wdir, input_data)
-            lect = lorenz.preproc_lec(model, wdir, pdir, input_data)
-            lec_all[i_m, 0] = np.nanmean(lect)
-            lec_all[i_m, 1] = np.nanstd(lect)
+    else:
+        lect = np.repeat(2.0, len(eb_gmean[0]))
+        res['lec'][0] = 2.0
+        res['lec'][1] = 0.2
+    if entr == 'True':
+        if met in {'1', '3'}:
+            logger.info('Computation of the material entropy production '
+                        'with the indirect method\n')
+            indentr_list = [te_file, eb_file[0]]
+            horz_mn, vert_mn, horzentr_file, vertentr_file = comp.indentr(
+                model, wdir, indentr_list, input_data, aux_file, eb_gmean[0])
+            listind = [horzentr_file, vertentr_file]
+            provenance_meta.meta_indentr(cfg, model, input_data, listind)
+            res['horzentr'][0] = np.nanmean(horz_mn)
+            res['horzentr'][1] = np.nanstd(horz_mn)
+            res['vertentr'][0] = np.nanmean(vert_mn)
+            res['vertentr'][1] = np.nanstd(vert_mn)
+            logger.info(
+                'Horizontal component of the material entropy '
+                'production: %s\n', res['horzentr'][0])
             logger.info(
-                'Intensity of the annual mean Lorenz Energy '
-                'Cycle: %s\n', lec_all[i_m, 0])
+                'Vertical component of the material entropy '
+                'production: %s\n', res['vertentr'][0])
+            logger.info('Done\n')
+            logger.info('Running the plotting module for the material '
+                        'entropy production (indirect method)\n')
+            plotsmod.entropy(pdir, vertentr_file, 'sver',
+                             'Vertical entropy production', model)
             logger.info('Done\n')
-        else:
-            lect = np.repeat(2.0, len(eb_gmean[0]))
-            lec_all[i_m, 0] = 2.0
-            lec_all[i_m, 1] = 0.2
-        if entr == 'True':
-            if met in {'1', '3'}:
-                logger.info('Computation of the material entropy production '
-                            'with the indirect method\n')
-                indentr_list = [te_file, eb_file[0]]
-                horz_mn, vert_mn, horzentr_file, vertentr_file = comp.indentr(
-                    model, wdir, indentr_list, input_data, aux_file,
-                    eb_gmean[0])
-                listind = [horzentr_file, vertentr_file]
-                provenance_meta.meta_indentr(cfg, model, input_data, listind)
-                horzentr_all[i_m, 0] = np.nanmean(horz_mn)
-                horzentr_all[i_m, 1] = np.nanstd(horz_mn)
-                vertentr_all[i_m, 0] = np.nanmean(vert_mn)
-                vertentr_all[i_m, 1] = np.nanstd(vert_mn)
-                logger.info(
-                    'Horizontal component of the material entropy '
-                    'production: %s\n', horzentr_all[i_m, 0])
-                logger.info(
-                    'Vertical component of the material entropy '
-                    'production: %s\n', vertentr_all[i_m, 0])
-                logger.info('Done\n')
-                logger.info('Running the plotting module for the material '
-                            'entropy production (indirect method)\n')
-                plotsmod.entropy(pdir, vertentr_file, 'sver',
-                                 'Vertical entropy production', model)
-                logger.info('Done\n')
-            if met in {'2', '3'}:
-                matentr, irrevers, entr_list = comp.direntr(
-                    logger, model, wdir, input_data, aux_file, te_file, lect,
-                    flags)
-                provenance_meta.meta_direntr(cfg, model, input_data, entr_list)
-                matentr_all[i_m, 0] = matentr
-                if met in {'3'}:
-                    diffentr = (float(np.nanmean(vert_mn)) +
-                                float(np.nanmean(horz_mn)) - matentr)
-                    logger.info('Difference between the two '
-                                'methods: %s\n', diffentr)
-                    diffentr_all[i_m, 0] = diffentr
-                logger.info('Degree of irreversibility of the '
-                            'system: %s\n', irrevers)
-                irrevers_all[i_m] = irrevers
-                logger.info('Running the plotting module for the material '
-                            'entropy production (direct method)\n')
-                plotsmod.init_plotentr(model, pdir, entr_list)
-                logger.info('Done\n')
-            os.remove(te_file)
-        os.remove(te_ymm_file)
-        logger.info('Done for model: %s \n', model)
-        i_m = i_m + 1
+        if met in {'2', '3'}:
+            matentr, irrevers, entr_list = comp.direntr(
+                logger, model, wdir, input_data, aux_file, te_file, lect,
+                flags)
+            provenance_meta.meta_direntr(cfg, model, input_data, entr_list)
+            res['matentr'][0] = matentr
+            if met in {'3'}:
+                diffentr = (float(np.nanmean(vert_mn)) +
+                            float(np.nanmean(horz_mn)) - matentr)
+                logger.info('Difference between the two '
+                            'methods: %s\n', diffentr)
+                res['diffentr'][0] = diffentr
+            logger.info('Degree of irreversibility of the '
+                        'system: %s\n', irrevers)
+            res['irrevers'] = irrevers
+            logger.info('Running the plotting module for the material '
+                        'entropy production (direct method)\n')
+            plotsmod.init_plotentr(model, pdir, entr_list)
+            logger.info('Done\n')
+        os.remove(te_file)
+    os.remove(te_ymm_file)
+    logger.info('Done for model: %s \n', model)
+    return res
+
+
+def _merge_provenance(cfg, model_names):
+    """Merge the provenance records written for each model."""
+    with ProvenanceLogger(cfg) as provlog:
+        for model in model_names:
+            run_dir = os.path.join(cfg['run_dir'], model)
+            with ProvenanceLogger({'run_dir': run_dir}) as model_provlog:
+                records = dict(model_provlog.table)
+                model_provlog.table.clear()
+            for (filename, record) in records.items():
+                provlog.log(filename, record)
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def _run_models(cfg, model_names, n_workers):
+    """Run the diagnostic for all models, using n_workers processes."""
+    if n_workers == 1:
+        return [compute_model(cfg, model) for model in model_names]
+    logger.info("Processing %s models using %s worker processes",
+                len(model_names), n_workers)
+    results = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {
+            executor.submit(compute_model, cfg, model): model
+            for model in model_names
+        }
+        for future in as_completed(futures):
+            model = futures[future]
+            try:
+                results[model] = future.result()
+            except:  # noqa
+                logger.error("Failed to process model %s", model)
+                raise
+    return [results[model] for model in model_names]
+
+
+def main(cfg):
+    """Execute the program.
+
+    Argument cfg, containing directory paths, preprocessed input dataset
+    filenames and user-defined options, is passed by ESMValTool preprocessor.
+    """
+    logger.info('Entering the diagnostic tool')
+    # Load paths
+    wdir_up = cfg['work_dir']
+    pdir_up = cfg['plot_dir']
+    logger.info('Work directory: %s \n', wdir_up)
+    logger.info('Plot directory: %s \n', pdir_up)
+    plotsmod = plot_script
+    data = e.Datasets(cfg)
+    logger.debug(data)
+    models = data.get_info_list('dataset')
+    model_names = list(set(models))
+    model_names.sort()
+    logger.info(model_names)
+    varnames = data.get_info_list('short_name')
+    curr_vars = list(set(varnames))
+    logger.debug(curr_vars)
+    logger.info("Entering main loop\n")
+    results = _run_models(cfg, model_names, cfg.get('n_workers', 1))
+    _merge_provenance(cfg, model_names)
+    # Build multi-model arrays
+    mm_all = {
+        key: np.array([res[key] for res in results])
+        for key in results[0]
+    }
     logger.info('I will now start multi-model plots')
     logger.info('Meridional heat transports\n')
     plotsmod.plot_mm_transp(model_names, wdir_up, pdir_up)
     logger.info('Scatter plots')
     summary_varlist = [
-        atmb_all, baroc_eff_all, horzentr_all, lec_all, matentr_all, te_all,
-        toab_all, vertentr_all
+        mm_all['atmb'], mm_all['baroc_eff'], mm_all['horzentr'],
+        mm_all['lec'], mm_all['matentr'], mm_all['te'], mm_all['toab'],
+        mm_all['vertentr']
     ]
     plotsmod.plot_mm_summaryscat(pdir_up, summary_varlist)
     logger.info('Scatter plots for inter-annual variability of'
                 ' some quantities')
-    eb_list = [toab_all, atmb_all, surb_all]
+    eb_list = [mm_all['toab'], mm_all['atmb'], mm_all['surb']]
     plotsmod.plot_mm_ebscatter(pdir_up, eb_list)
     logger.info("The diagnostic has finished. Now closing...\n")
 
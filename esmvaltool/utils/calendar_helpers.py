@@ -0,0 +1,312 @@
+"""Vectorised calendar operations on numeric time points.
+
+The functions in this module work on arrays of time points together with
+their :class:`cf_units.Unit`, e.g. ``coord.points`` and ``coord.units`` of an
+:mod:`iris` time coordinate, without creating a date object for every point.
+All CF calendars are supported, i.e. ``standard`` (``gregorian``),
+``proleptic_gregorian``, ``julian``, ``noleap`` (``365_day``), ``all_leap``
+(``366_day``) and ``360_day``.
+
+"""
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+
+_CALENDARS = {
+    'standard': 'standard',
+    'gregorian': 'standard',
+    'proleptic_gregorian': 'proleptic_gregorian',
+    'julian': 'julian',
+    'noleap': '365_day',
+    '365_day': '365_day',
+    'all_leap': '366_day',
+    '366_day': '366_day',
+    '360_day': '360_day',
+}
+
+# Cumulative number of days before each month
+_CUMDAYS = {
+    '365_day': np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]),
+    '366_day': np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]),
+}
+
+
+def _get_calendar(units):
+    """Get the normalised calendar name of time units."""
+    calendar = _CALENDARS.get(str(units.calendar).lower())
+    if calendar is None:
+        raise ValueError(
+            f"Expected time units with a CF calendar, got '{units}' with "
+            f"calendar '{units.calendar}'")
+    return calendar
+
+
+def _days_from_gregorian(year, month, day):
+    """Get days since 1970-01-01 of proleptic Gregorian dates."""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = (year_of_era * 365 + year_of_era // 4 - year_of_era // 100 +
+                  day_of_year)
+    return era * 146097 + day_of_era - 719468
+
+
+def _gregorian_from_days(days):
+    """Get proleptic Gregorian dates from days since 1970-01-01."""
+    days = days + 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 -
+                   day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 -
+                                year_of_era // 100)
+    return _from_march_based(year_of_era + era * 400, day_of_year)
+
+
+def _julian_raw_days(year, month, day):
+    """Get days since an arbitrary epoch of Julian dates."""
+    year = year - (month <= 2)
+    era = year // 4
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    return era * 1461 + (year - era * 4) * 365 + day_of_year
+
+
+# Julian 1582-10-05 is the day after 1582-10-04, i.e. Gregorian 1582-10-15
+_GREGORIAN_START = int(_days_from_gregorian(1582, 10, 15))
+_JULIAN_OFFSET = _GREGORIAN_START - int(_julian_raw_days(1582, 10, 5))
+
+
+def _days_from_julian(year, month, day):
+    """Get days since (Gregorian) 1970-01-01 of Julian dates."""
+    return _julian_raw_days(year, month, day) + _JULIAN_OFFSET
+
+
+def _julian_from_days(days):
+    """Get Julian dates from days since (Gregorian) 1970-01-01."""
+    days = days - _JULIAN_OFFSET
+    era = days // 1461
+    day_of_era = days - era * 1461
+    year_of_era = np.minimum(day_of_era // 365, 3)
+    day_of_year = day_of_era - 365 * year_of_era
+    return _from_march_based(year_of_era + era * 4, day_of_year)
+
+
+def _from_march_based(year, day_of_year):
+    """Get dates from years and days of years starting on 1 March."""
+    month_from_march = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * month_from_march + 2) // 5 + 1
+    month = np.where(month_from_march < 10, month_from_march + 3,
+                     month_from_march - 9)
+    return (year + (month <= 2), month, day)
+
+
+def _days_from_date(year, month, day, calendar):
+    """Get number of days since a calendar specific epoch of dates."""
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+    if calendar == 'proleptic_gregorian':
+        return _days_from_gregorian(year, month, day)
+    if calendar == 'julian':
+        return _days_from_julian(year, month, day)
+    if calendar == 'standard':
+        is_gregorian = (year * 10000 + month * 100 + day) >= 15821015
+        return np.where(is_gregorian, _days_from_gregorian(year, month, day),
+                        _days_from_julian(year, month, day))
+    if calendar == '360_day':
+        return year * 360 + (month - 1) * 30 + day - 1
+    cumdays = _CUMDAYS[calendar]
+    return year * cumdays[-1] + cumdays[month - 1] + day - 1
+
+
+def _date_from_days(days, calendar):
+    """Get dates from number of days since a calendar specific epoch."""
+    days = np.asarray(days, dtype=np.int64)
+    if calendar == 'proleptic_gregorian':
+        return _gregorian_from_days(days)
+    if calendar == 'julian':
+        return _julian_from_days(days)
+    if calendar == 'standard':
+        gregorian = _gregorian_from_days(days)
+        julian = _julian_from_days(days)
+        is_gregorian = days >= _GREGORIAN_START
+        return tuple(
+            np.where(is_gregorian, greg, jul)
+            for (greg, jul) in zip(gregorian, julian))
+    if calendar == '360_day':
+        (year, day_of_year) = np.divmod(days, 360)
+        (month, day) = np.divmod(day_of_year, 30)
+        return (year, month + 1, day + 1)
+    cumdays = _CUMDAYS[calendar]
+    (year, day_of_year) = np.divmod(days, cumdays[-1])
+    month = np.searchsorted(cumdays, day_of_year, side='right')
+    return (year, month, day_of_year - cumdays[month - 1] + 1)
+
+
+def _month_length(year, month, calendar):
+    """Get the number of days of months."""
+    (next_year, next_month) = np.divmod(month, 12)
+    return (_days_from_date(year + next_year, next_month + 1, 1, calendar) -
+            _days_from_date(year, month, 1, calendar))
+
+
+def _get_reference(units):
+    """Get reference day, second of day and seconds per unit of units."""
+    calendar = _get_calendar(units)
+    origin = units.num2date(0)
+    step = units.num2date(1) - origin
+    step = step.days * SECONDS_PER_DAY + step.seconds + step.microseconds / 1e6
+    ref_day = _days_from_date(origin.year, origin.month, origin.day, calendar)
+    ref_second = (origin.hour * 3600 + origin.minute * 60 + origin.second +
+                  origin.microsecond / 1e6)
+    return (calendar, ref_day, ref_second, step)
+
+
+def _split(points, units):
+    """Split time points into days since the epoch and seconds of day."""
+    (calendar, ref_day, ref_second, step) = _get_reference(units)
+    seconds = np.asarray(points, dtype=np.float64) * step + ref_second
+    # Round to microseconds to avoid floating point errors at midnight
+    seconds = np.round(seconds, 6)
+    (days, seconds) = np.divmod(seconds, SECONDS_PER_DAY)
+    return (calendar, days.astype(np.int64) + ref_day, seconds)
+
+
+def _join(days, seconds, units):
+    """Convert days since the epoch and seconds of day to time points."""
+    (_, ref_day, ref_second, step) = _get_reference(units)
+    return ((days - ref_day) * SECONDS_PER_DAY + seconds - ref_second) / step
+
+
+def date2num(year, month, day, units, seconds=0.):
+    """Convert dates to time points.
+
+    Parameters
+    ----------
+    year, month, day : array_like
+        Dates.
+    units : cf_units.Unit
+        Time units with calendar.
+    seconds : array_like, optional
+        Seconds since midnight.
+
+    Returns
+    -------
+    numpy.ndarray
+        Time points in `units`.
+
+    """
+    days = _days_from_date(year, month, day, _get_calendar(units))
+    return _join(days, np.asarray(seconds, dtype=np.float64), units)
+
+
+def num2date(points, units):
+    """Convert time points to dates.
+
+    Parameters
+    ----------
+    points : array_like
+        Time points.
+    units : cf_units.Unit
+        Time units with calendar.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Years, months, days and seconds since midnight.
+
+    """
+    (calendar, days, seconds) = _split(points, units)
+    (year, month, day) = _date_from_days(days, calendar)
+    return (year, month, day, seconds)
+
+
+def days_in_month(points, units):
+    """Get the number of days of the months of the time points."""
+    (year, month, _, _) = num2date(points, units)
+    return _month_length(year, month, _get_calendar(units))
+
+
+def month_bounds(points, units):
+    """Get start and end (start of the next month) of the months.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Start and end of the months of the time points in `units`.
+
+    """
+    (year, month, _, _) = num2date(points, units)
+    start = date2num(year, month, 1, units)
+    (next_year, next_month) = np.divmod(month, 12)
+    end = date2num(year + next_year, next_month + 1, 1, units)
+    return (start, end)
+
+
+def add_months(points, units, months=1):
+    """Add a number of months to the time points.
+
+    The day of the month and the time of the day are kept.
+
+    Raises
+    ------
+    ValueError
+        The day of the month is not valid in the new month.
+
+    """
+    (year, month, day, seconds) = num2date(points, units)
+    (new_year, new_month) = np.divmod(month - 1 + months, 12)
+    new_year += year
+    new_month += 1
+    if np.any(day > _month_length(new_year, new_month, _get_calendar(units))):
+        raise ValueError("Day of the month is out of range for the new month")
+    return date2num(new_year, new_month, day, units, seconds)
+
+
+def decimal_year(points, units):
+    """Convert time points to decimal years.
+
+    The fraction of the year is computed with the actual length of the year
+    in the calendar of `units`.
+    """
+    (calendar, days, seconds) = _split(points, units)
+    (year, _, _) = _date_from_days(days, calendar)
+    start = _days_from_date(year, 1, 1, calendar)
+    length = _days_from_date(year + 1, 1, 1, calendar) - start
+    return year + (days - start + seconds / SECONDS_PER_DAY) / length
+
+
+def shift(points, units, seconds):
+    """Shift time points by a number of seconds."""
+    (_, _, _, step) = _get_reference(units)
+    return np.asarray(points, dtype=np.float64) + seconds / step
+
+
+def snap(points, units, day=None, hour=None):
+    """Snap time points to a day of the month and/or an hour of the day.
+
+    Parameters
+    ----------
+    points : array_like
+        Time points.
+    units : cf_units.Unit
+        Time units with calendar.
+    day : int, optional
+        Day of the month. If given without `hour`, the time of the day is
+        kept.
+    hour : int, optional
+        Hour of the day (minutes and seconds are set to zero).
+
+    Returns
+    -------
+    numpy.ndarray
+        Time points in `units`.
+
+    """
+    (year, month, old_day, seconds) = num2date(points, units)
+    if day is None:
+        day = old_day
+    if hour is not None:
+        seconds = hour * 3600.
+    return date2num(year, month, day, units, seconds)
@@ -44,7 +44,7 @@ REQUIREMENTS = {
         'scitools-iris>=2.2',
         'seawater',
         'seaborn',
-        'shapely',
+        'shapely>=2.0',
         'stratify',
         'xarray>=0.12',
         'xesmf',
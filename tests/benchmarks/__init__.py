@@ -0,0 +1,5 @@
+"""Benchmarks comparing optimized code against reference implementations.
+
+The benchmarks are plain scripts that are not collected by pytest, run them
+with e.g. ``python -m tests.benchmarks.benchmark_fix_coords``.
+"""
@@ -0,0 +1,112 @@
+"""Benchmark :func:`esmvaltool.cmorizers.obs.utilities.fix_coords`.
+
+Compares the single-pass implementation with the previous implementation
+(which rolled the longitude with unaligned chunks) on a lazy 0.25 degree
+daily cube.
+"""
+import argparse
+import time
+
+import dask.array as da
+import iris
+import numpy as np
+from cf_units import Unit
+
+import esmvaltool.cmorizers.obs.utilities as utils
+
+
+def _fix_bounds_reference(cube, dim_coord):
+    """Reset and fix all bounds (previous implementation)."""
+    if len(cube.coord(dim_coord).points) > 1:
+        if cube.coord(dim_coord).has_bounds():
+            cube.coord(dim_coord).bounds = None
+        cube.coord(dim_coord).guess_bounds()
+
+    if cube.coord(dim_coord).has_bounds():
+        cube.coord(dim_coord).bounds = da.array(
+            cube.coord(dim_coord).core_bounds(), dtype='float64')
+    return cube
+
+
+def fix_coords_reference(cube):
+    """Fix coordinates (previous implementation)."""
+    utils._fix_dim_coordnames(cube)
+    for cube_coord in cube.coords():
+        if cube_coord.var_name == 'time':
+            cube.coord('time').convert_units(
+                Unit('days since 1950-1-1 00:00:00', calendar='gregorian'))
+            _fix_bounds_reference(cube, cube.coord('time'))
+        if cube_coord.var_name == 'lon':
+            if cube_coord.ndim == 1:
+                if cube_coord.points[0] < 0. and \
+                        cube_coord.points[-1] < 181.:
+                    cube_coord.points = cube_coord.points + 180.
+                    _fix_bounds_reference(cube, cube_coord)
+                    nlon = len(cube_coord.points)
+                    cube.data = da.roll(cube.core_data(), nlon // 2, axis=-1)
+        if cube_coord.var_name == 'lat':
+            _fix_bounds_reference(cube, cube.coord('latitude'))
+    cube.coord('latitude').coord_system = None
+    cube.coord('longitude').coord_system = None
+    return cube
+
+
+def create_cube(n_days, resolution=0.25):
+    """Create a lazy daily global cube on a regular grid."""
+    n_lat = int(180 / resolution)
+    n_lon = int(360 / resolution)
+    time = iris.coords.DimCoord(np.arange(n_days, dtype=np.float64) + 0.5,
+                                standard_name='time',
+                                units=Unit('days since 2000-01-01',
+                                           calendar='gregorian'))
+    lats = iris.coords.DimCoord(np.linspace(-90. + resolution / 2.,
+                                            90. - resolution / 2., n_lat),
+                                standard_name='latitude',
+                                units='degrees')
+    lons = iris.coords.DimCoord(np.linspace(-180. + resolution / 2.,
+                                            180. - resolution / 2., n_lon),
+                                standard_name='longitude',
+                                units='degrees')
+    data = da.random.RandomState(0).random_sample(
+        (n_days, n_lat, n_lon),
+        chunks=(1, n_lat, n_lon)).astype(np.float32)
+    return iris.cube.Cube(data,
+                          var_name='tas',
+                          units='K',
+                          dim_coords_and_dims=[(time, 0), (lats, 1),
+                                               (lons, 2)])
+
+
+def _run(function, n_days):
+    """Time fixing the coordinates and computing the result."""
+    cube = create_cube(n_days)
+    start = time.perf_counter()
+    cube = function(cube)
+    fix_time = time.perf_counter() - start
+    n_tasks = len(dict(cube.core_data().__dask_graph__()))
+    start = time.perf_counter()
+    result = cube.core_data().mean(axis=0).compute()
+    compute_time = time.perf_counter() - start
+    return result, fix_time, compute_time, n_tasks
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=365,
+                        help='Number of days of the test cube.')
+    args = parser.parse_args()
+
+    print(f"0.25 degree daily cube with {args.days} days")
+    results = {}
+    for (name, function) in (('reference', fix_coords_reference),
+                             ('single-pass', utils.fix_coords)):
+        (results[name], fix_time, compute_time, n_tasks) = _run(
+            function, args.days)
+        print(f"{name:>12}: fix_coords {fix_time:8.3f} s, "
+              f"compute {compute_time:8.3f} s, {n_tasks} dask tasks")
+    np.testing.assert_allclose(results['reference'], results['single-pass'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark the psi metric of the climate_metrics diagnostics.
+
+Compares the vectorised ``_sliding_psi`` with the window by window
+reference ``_sliding_psi_loop`` on annual temperature records, for a global
+mean time series and for every grid point of a map.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from esmvaltool.diag_scripts.climate_metrics import psi
+
+WINDOW_LENGTH = 55
+LAG = 1
+
+
+def create_data(n_years, shape=()):
+    """Create random annual temperatures with a trend and autocorrelation."""
+    rng = np.random.RandomState(0)
+    noise = rng.standard_normal((n_years, ) + shape)
+    for idx in range(1, n_years):
+        noise[idx] += 0.7 * noise[idx - 1]
+    years = np.arange(1850, 1850 + n_years)
+    trend = 0.01 * (years - years[0]).reshape((-1, ) + (1, ) * len(shape))
+    return (288. + trend + noise, years)
+
+
+def _loop(data, years):
+    """Run the reference for every grid point."""
+    psis = np.empty((len(years) - WINDOW_LENGTH, ) + data.shape[1:])
+    with np.errstate(invalid='ignore'):
+        for idx in np.ndindex(data.shape[1:]):
+            psis[(slice(None), ) + idx] = psi._sliding_psi_loop(
+                data[(slice(None), ) + idx], years, WINDOW_LENGTH, LAG)
+    return psis
+
+
+def _vectorised(data, years):
+    """Run the vectorised implementation."""
+    return psi._sliding_psi(data, years, WINDOW_LENGTH, LAG)
+
+
+def _run(function, data, years, repeat):
+    """Time the best of `repeat` runs."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(data, years)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=150,
+                        help='Number of years of the records.')
+    parser.add_argument('--nlat', type=int, default=10,
+                        help='Number of latitudes of the map.')
+    parser.add_argument('--nlon', type=int, default=20,
+                        help='Number of longitudes of the map.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of runs, the fastest one is reported.')
+    args = parser.parse_args()
+
+    for shape in ((), (args.nlat, args.nlon)):
+        (data, years) = create_data(args.years, shape)
+        print(f"{args.years} years, grid {shape or 'global mean'}")
+        results = {}
+        for (name, function) in (('loop', _loop),
+                                 ('vectorised', _vectorised)):
+            (results[name], run_time) = _run(function, data, years,
+                                             args.repeat)
+            print(f"{name:>12}: {run_time:10.4f} s")
+        np.testing.assert_allclose(results['vectorised'], results['loop'],
+                                   rtol=1e-6)
+
+
+if __name__ == '__main__':
+    main()
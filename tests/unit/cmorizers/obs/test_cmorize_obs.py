@@ -0,0 +1,313 @@
+"""Tests for the module :mod:`esmvaltool.cmorizers.obs.cmorize_obs`."""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from esmvaltool.cmorizers.obs import cmorize_obs
+from esmvaltool.cmorizers.obs.utilities import UP_TO_DATE_KEY
+
+DATASET = 'DATASET'
+FILES = ['a.nc', 'b.nc', os.path.join('sub', 'c.nc')]
+
+
+@pytest.fixture
+def setup(tmp_path):
+    """Create raw input files, a cmorizer script and its configuration."""
+    in_dir = tmp_path / 'RAWOBS' / 'Tier2' / DATASET
+    (in_dir / 'sub').mkdir(parents=True)
+    for (idx, name) in enumerate(FILES):
+        path = in_dir / name
+        path.write_text(name)
+        os.utime(path, (1e9 + idx, 1e9 + idx))
+    script_dir = tmp_path / 'scripts'
+    (script_dir / 'cmor_config').mkdir(parents=True)
+    script = script_dir / 'cmorize_obs_dataset.py'
+    script.write_text('# cmorizer')
+    (script_dir / 'cmor_config' / (DATASET + '.yml')).write_text('a: 1')
+    return {
+        'in_dir': str(in_dir),
+        'script': str(script),
+        'config': str(script_dir / 'cmor_config' / (DATASET + '.yml')),
+        'config_user': {
+            'rootpath': {
+                'RAWOBS': [str(tmp_path / 'RAWOBS')]
+            },
+            'output_dir': str(tmp_path / 'output'),
+            'log_level': 'info',
+        },
+    }
+
+
+def _manifest(setup, hash_inputs=False):
+    """Build the manifest of the test dataset."""
+    return cmorize_obs._build_manifest(setup['in_dir'], DATASET,
+                                       setup['script'], hash_inputs)
+
+
+def _up_to_date(setup, old_manifest, hash_inputs=False):
+    """Get the up to date files compared to the current input files."""
+    return cmorize_obs._get_up_to_date_files(
+        setup['in_dir'], old_manifest, _manifest(setup, hash_inputs))
+
+
+def _abspaths(setup, names):
+    """Get absolute paths of input files."""
+    return {os.path.abspath(os.path.join(setup['in_dir'], n)) for n in names}
+
+
+def test_build_manifest(setup):
+    """Test that the manifest describes script, configuration and files."""
+    manifest = _manifest(setup)
+    assert manifest['script']['path'] == setup['script']
+    assert manifest['config']['path'] == setup['config']
+    assert set(manifest['input_files']) == set(FILES)
+    assert manifest['input_files']['b.nc'] == {'size': 4, 'mtime': 1e9 + 1}
+    assert 'sha256' in _manifest(setup, hash_inputs=True)['input_files'][
+        'b.nc']
+
+
+def test_build_manifest_no_config(setup):
+    """Test the manifest of a cmorizer without configuration file."""
+    os.remove(setup['config'])
+    assert _manifest(setup)['config'] is None
+
+
+def test_read_write_manifest(tmp_path):
+    """Test writing and reading the manifest next to the output dir."""
+    out_dir = str(tmp_path / 'Tier2' / DATASET)
+    assert cmorize_obs._read_manifest(out_dir) is None
+    manifest = {'script': {'sha256': 'abc'}, 'input_files': {}}
+    os.makedirs(out_dir)
+    cmorize_obs._write_manifest(out_dir, manifest)
+    assert os.path.isfile(out_dir + '_manifest.yml')
+    assert cmorize_obs._read_manifest(out_dir + os.sep) == manifest
+
+
+def test_up_to_date_no_previous_manifest(setup):
+    """Test that nothing is up to date without a previous manifest."""
+    assert _up_to_date(setup, None) is None
+
+
+def test_up_to_date_unchanged(setup):
+    """Test that all files are up to date if nothing changed."""
+    old = _manifest(setup)
+    assert _up_to_date(setup, old) == _abspaths(setup, FILES)
+
+
+@pytest.mark.parametrize('key', ['script', 'config'])
+def test_up_to_date_changed_cmorizer(setup, key):
+    """Test that a changed script or configuration invalidates all files."""
+    old = _manifest(setup)
+    with open(setup[key], 'a') as file:
+        file.write('\n')
+    assert _up_to_date(setup, old) is None
+
+
+def test_up_to_date_changed_version(setup):
+    """Test that a different ESMValTool version invalidates all files."""
+    old = _manifest(setup)
+    old['esmvaltool_version'] = '0.0.0'
+    assert _up_to_date(setup, old) is None
+
+
+@pytest.mark.parametrize('change', ['size', 'mtime'])
+def test_up_to_date_changed_file(setup, change):
+    """Test that files with a new size or mtime are not up to date."""
+    old = _manifest(setup)
+    path = os.path.join(setup['in_dir'], 'a.nc')
+    if change == 'size':
+        with open(path, 'a') as file:
+            file.write('more data')
+        os.utime(path, (1e9, 1e9))
+    else:
+        os.utime(path, (2e9, 2e9))
+    assert _up_to_date(setup, old) == _abspaths(setup, FILES[1:])
+
+
+def test_up_to_date_hash_inputs(setup):
+    """Test that checksums detect changes with the same size and mtime."""
+    old = _manifest(setup)
+    old_hashed = _manifest(setup, hash_inputs=True)
+    path = os.path.join(setup['in_dir'], 'a.nc')
+    with open(path, 'w') as file:
+        file.write('A.NC')
+    os.utime(path, (1e9, 1e9))
+    assert _up_to_date(setup, old) == _abspaths(setup, FILES)
+    assert _up_to_date(setup, old_hashed,
+                       hash_inputs=True) == _abspaths(setup, FILES[1:])
+
+
+def test_up_to_date_added_file(setup):
+    """Test that added files are not up to date."""
+    old = _manifest(setup)
+    with open(os.path.join(setup['in_dir'], 'd.nc'), 'w') as file:
+        file.write('d.nc')
+    assert 'd.nc' in _manifest(setup)['input_files']
+    assert _up_to_date(setup, old) == _abspaths(setup, FILES)
+
+
+def test_up_to_date_removed_file(setup):
+    """Test that removed files invalidate all files."""
+    old = _manifest(setup)
+    os.remove(os.path.join(setup['in_dir'], 'b.nc'))
+    assert _up_to_date(setup, old) is None
+
+
+def test_find_previous_output_dir(tmp_path):
+    """Test that the latest previous output directory is found."""
+    output_dir = str(tmp_path / 'cmorize_obs_20200301_120000')
+    assert cmorize_obs._find_previous_output_dir(output_dir) is None
+    for name in ('cmorize_obs_20200101_120000', 'cmorize_obs_20200201_120000',
+                 'cmorize_obs_20200301_120000', 'other_20200401_120000'):
+        (tmp_path / name).mkdir()
+    (tmp_path / 'cmorize_obs_20200215_120000').write_text('not a dir')
+    assert cmorize_obs._find_previous_output_dir(output_dir) == str(
+        tmp_path / 'cmorize_obs_20200201_120000')
+
+
+def test_cmorize_dataset_incremental(setup, monkeypatch):
+    """Test that up to date datasets are skipped in incremental mode."""
+    calls = []
+
+    def run_pyt_script(in_dir, out_dir, dataset, config):
+        calls.append(config.get(UP_TO_DATE_KEY))
+
+    monkeypatch.setattr(cmorize_obs, '_run_pyt_script', run_pyt_script)
+    config_user = setup['config_user']
+    run_dir = os.path.join(config_user['output_dir'], 'run')
+
+    def cmorize():
+        return cmorize_obs._cmorize_dataset(config_user, run_dir, 'Tier2',
+                                            DATASET, setup['script'],
+                                            incremental=True)[0]
+
+    assert cmorize() == 'success'
+    assert calls == [None]
+    assert cmorize() == 'up to date'
+    assert len(calls) == 1
+
+    os.utime(os.path.join(setup['in_dir'], 'a.nc'), (2e9, 2e9))
+    assert cmorize() == 'success'
+    assert calls[-1] == _abspaths(setup, FILES[1:])
+    assert cmorize() == 'up to date'
+
+
+def test_positive_int():
+    """Test the type of the --jobs argument."""
+    assert cmorize_obs._positive_int('3') == 3
+    for value in ('0', '-1'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            cmorize_obs._positive_int(value)
+
+
+def test_get_reformat_script(tmp_path):
+    """Test finding the NCL or Python cmorizer of a dataset."""
+    (tmp_path / 'cmorize_obs_my_data.py').write_text('')
+    (tmp_path / 'cmorize_obs_other.py').write_text('')
+    (tmp_path / 'cmorize_obs_other.ncl').write_text('')
+    assert cmorize_obs._get_reformat_script(str(tmp_path), 'MY-Data') == str(
+        tmp_path / 'cmorize_obs_my_data.py')
+    assert cmorize_obs._get_reformat_script(str(tmp_path), 'OTHER') == str(
+        tmp_path / 'cmorize_obs_other.ncl')
+    assert cmorize_obs._get_reformat_script(str(tmp_path), 'MISSING') is None
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_cmor_reformat_status(tmp_path, monkeypatch, n_jobs):
+    """Test the status and time of succeeded and failed datasets."""
+    for dataset in ('OK', 'FAIL', 'NOCMORIZER'):
+        (tmp_path / 'RAWOBS' / 'Tier2' / dataset).mkdir(parents=True)
+    config = {
+        'rootpath': {
+            'RAWOBS': [str(tmp_path / 'RAWOBS')]
+        },
+        'output_dir': str(tmp_path / 'output'),
+    }
+
+    def get_reformat_script(_, dataset):
+        if dataset == 'NOCMORIZER':
+            return None
+        return 'cmorize_obs_{}.py'.format(dataset.lower())
+
+    def reformat_dataset(config, run_dir, tier, dataset, *args):
+        time.sleep(0.05)
+        if dataset == 'FAIL':
+            raise ValueError("Broken cmorizer")
+        return 'success'
+
+    summary = []
+    monkeypatch.setattr(cmorize_obs, '_get_reformat_script',
+                        get_reformat_script)
+    monkeypatch.setattr(cmorize_obs, '_reformat_dataset', reformat_dataset)
+    monkeypatch.setattr(cmorize_obs, '_log_summary', summary.extend)
+    # Use threads, so the test does not depend on the start method of the
+    # worker processes
+    monkeypatch.setattr(cmorize_obs, 'ProcessPoolExecutor',
+                        ThreadPoolExecutor)
+    with pytest.raises(Exception, match='FAIL NOCMORIZER'):
+        cmorize_obs._cmor_reformat(config, '', n_jobs=n_jobs)
+
+    results = {result['dataset']: result for result in summary}
+    assert results['OK']['status'] == 'success'
+    assert results['FAIL']['status'] == 'failed'
+    assert results['NOCMORIZER']['status'] == 'no cmorizer'
+    assert results['OK']['time'] >= 0.05
+    assert results['FAIL']['time'] >= 0.05
+    assert results['NOCMORIZER']['time'] == 0.
+    assert all(result['tier'] == 'Tier2' for result in summary)
+
+
+@pytest.mark.parametrize('n_jobs,max_parallel_tasks,n_workers', [
+    (1, 8, 8),
+    (1, None, None),
+    (2, 8, 4),
+    (3, 8, 2),
+    (16, 8, 1),
+])
+def test_cmor_reformat_workers(tmp_path, monkeypatch, n_jobs,
+                               max_parallel_tasks, n_workers):
+    """Test that the workers are shared between the parallel datasets."""
+    for dataset in ('A', 'B'):
+        (tmp_path / 'RAWOBS' / 'Tier2' / dataset).mkdir(parents=True)
+    config = {
+        'rootpath': {
+            'RAWOBS': [str(tmp_path / 'RAWOBS')]
+        },
+        'output_dir': str(tmp_path / 'output'),
+    }
+    if max_parallel_tasks is not None:
+        config['max_parallel_tasks'] = max_parallel_tasks
+    workers = []
+
+    def reformat_dataset(config, *args):
+        workers.append(config.get('max_parallel_tasks'))
+        return 'success'
+
+    monkeypatch.setattr(cmorize_obs, '_get_reformat_script',
+                        lambda *_: 'cmorize_obs_dataset.py')
+    monkeypatch.setattr(cmorize_obs, '_reformat_dataset', reformat_dataset)
+    monkeypatch.setattr(cmorize_obs, 'ProcessPoolExecutor',
+                        ThreadPoolExecutor)
+    cmorize_obs._cmor_reformat(config, '', n_jobs=n_jobs)
+
+    assert workers == [n_workers, n_workers]
+    assert config.get('max_parallel_tasks') == max_parallel_tasks
+
+
+def test_log_summary(caplog):
+    """Test the summary table."""
+    results = [
+        {'tier': 'Tier2', 'dataset': 'OK', 'status': 'success', 'time': 1.23},
+        {'tier': 'Tier3', 'dataset': 'FAIL', 'status': 'failed', 'time': 0.},
+    ]
+    with caplog.at_level(logging.INFO):
+        cmorize_obs._log_summary(results)
+    lines = [record.getMessage() for record in caplog.records]
+    assert lines[1].split() == ['Tier', 'Dataset', 'Status', 'Time', '[s]']
+    assert lines[3].split() == ['Tier2', 'OK', 'success', '1.2']
+    assert lines[4].split() == ['Tier3', 'FAIL', 'failed', '0.0']
+    assert len(lines) == 6
@@ -308,3 +308,160 @@ def test_read_cmor_config():
     assert 'thetao' in cfg['variables']
     assert 'Omon' in cfg['cmor_table'].tables
     assert 'thetao' in cfg['cmor_table'].tables['Omon']
+
+
+def test_is_up_to_date(tmp_path):
+    """Test the check for up-to-date input files in incremental mode."""
+    in_files = [str(tmp_path / 'file_2000.nc'), str(tmp_path / 'file_2001.nc')]
+    assert not utils.is_up_to_date(in_files, {})
+    assert not utils.is_up_to_date(in_files, {utils.UP_TO_DATE_KEY: None})
+    config_user = {utils.UP_TO_DATE_KEY: {in_files[0]}}
+    assert utils.is_up_to_date(in_files[:1], config_user)
+    assert not utils.is_up_to_date(in_files, config_user)
+    config_user = {utils.UP_TO_DATE_KEY: set(in_files)}
+    assert utils.is_up_to_date(in_files, config_user)
+
+
+def _square(value):
+    """Square a value (job for :func:`utils.run_jobs`)."""
+    return value**2
+
+
+def _fail(value):
+    """Raise an error (job for :func:`utils.run_jobs`)."""
+    raise ValueError(value)
+
+
+@pytest.mark.parametrize('n_workers,executor,max_pending', [
+    (1, 'process', None),
+    (2, 'process', None),
+    (3, 'thread', None),
+    (2, 'thread', 1),
+])
+def test_run_jobs(n_workers, executor, max_pending):
+    """Test running jobs (in parallel)."""
+    jobs = ([value] for value in range(10))
+    results = utils.run_jobs(_square,
+                             jobs,
+                             n_workers=n_workers,
+                             executor=executor,
+                             max_pending=max_pending)
+    assert results == [value**2 for value in range(10)]
+
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_run_jobs_fail(n_workers):
+    """Test that errors in jobs are raised."""
+    with pytest.raises(ValueError):
+        utils.run_jobs(_fail, [[1], [2]], n_workers=n_workers)
+
+
+def test_run_jobs_invalid_executor():
+    """Test invalid executor."""
+    with pytest.raises(ValueError):
+        utils.run_jobs(_square, [[1]], n_workers=2, executor='cows')
+
+
+def _get_save_attrs(output=None):
+    """Get attributes for :func:`utils.save_variable`."""
+    attrs = {
+        'project_id': 'OBS',
+        'dataset_id': 'DATASET',
+        'modeling_realm': 'reanaly',
+        'version': '1',
+        'mip': 'Omon',
+    }
+    if output is not None:
+        attrs[utils.OUTPUT_KEY] = output
+    return attrs
+
+
+def test_save_variable(monkeypatch, tmp_path):
+    """Test saving a variable."""
+    mock_save = Mock()
+    monkeypatch.setattr(iris, 'save', mock_save)
+    cube = _create_sample_cube()
+    utils.save_variable(cube, 'thetao', str(tmp_path), _get_save_attrs())
+    mock_save.assert_called_once_with(
+        cube,
+        str(tmp_path / 'OBS_DATASET_reanaly_1_Omon_thetao_195001-195002.nc'),
+        fill_value=1e20)
+
+
+def test_save_variable_output_settings(monkeypatch, tmp_path):
+    """Test saving a variable with compression, chunking and splitting."""
+    mock_save = Mock()
+    monkeypatch.setattr(iris, 'save', mock_save)
+    cube = _create_sample_cube()
+    cube.coord('time').points = [15., 400.]
+    cube.coord('time').bounds = None
+    output = {
+        'zlib': True,
+        'complevel': 4,
+        'chunksizes': {'time': 1, 'latitude': 10},
+        'split_by_year': True,
+    }
+    attrs = _get_save_attrs(output)
+    utils.save_variable(cube, 'thetao', str(tmp_path), attrs, complevel=1)
+    assert mock_save.call_count == 2
+    for (call, year) in zip(mock_save.call_args_list, ['1950', '1951']):
+        (saved_cube, path) = call[0]
+        assert saved_cube.shape == (1, 3, 2, 2)
+        assert path == str(
+            tmp_path /
+            f'OBS_DATASET_reanaly_1_Omon_thetao_{year}01-{year}12.nc')
+        assert call[1] == {
+            'fill_value': 1e20,
+            'zlib': True,
+            'complevel': 1,
+            'chunksizes': [1, 3, 2, 2],
+        }
+    assert attrs[utils.OUTPUT_KEY] == output
+
+
+@pytest.mark.parametrize('lon_chunks', [(8, ), (3, 3, 2)])
+def test_fix_coords_lazy_roll(lon_chunks):
+    """Test that longitude rolling keeps data lazy and chunks aligned."""
+    lons = iris.coords.DimCoord(np.linspace(-157.5, 157.5, 8),
+                                standard_name='longitude',
+                                units='degrees')
+    lats = iris.coords.DimCoord([-45., 45.],
+                                standard_name='latitude',
+                                units='degrees')
+    data = da.from_array(np.arange(16.).reshape(2, 8),
+                         chunks=((1, 1), lon_chunks))
+    cube = iris.cube.Cube(data,
+                          dim_coords_and_dims=[(lats, 0), (lons, 1)])
+    utils.fix_coords(cube)
+    assert cube.has_lazy_data()
+    assert cube.core_data().chunks == ((1, 1), lon_chunks)
+    np.testing.assert_allclose(cube.coord('longitude').points,
+                               np.linspace(22.5, 337.5, 8))
+    np.testing.assert_allclose(cube.data[0], [4, 5, 6, 7, 0, 1, 2, 3])
+    assert cube.coord('longitude').bounds[0, 0] == 0.
+    assert cube.coord('latitude').has_bounds()
+
+
+def test_grid_indices():
+    """Test mapping of locations to grid points."""
+    grid_lats = np.array([-10., 0., 10.])
+    grid_lons = np.array([0., 10., 20., 30.])
+    lat = np.array([-10., 10., 5., 0., 20.])
+    lon = np.array([0., 30., 10., -0., 10.])
+    indices = utils.grid_indices(lat, lon, grid_lats, grid_lons)
+    np.testing.assert_array_equal(indices, [0, 11, -1, 4, -1])
+
+
+def test_bin_mean():
+    """Test averaging of data per grid cell for all levels."""
+    data = np.ma.masked_array(
+        [[1., 2.], [3., np.nan], [5., 6.], [7., 8.]],
+        mask=[[False, False], [False, False], [False, True], [False, False]],
+        dtype=np.float32,
+    )
+    indices = np.array([2, 2, 0, -1])
+    mean = utils.bin_mean(data, indices, 3)
+    assert mean.dtype == np.float32
+    np.testing.assert_array_equal(mean.mask,
+                                  [[False, True, False], [True, True, False]])
+    np.testing.assert_allclose(mean.compressed(), [5., 2., 2.])
@@ -0,0 +1,79 @@
+"""Tests for the temperature variability metric psi."""
+
+import iris
+import numpy as np
+import pytest
+
+from esmvaltool.diag_scripts.climate_metrics import psi
+
+YEARS = np.arange(1866, 2016)
+
+
+def _sample_tas(shape=()):
+    """Create 150 years of AR(1) temperatures with a trend."""
+    rng = np.random.RandomState(0)
+    noise = rng.standard_normal((len(YEARS), ) + shape)
+    tas = np.empty_like(noise)
+    tas[0] = noise[0]
+    for idx in range(1, len(YEARS)):
+        tas[idx] = 0.6 * tas[idx - 1] + noise[idx]
+    trend = 0.01 * (YEARS - YEARS[0])
+    return 287. + 0.2 * tas + trend.reshape((-1, ) + (1, ) * len(shape))
+
+
+@pytest.mark.parametrize('window_length,lag', [(55, 1), (30, 2), (149, 1)])
+def test_sliding_psi(window_length, lag):
+    """Test the moving sums against the loop over windows."""
+    tas = _sample_tas()
+    np.testing.assert_allclose(
+        psi._sliding_psi(tas, YEARS, window_length, lag),
+        psi._sliding_psi_loop(tas, YEARS, window_length, lag), rtol=1e-8)
+
+
+def test_sliding_psi_map():
+    """Test psi for every grid point of a map."""
+    tas = _sample_tas((3, 4))
+    psis = psi._sliding_psi(tas, YEARS, 55, 1)
+    assert psis.shape == (len(YEARS) - 55, 3, 4)
+    for (idx, jdx) in np.ndindex(3, 4):
+        np.testing.assert_allclose(
+            psis[:, idx, jdx],
+            psi._sliding_psi_loop(tas[:, idx, jdx], YEARS, 55, 1), rtol=1e-8)
+
+
+def test_calculate_psi():
+    """Test psi cube of a cube with year as second dimension."""
+    tas = np.moveaxis(_sample_tas((4, )), 0, 1)
+    lat = iris.coords.DimCoord([-45., -15., 15., 45.],
+                               standard_name='latitude', units='degrees')
+    year = iris.coords.DimCoord(YEARS, long_name='year', units='1')
+    cube = iris.cube.Cube(tas, dim_coords_and_dims=[(lat, 0), (year, 1)])
+    psi_cube = psi.calculate_psi(cube, {'window_length': 55})
+    assert psi_cube.shape == (len(YEARS) - 55, 4)
+    assert psi_cube.coord_dims('latitude') == (1, )
+    np.testing.assert_array_equal(psi_cube.coord('year').points,
+                                  YEARS[54:-1])
+    assert psi_cube.attributes == {'window_length': 55, 'lag': 1}
+    np.testing.assert_allclose(
+        psi_cube.data[:, 2],
+        psi._sliding_psi_loop(tas[2], YEARS, 55, 1), rtol=1e-8)
+
+
+def test_calculate_psi_masked():
+    """Test that only windows containing missing years are masked."""
+    tas = np.ma.masked_array(_sample_tas((3, )), mask=False)
+    tas[140, 1] = np.ma.masked
+    tas[[10, 11], 2] = np.ma.masked
+    year = iris.coords.DimCoord(YEARS, long_name='year', units='1')
+    cube = iris.cube.Cube(tas, dim_coords_and_dims=[(year, 0)])
+    psi_cube = psi.calculate_psi(cube, {'window_length': 55})
+    mask = np.ma.getmaskarray(psi_cube.data)
+    window_starts = np.arange(len(YEARS) - 55)
+    assert not mask[:, 0].any()
+    np.testing.assert_array_equal(mask[:, 1], window_starts > 140 - 55)
+    np.testing.assert_array_equal(mask[:, 2], window_starts <= 11)
+    for idx in range(3):
+        expected = psi._sliding_psi_loop(tas[:, idx].filled(np.nan), YEARS,
+                                         55, 1)
+        np.testing.assert_allclose(psi_cube.data[:, idx][~mask[:, idx]],
+                                   expected[~mask[:, idx]], rtol=1e-8)
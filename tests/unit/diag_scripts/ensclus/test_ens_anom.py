@@ -0,0 +1,53 @@
+"""Tests for the ensemble anomalies in ensclus."""
+import os
+import sys
+
+import numpy as np
+from scipy import stats
+
+from esmvaltool.diag_scripts.ensclus import eof_tool
+
+# The ensclus scripts import each other as top-level modules
+sys.path.insert(0, os.path.dirname(eof_tool.__file__))
+from esmvaltool.diag_scripts.ensclus import ens_anom  # noqa: E402
+
+
+def _linregress_slopes(var):
+    """Get the slopes of linregress for every grid point of var."""
+    time = np.arange(var.shape[0])
+    slopes = np.full(var.shape[1:], np.nan)
+    for idx in np.ndindex(var.shape[1:]):
+        values = var[(slice(None), ) + idx]
+        valid = np.isfinite(values)
+        if valid.sum() > 1:
+            slopes[idx] = stats.linregress(time[valid], values[valid]).slope
+    return slopes
+
+
+def test_trend_slope():
+    """Test the slopes against scipy.stats.linregress."""
+    rng = np.random.RandomState(0)
+    var = (rng.standard_normal((30, 4, 5)) +
+           rng.standard_normal((4, 5)) * np.arange(30)[:, None, None])
+    expected = _linregress_slopes(var)
+    np.testing.assert_allclose(ens_anom.trend_slope(var), expected,
+                               rtol=1e-12, atol=1e-15)
+    stacked = np.stack([var, 2. * var])
+    np.testing.assert_allclose(ens_anom.trend_slope(stacked, axis=1),
+                               np.stack([expected, 2. * expected]),
+                               rtol=1e-12, atol=1e-15)
+
+
+def test_trend_slope_nan():
+    """Test that NaN values are left out of the regression."""
+    rng = np.random.RandomState(1)
+    var = rng.standard_normal((20, 3, 4))
+    var[[2, 3, 15], 0, 1] = np.nan
+    var[:, 1, 2] = np.nan
+    var[1:, 2, 3] = np.nan
+    slopes = ens_anom.trend_slope(var)
+    np.testing.assert_allclose(slopes, _linregress_slopes(var), rtol=1e-12,
+                               atol=1e-15)
+    assert np.isnan(slopes[1, 2])
+    assert np.isnan(slopes[2, 3])
+    assert np.isnan(stats.linregress(np.arange(20), var[:, 0, 1]).slope)
@@ -0,0 +1,45 @@
+"""Tests for the k-means clustering in ensclus."""
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+
+from esmvaltool.diag_scripts.ensclus import eof_tool
+
+# The ensclus scripts import each other as top-level modules
+sys.path.insert(0, os.path.dirname(eof_tool.__file__))
+from esmvaltool.diag_scripts.ensclus import ens_eof_kmeans  # noqa: E402
+
+NUMCLUS = 4
+
+
+def _sample_pcs():
+    """Create PCs of ensemble members in well separated clusters."""
+    rng = np.random.RandomState(0)
+    centers = 10. * rng.standard_normal((NUMCLUS, 3))
+    labels = np.arange(60) % NUMCLUS
+    return centers[labels] + 0.5 * rng.standard_normal((60, 3))
+
+
+def _partition(labels):
+    """Get the partition of the members independent of cluster numbers."""
+    return {frozenset(np.flatnonzero(labels == lab)) for lab in set(labels)}
+
+
+@pytest.mark.parametrize('n_jobs,batch_size', [(1, 50), (2, 7)])
+def test_kmeans_restarts(n_jobs, batch_size):
+    """Test the parallel restarts against a single KMeans."""
+    pcs = _sample_pcs()
+    reference = KMeans(n_clusters=NUMCLUS, n_init=30, init='k-means++',
+                       tol=1e-4, max_iter=1000, random_state=42).fit(pcs)
+    centroids, labels = ens_eof_kmeans.kmeans_restarts(
+        pcs, NUMCLUS, n_init=30, n_jobs=n_jobs, patience=None,
+        batch_size=batch_size)
+    assert _partition(labels) == _partition(reference.labels_)
+    assert _partition(labels) == _partition(np.arange(60) % NUMCLUS)
+    assert centroids.shape == (NUMCLUS, 3)
+    for lab in range(NUMCLUS):
+        np.testing.assert_allclose(centroids[lab],
+                                   pcs[labels == lab].mean(axis=0))
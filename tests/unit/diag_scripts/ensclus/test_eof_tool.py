@@ -0,0 +1,50 @@
+"""Tests for the EOF computation in ensclus."""
+import numpy as np
+import pytest
+
+from esmvaltool.diag_scripts.ensclus import eof_tool
+
+LAT = np.linspace(30., 80., 9)
+
+
+def _sample_field(nans=False):
+    """Create a field with a few distinct modes and some noise."""
+    rng = np.random.RandomState(0)
+    ntime, nlat, nlon = 40, len(LAT), 12
+    field = 0.1 * rng.standard_normal((ntime, nlat, nlon))
+    for amplitude in (8., 5., 3., 2., 1.):
+        field += (amplitude * rng.standard_normal((ntime, 1, 1)) *
+                  rng.standard_normal((1, nlat, nlon)))
+    if nans:
+        field[:, 0, :3] = np.nan
+        field[:, 4, 7] = np.nan
+    return field
+
+
+@pytest.mark.parametrize('nans', [False, True])
+@pytest.mark.parametrize('numpcs,perc', [(3, 80), (0, 95), (30, 80)])
+def test_eof_computation_fast(nans, numpcs, perc):
+    """Test the leading EOFs against the full EOF solver."""
+    var = _sample_field(nans)
+    _, _, _, pcs_ref, eofs_ref, varfrac_ref = eof_tool.eof_computation(
+        var, LAT)
+    pcs, eofs, varfrac = eof_tool.eof_computation_fast(var, LAT,
+                                                       numpcs=numpcs,
+                                                       perc=perc)
+    if numpcs:
+        neofs = numpcs
+    else:
+        assert np.sum(varfrac) * 100 > perc
+        neofs = np.argmax(np.cumsum(varfrac_ref) * 100 > perc) + 1
+    assert pcs.shape == (var.shape[0], len(varfrac))
+    assert eofs.shape == (len(varfrac), ) + var.shape[1:]
+    assert len(varfrac) >= neofs
+    np.testing.assert_allclose(varfrac[:neofs], varfrac_ref[:neofs],
+                               rtol=1e-6)
+    np.testing.assert_allclose(np.abs(pcs[:, :neofs]),
+                               np.abs(pcs_ref[:, :neofs]), rtol=1e-5,
+                               atol=1e-6 * np.abs(pcs_ref).max())
+    eofs_ref = np.ma.filled(eofs_ref[:neofs], np.nan)
+    np.testing.assert_array_equal(np.isnan(eofs[:neofs]), np.isnan(eofs_ref))
+    np.testing.assert_allclose(np.abs(eofs[:neofs]), np.abs(eofs_ref),
+                               rtol=1e-5, atol=1e-6)
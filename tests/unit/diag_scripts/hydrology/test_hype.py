@@ -0,0 +1,35 @@
+"""Tests for :mod:`esmvaltool.diag_scripts.hydrology.hype`."""
+import dask.array as da
+import numpy as np
+import pandas
+import pytest
+
+from esmvaltool.diag_scripts.hydrology import hype
+
+IDS = [
+    np.arange(1, 6),
+    np.array([1., 2.5, 3., 4.25, 1e4]),
+    np.array(['a', 'b c', 'd"e', 'f', 'g']),
+]
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('block_bytes', [1, 3 * 5 * 4, 1 << 20])
+@pytest.mark.parametrize('ids', IDS)
+def test_write_table(tmp_path, ids, block_bytes, lazy):
+    """Test the text table against pandas.DataFrame.to_csv."""
+    rng = np.random.RandomState(0)
+    data = (100. * rng.standard_normal((11, 5))).astype(np.float32)
+    data[2] = np.nan
+    data[[4, 5, 9], [0, 3, 4]] = np.nan
+    times = [f'2000-01-{day:02d}' for day in range(1, 12)]
+
+    expected_file = tmp_path / 'expected.txt'
+    frame = pandas.DataFrame(data, index=times, columns=ids)
+    frame.to_csv(expected_file, sep=' ', index_label="DATE",
+                 float_format='%.3f')
+    output_file = tmp_path / 'output.txt'
+    if lazy:
+        data = da.from_array(data, chunks=(4, 5))
+    hype.write_table(output_file, data, times, ids, block_bytes=block_bytes)
+    assert output_file.read_text() == expected_file.read_text()
@@ -0,0 +1,68 @@
+"""Tests for :mod:`esmvaltool.diag_scripts.hydrology.lazy_regrid`."""
+import dask.array as da
+import iris
+import iris.coords
+import iris.cube
+import numpy as np
+import pytest
+
+from esmvaltool.diag_scripts.hydrology import lazy_regrid
+
+
+def _grid_coords(lats, lons):
+    """Create latitude and longitude coordinates with bounds."""
+    lat = iris.coords.DimCoord(lats, standard_name='latitude',
+                               units='degrees')
+    lon = iris.coords.DimCoord(lons, standard_name='longitude',
+                               units='degrees')
+    lat.guess_bounds()
+    lon.guess_bounds()
+    return lat, lon
+
+
+def _sample_cube(ntime, var_name, seed, dtype=np.float32):
+    """Create a lazy cube with random data on a coarse grid."""
+    rng = np.random.RandomState(seed)
+    lat, lon = _grid_coords(np.linspace(40., 55., 7),
+                            np.linspace(0., 12., 9))
+    time = iris.coords.DimCoord(np.arange(ntime, dtype=np.float64),
+                                standard_name='time',
+                                units='days since 2000-01-01')
+    data = rng.standard_normal((ntime, 7, 9)).astype(dtype)
+    return iris.cube.Cube(da.from_array(data, chunks=(3, 7, 9)),
+                          var_name=var_name,
+                          dim_coords_and_dims=[(time, 0), (lat, 1),
+                                               (lon, 2)])
+
+
+def _target_cube():
+    """Create a finer target grid inside the source grid."""
+    lat, lon = _grid_coords(np.linspace(42., 52., 11),
+                            np.linspace(2., 10., 13))
+    return iris.cube.Cube(np.zeros((11, 13)),
+                          dim_coords_and_dims=[(lat, 0), (lon, 1)])
+
+
+@pytest.mark.parametrize('scheme', ['linear', 'nearest', 'area_weighted'])
+def test_lazy_regrid_multi(scheme):
+    """Test regridding several cubes together against one at a time."""
+    srcs = [
+        _sample_cube(10, 'pr', 0),
+        _sample_cube(10, 'psl', 1, np.float64),
+        _sample_cube(4, 'rsds', 2),
+        _sample_cube(10, 'tas', 3),
+    ]
+    tgt = _target_cube()
+    block_bytes = 3 * 11 * 13 * 8
+    results = lazy_regrid.lazy_regrid_multi(srcs, tgt, scheme,
+                                            block_bytes=block_bytes)
+    assert len(results) == len(srcs)
+    for src, result in zip(srcs, results):
+        expected = lazy_regrid.lazy_regrid(src, tgt, scheme,
+                                           block_bytes=block_bytes)
+        assert result.has_lazy_data()
+        assert result.var_name == src.var_name
+        assert result.dtype == src.dtype
+        assert result.coord('latitude') == tgt.coord('latitude')
+        assert result.coord('time') == src.coord('time')
+        np.testing.assert_array_equal(result.data, expected.data)
@@ -0,0 +1,59 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.shared._base`."""
+import os
+
+import pytest
+import yaml
+
+from esmvaltool.diag_scripts.shared import _base
+
+RECORD = {
+    'caption': 'A nice plot.',
+    'authors': ['first_author'],
+    'ancestors': ['/path/to/input_file.nc'],
+}
+
+
+@pytest.fixture
+def buffer():
+    """Buffer the provenance records during the test."""
+    _base._PROVENANCE_BUFFER.start()
+    yield _base._PROVENANCE_BUFFER
+    _base._PROVENANCE_BUFFER.flush()
+
+
+def _read(cfg):
+    """Read the provenance file."""
+    with open(os.path.join(cfg['run_dir'],
+                           'diagnostic_provenance.yml')) as file:
+        return yaml.safe_load(file)
+
+
+def test_provenance_logger(tmp_path):
+    """Test that records are saved when leaving the context."""
+    cfg = {'run_dir': str(tmp_path / 'run')}
+    with _base.ProvenanceLogger(cfg) as provenance_logger:
+        provenance_logger.log('a.nc', RECORD)
+    with _base.ProvenanceLogger(cfg) as provenance_logger:
+        provenance_logger.log('b.nc', RECORD)
+    assert _read(cfg) == {'a.nc': RECORD, 'b.nc': RECORD}
+
+
+def test_provenance_logger_buffered(tmp_path, buffer):
+    """Test that buffered records are only saved once, when flushing."""
+    cfg = {'run_dir': str(tmp_path)}
+    provenance_file = os.path.join(cfg['run_dir'], 'diagnostic_provenance.yml')
+    for filename in ('a.nc', 'b.nc'):
+        with _base.ProvenanceLogger(cfg) as provenance_logger:
+            provenance_logger.log(filename, RECORD)
+    assert not os.path.exists(provenance_file)
+
+    with pytest.raises(KeyError):
+        with _base.ProvenanceLogger(cfg) as provenance_logger:
+            provenance_logger.log('a.nc', RECORD)
+
+    # Records written meanwhile by another process are kept
+    with open(provenance_file, 'w') as file:
+        yaml.safe_dump({'c.nc': RECORD}, file)
+    buffer.flush()
+    assert not buffer.active
+    assert _read(cfg) == {'a.nc': RECORD, 'b.nc': RECORD, 'c.nc': RECORD}
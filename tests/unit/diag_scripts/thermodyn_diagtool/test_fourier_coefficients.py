@@ -0,0 +1,95 @@
+"""Tests for the Fourier coefficients in thermodyn_diagtool."""
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from esmvaltool.diag_scripts.thermodyn_diagtool import fourier_coefficients
+
+LEV = np.array([85000., 70000., 50000., 25000., 10000.])
+
+
+def _sample_fields(empty_level=False):
+    """Create random t,u,v,w and t2m fields, with 0 below the surface."""
+    rng = np.random.RandomState(0)
+    shape = (12, len(LEV), 32, 64)
+    t_a = (250. + 10. * rng.standard_normal(shape)).astype(np.float32)
+    t_a[rng.random_sample(shape) < 0.3] = 0.
+    if empty_level:
+        t_a[:, 2] = 0.
+    tas = (280. + 5. * rng.standard_normal((12, 32, 64))).astype(np.float32)
+    fields = [rng.standard_normal(shape).astype(np.float32) for _ in range(3)]
+    return [t_a] + fields + [tas]
+
+
+@pytest.mark.parametrize('empty_level', [False, True])
+@pytest.mark.parametrize('block_size', [1, 5, 12])
+def test_compute_coeff_blocks(block_size, empty_level):
+    """Test the low-memory mode against the default computation."""
+    t_a, u_a, v_a, wap, tas = _sample_fields(empty_level)
+    ta_ref, coeff_ref, wave_ref = fourier_coefficients.compute_coeff(
+        t_a.copy(), u_a, v_a, wap, tas, LEV)
+    ta_blk, coeff, wave = fourier_coefficients.compute_coeff(
+        t_a.copy(), u_a, v_a, wap, tas, LEV, block_size=block_size)
+    np.testing.assert_array_equal(wave, wave_ref)
+    np.testing.assert_allclose(ta_blk, ta_ref, rtol=1e-6)
+    for key, value in coeff_ref.items():
+        assert coeff[key].dtype == np.float32
+        np.testing.assert_allclose(coeff[key], value, rtol=0,
+                                   atol=1e-6 * np.abs(value).max())
+
+
+def _write_inputs(tmp_path):
+    """Write the sample fields to a t,u,v,w file and a t2m file."""
+    fields = _sample_fields()
+    ntime, nlev, nlat, nlon = fields[0].shape
+    files = [str(tmp_path / 'ta.nc'), str(tmp_path / 'tas.nc')]
+    for path, names, data in zip(files, (['ta', 'ua', 'va', 'wap'], ['tas']),
+                                 (fields[:4], fields[4:])):
+        with Dataset(path, 'w') as dataset:
+            dims = ['time', 'plev', 'lat', 'lon']
+            for dim, size in zip(dims, (ntime, nlev, nlat, nlon)):
+                dataset.createDimension(dim, size)
+                dataset.createVariable(dim, 'f8', (dim, ))
+            dataset.variables['time'].units = 'days since 2000-01-01'
+            dataset.variables['time'][:] = np.arange(ntime)
+            dataset.variables['plev'][:] = LEV
+            dataset.variables['lat'][:] = np.linspace(87., -87., nlat)
+            dataset.variables['lon'][:] = np.arange(nlon) * 360. / nlon
+            if len(names) == 1:
+                dims.remove('plev')
+            for name, fld in zip(names, data):
+                dataset.createVariable(name, 'f4', dims)[:] = fld
+    return files
+
+
+def test_fourier_coeff_blocks(tmp_path):
+    """Test that the blocks of the input files give the same outputs."""
+    ta_input, tas_input = _write_inputs(tmp_path)
+    outputs = {}
+    for block_size in (None, 5):
+        outputs[block_size] = [
+            str(tmp_path / '{}_{}.nc'.format(name, block_size))
+            for name in ('tadiag', 'coeff')
+        ]
+        fourier_coefficients.fourier_coeff(*outputs[block_size], ta_input,
+                                           tas_input, block_size=block_size)
+    for ref, blk in zip(outputs[None], outputs[5]):
+        with Dataset(ref) as ref_ds, Dataset(blk) as blk_ds:
+            assert list(blk_ds.variables) == list(ref_ds.variables)
+            for name, var in ref_ds.variables.items():
+                value = var[:]
+                np.testing.assert_allclose(blk_ds.variables[name][:], value,
+                                           rtol=1e-6,
+                                           atol=1e-6 * np.abs(value).max())
+
+
+def test_surface_pressure():
+    """Test the vectorised surface pressure against the loop over levels."""
+    t_a, _, _, _, tas = _sample_fields()
+    t_a = t_a.astype(np.float64)
+    tas = tas.astype(np.float64)
+    has_data = [True] * len(LEV)
+    np.testing.assert_array_equal(
+        fourier_coefficients._surface_pressure(t_a, tas, LEV),
+        fourier_coefficients._surface_pressure_loop(t_a, tas, LEV, has_data))
@@ -0,0 +1,165 @@
+"""Tests for the LEC computations in thermodyn_diagtool."""
+
+import logging
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from esmvaltool.diag_scripts.thermodyn_diagtool import (fourier_coefficients,
+                                                        lorenz_cycle)
+
+LEV = np.array([100000., 92500., 85000., 70000., 50000., 25000., 10000.])
+
+
+def _sample_fields(ntime=10, nlat=12, nwave=9):
+    """Create random Fourier coefficients of ta, ua, va and wap."""
+    rng = np.random.RandomState(0)
+    shape = (len(LEV), ntime, nlat, nwave)
+    fields = []
+    for scale, offset in [(5., 250.), (10., 0.), (5., 0.), (0.1, 0.)]:
+        fld = rng.standard_normal(shape) + 1j * rng.standard_normal(shape)
+        fields.append(scale * fld + offset)
+    lat = np.linspace(80., -80., nlat)
+    return fields, lat
+
+
+@pytest.mark.parametrize('block_size', [None, 1, 3, 8])
+def test_lec_terms(block_size):
+    """Test the batched LEC terms against the per-timestep computation."""
+    fields, lat = _sample_fields()
+    _, y_l, g_w = lorenz_cycle.weights(LEV, len(LEV), lat)
+    tmn_ref, terms_ref = lorenz_cycle.lec_terms_timestep(
+        fields, LEV, y_l, g_w)
+    tmn, terms = lorenz_cycle.lec_terms(fields, LEV, y_l, g_w,
+                                        block_size=block_size)
+    for fld, fld_ref in zip(tmn, tmn_ref):
+        np.testing.assert_array_equal(fld, fld_ref)
+    for term, term_ref in zip(terms, terms_ref):
+        assert term.shape == term_ref.shape
+        np.testing.assert_allclose(term, term_ref, rtol=1e-12,
+                                   atol=1e-12 * np.abs(term_ref).max())
+
+
+def test_lec_terms_single_precision():
+    """Test the LEC terms computed in single precision."""
+    fields, lat = _sample_fields()
+    _, y_l, g_w = lorenz_cycle.weights(LEV, len(LEV), lat)
+    _, terms_ref = lorenz_cycle.lec_terms_timestep(fields, LEV, y_l, g_w)
+    _, terms = lorenz_cycle.lec_terms(fields, LEV, y_l, g_w, block_size=4,
+                                      single_precision=True)
+    for term, term_ref in zip(terms, terms_ref):
+        np.testing.assert_allclose(term, term_ref, rtol=0,
+                                   atol=1e-4 * np.abs(term_ref).max())
+
+
+PLEV = np.array([100000., 85000., 50000., 25000., 10000., 5000.])
+LAT_SN = np.linspace(-75., 75., 6)
+
+
+def _write_input(path, short_name, data, days):
+    """Write a daily field on (time, [plev,] lat, lon) to a netCDF file."""
+    with Dataset(path, 'w') as dataset:
+        dataset.createDimension('time', None)
+        dataset.createDimension('lat', data.shape[-2])
+        dataset.createDimension('lon', data.shape[-1])
+        dims = ['time', 'lat', 'lon']
+        if data.ndim == 4:
+            dataset.createDimension('plev', data.shape[1])
+            dims.insert(1, 'plev')
+            dataset.createVariable('plev', 'f8', ('plev', ))[:] = PLEV
+        time = dataset.createVariable('time', 'f8', ('time', ))
+        time.units = 'days since 2000-01-01'
+        time.calendar = 'standard'
+        time[:] = days
+        dataset.createVariable('lat', 'f8', ('lat', ))[:] = LAT_SN
+        dataset.variables['lat'].units = 'degrees_north'
+        var = dataset.createVariable(short_name, 'f4', dims,
+                                     fill_value=1e20)
+        var[:] = data
+
+
+def _sample_files(tmp_path, days):
+    """Write random input files with missing values below the surface."""
+    rng = np.random.RandomState(0)
+    shape = (len(days), len(PLEV), len(LAT_SN), 16)
+    below_surface = np.zeros(shape, dtype=bool)
+    below_surface[:, 0] = rng.random_sample(shape[2:]) < 0.5
+    below_surface[:, 1] = below_surface[:, 0] & (
+        rng.random_sample(shape[2:]) < 0.5)
+    fields = {
+        'ta': 250. + 10. * rng.standard_normal(shape),
+        'ua': 10. * rng.standard_normal(shape),
+        'va': 5. * rng.standard_normal(shape),
+        'wap': 0.1 * rng.standard_normal(shape),
+        'tas': 280. + 5. * rng.standard_normal(shape[:1] + shape[2:]),
+        'uas': rng.standard_normal(shape[:1] + shape[2:]),
+        'vas': rng.standard_normal(shape[:1] + shape[2:]),
+    }
+    files = {}
+    for key, fld in fields.items():
+        fld = fld.astype(np.float32)
+        if fld.ndim == 4:
+            fld = np.ma.masked_array(fld, mask=below_surface)
+        fields[key] = fld
+        files[key] = str(tmp_path / (key + '.nc'))
+        _write_input(files[key], key, fld, days)
+    return files, fields
+
+
+def _expected_coeffs(fields, time_slice):
+    """Preprocess the fields like preproc_lec_cdo and compute coefficients.
+
+    The ua and va are filled below the surface with uas and vas, missing
+    values are set to 0, the levels between 100 and 900 hPa are selected
+    and the latitudes are reordered from N to S.
+    """
+    flds = {key: fld[time_slice] for key, fld in fields.items()}
+    orog = np.ma.getmaskarray(flds['ua'])
+    for key in ('ua', 'va'):
+        flds[key] = np.where(orog, flds[key + 's'][:, np.newaxis],
+                             flds[key].filled(0))
+    for key in ('ta', 'wap'):
+        flds[key] = flds[key].filled(0)
+    levs = slice(1, 5)
+    t_a, u_a, v_a, wap = [
+        flds[key][:, levs, ::-1] for key in ('ta', 'ua', 'va', 'wap')
+    ]
+    _, coeffs, wave = fourier_coefficients.compute_coeff(
+        t_a, u_a, v_a, wap, flds['tas'][:, ::-1], PLEV[levs])
+    return coeffs, wave
+
+
+def test_lec_coeffs(tmp_path):
+    """Test the in-memory preprocessing of every year."""
+    days = np.arange(362., 369.)
+    files, fields = _sample_files(tmp_path, days)
+    years = []
+    for year, coeffs in lorenz_cycle.lec_coeffs(files):
+        years.append(year)
+        time_slice = slice(0, 4) if year == '2000' else slice(4, 7)
+        expected, wave = _expected_coeffs(fields, time_slice)
+        np.testing.assert_array_equal(coeffs['wave'], wave)
+        np.testing.assert_array_equal(coeffs['plev'], PLEV[1:5])
+        np.testing.assert_array_equal(coeffs['lat'], LAT_SN[::-1])
+        np.testing.assert_array_equal(coeffs['time'], days[time_slice])
+        for key in ('ta', 'ua', 'va', 'wap'):
+            np.testing.assert_allclose(coeffs[key], expected[key],
+                                       rtol=1e-6, atol=1e-6)
+    assert years == ['2000', '2001']
+
+
+def test_lec_coeffs_missing_year(tmp_path, caplog):
+    """Test that years not covered by all files are skipped."""
+    days = np.arange(362., 369.)
+    files, fields = _sample_files(tmp_path, days)
+    _write_input(files['uas'], 'uas', fields['uas'][:4], days[:4])
+    with caplog.at_level(logging.WARNING):
+        years = [year for year, _ in lorenz_cycle.lec_coeffs(files)]
+    assert years == ['2000']
+    assert 'Skipping years 2001' in caplog.text
+
+    _write_input(files['uas'], 'uas', fields['uas'][4:], days[4:])
+    _write_input(files['vas'], 'vas', fields['vas'][:4], days[:4])
+    with pytest.raises(ValueError, match='no year in common'):
+        list(lorenz_cycle.lec_coeffs(files))
@@ -0,0 +1,103 @@
+"""Tests for :mod:`esmvaltool.utils.calendar_helpers`."""
+import numpy as np
+import pytest
+from cf_units import Unit
+
+from esmvaltool.utils import calendar_helpers
+
+CALENDARS = [
+    'standard',
+    'gregorian',
+    'proleptic_gregorian',
+    'julian',
+    'noleap',
+    'all_leap',
+    '360_day',
+]
+UNITS = [
+    'days since 1850-01-01',
+    'hours since 1900-01-01 06:00:00',
+    'days since 1500-03-01',
+]
+
+
+def _sample_points(units):
+    """Get random time points at full quarters of the unit."""
+    rng = np.random.RandomState(0)
+    return np.round(rng.uniform(-2e5, 2e5, 500) * 4) / 4 * (
+        24 if units.startswith('hours') else 1)
+
+
+@pytest.mark.parametrize('units', UNITS)
+@pytest.mark.parametrize('calendar', CALENDARS)
+def test_num2date(calendar, units):
+    """Test conversion of time points to dates and back."""
+    units = Unit(units, calendar=calendar)
+    points = _sample_points(str(units))
+    dates = units.num2date(points)
+    (year, month, day, seconds) = calendar_helpers.num2date(points, units)
+    np.testing.assert_array_equal(year, [date.year for date in dates])
+    np.testing.assert_array_equal(month, [date.month for date in dates])
+    np.testing.assert_array_equal(day, [date.day for date in dates])
+    np.testing.assert_allclose(
+        seconds, [date.hour * 3600 + date.minute * 60 for date in dates])
+    np.testing.assert_allclose(
+        calendar_helpers.date2num(year, month, day, units, seconds), points)
+
+
+@pytest.mark.parametrize('calendar', CALENDARS)
+def test_month_operations(calendar):
+    """Test month bounds, days in month and adding months."""
+    units = Unit('days since 1850-01-01', calendar=calendar)
+    points = _sample_points(str(units))
+    dates = units.num2date(points)
+    first_days = [date.replace(day=1, hour=0, minute=0) for date in dates]
+    (start, end) = calendar_helpers.month_bounds(points, units)
+    np.testing.assert_allclose(start, units.date2num(first_days))
+    np.testing.assert_allclose(
+        calendar_helpers.add_months(start, units, months=1), end)
+    np.testing.assert_allclose(
+        calendar_helpers.days_in_month(points, units), end - start)
+    np.testing.assert_allclose(
+        calendar_helpers.add_months(end, units, months=-1), start)
+
+
+def test_add_months_invalid_day():
+    """Test that an invalid day in the new month raises an error."""
+    units = Unit('days since 2000-01-01', calendar='standard')
+    with pytest.raises(ValueError):
+        calendar_helpers.add_months([30], units)
+
+
+@pytest.mark.parametrize('calendar,expected', [
+    ('standard', 2000 + 182.5 / 366),
+    ('noleap', 2000 + 181.5 / 365),
+    ('360_day', 2000 + 180.5 / 360),
+])
+def test_decimal_year(calendar, expected):
+    """Test decimal years in different calendars."""
+    units = Unit('hours since 2000-01-01', calendar=calendar)
+    point = calendar_helpers.date2num(2000, 7, 1, units, seconds=43200)
+    np.testing.assert_allclose(calendar_helpers.decimal_year(point, units),
+                               expected)
+
+
+def test_shift_and_snap():
+    """Test shifting and snapping of time points."""
+    units = Unit('hours since 1979-01-01', calendar='standard')
+    points = np.arange(0., 72., 6.)
+    shifted = calendar_helpers.shift(points, units, -1)
+    np.testing.assert_allclose(shifted, points - 1. / 3600.)
+    np.testing.assert_allclose(
+        calendar_helpers.snap(shifted, units, hour=12),
+        [-12.] + [12.] * 4 + [36.] * 4 + [60.] * 3)
+    np.testing.assert_allclose(
+        calendar_helpers.snap(points, units, day=15, hour=0),
+        [14 * 24.] * 12)
+
+
+def test_invalid_calendar():
+    """Test that time units without calendar raise an error."""
+    with pytest.raises(ValueError):
+        calendar_helpers.num2date([0.], Unit('days since 2000-01-01',
+                                             calendar='none'))